@@ -1,4 +1,4 @@
-from main import *
+from main import main
 
 if __name__ == "__main__":
-    import main
+    main()
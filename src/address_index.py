@@ -0,0 +1,114 @@
+from collections import Counter, defaultdict
+
+Q = 3  # Gram size
+PAD = '\x00' * (Q - 1)
+
+
+def qgrams(text):
+    """
+    Padded q-gram multiset, padding makes prefix/suffix edits count.
+    """
+    padded = f"{PAD}{text}{PAD}"
+    return Counter(padded[i:i + Q] for i in range(len(padded) - Q + 1))
+
+
+def bounded_levenshtein(a, b, max_dist):
+    """
+    Levenshtein distance if it is <= max_dist, otherwise max_dist + 1.
+    Only a band of width 2 * max_dist + 1 is computed and it stops as soon
+    as a whole row exceeds max_dist.
+    """
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return len(a) if len(a) <= max_dist else max_dist + 1
+    over = max_dist + 1
+    previous_row = list(range(len(b) + 1))
+    for i, c1 in enumerate(a, 1):
+        lo = max(1, i - max_dist)
+        hi = min(len(b), i + max_dist)
+        current_row = [over] * (len(b) + 1)
+        current_row[0] = i if i <= max_dist else over
+        row_min = current_row[0]
+        for j in range(lo, hi + 1):
+            cost = previous_row[j - 1] + (c1 != b[j - 1])
+            cost = min(cost, previous_row[j] + 1, current_row[j - 1] + 1)
+            current_row[j] = cost if cost < over else over
+            if current_row[j] < row_min:
+                row_min = current_row[j]
+        if row_min > max_dist:
+            return over
+        previous_row = current_row
+    return previous_row[-1] if previous_row[-1] <= max_dist else over
+
+
+class AddressIndex:
+    """
+    In-memory q-gram index over known addresses. Candidates are filtered with
+    the q-gram count lemma (edit distance k changes at most k * Q grams) and
+    only the survivors are verified with bounded Levenshtein.
+    """
+
+    def __init__(self, entries=()):
+        self.entries = []
+        self._postings = defaultdict(list)  # gram -> [(entry id, count)]
+        self._lengths = []
+        self._by_length = defaultdict(list)  # address length -> entry ids
+        for entry in entries:
+            self.add(entry)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, entry):
+        """
+        Index one {"address": ..., "station": ...} entry.
+        """
+        if "address" not in entry:
+            return
+        entry_id = len(self.entries)
+        address = entry["address"]
+        self.entries.append(entry)
+        self._lengths.append(len(address))
+        self._by_length[len(address)].append(entry_id)
+        for gram, count in qgrams(address).items():
+            self._postings[gram].append((entry_id, count))
+
+    def _candidates(self, text, max_dist):
+        length = len(text)
+        shared = defaultdict(int)
+        for gram, count in qgrams(text).items():
+            for entry_id, entry_count in self._postings.get(gram, ()):
+                shared[entry_id] += min(count, entry_count)
+        candidates = set()
+        for entry_id, common in shared.items():
+            entry_length = self._lengths[entry_id]
+            if abs(entry_length - length) > max_dist:
+                continue
+            if common >= max(length, entry_length) + Q - 1 - max_dist * Q:
+                candidates.add(entry_id)
+        # Very short strings may match with no shared grams at all
+        for entry_length in range(max(0, length - max_dist), length + max_dist + 1):
+            if max(length, entry_length) + Q - 1 - max_dist * Q <= 0:
+                candidates.update(self._by_length.get(entry_length, ()))
+        return candidates
+
+    def best_match(self, candidates, threshold=3):
+        """
+        Closest entry to any of the candidate strings within threshold edits.
+        Returns (entry, distance) or (None, None). Ties go to the earlier
+        candidate, then to the earlier added entry.
+        """
+        best_entry, best_dist = None, threshold + 1
+        for text in candidates:
+            for entry_id in sorted(self._candidates(text, min(threshold, best_dist - 1))):
+                dist = bounded_levenshtein(text, self.entries[entry_id]["address"], best_dist - 1)
+                if dist < best_dist:
+                    best_entry, best_dist = self.entries[entry_id], dist
+                    if dist == 0:
+                        return best_entry, 0
+        if best_entry is None:
+            return None, None
+        return best_entry, best_dist
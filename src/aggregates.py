@@ -0,0 +1,102 @@
+AGGREGATES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS monthly_aggregates (
+    month TEXT PRIMARY KEY,     -- YYYY-MM
+    receipts INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    liters REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS station_aggregates (
+    station TEXT PRIMARY KEY,
+    receipts INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    liters REAL NOT NULL,
+    price_sum REAL NOT NULL,
+    price_count INTEGER NOT NULL
+);
+"""
+AGGREGATES_VERSION = '1'
+
+
+def _apply_row(conn, row, sign):
+    if row is None:
+        return
+    amount = row.get('amount') or 0.0
+    liters = row.get('fuel_liters') or 0.0
+    if row.get('date'):
+        conn.execute(
+            "INSERT INTO monthly_aggregates (month, receipts, amount, liters) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(month) DO UPDATE SET receipts = receipts + excluded.receipts, "
+            "amount = amount + excluded.amount, liters = liters + excluded.liters",
+            (row['date'][:7], sign, sign * amount, sign * liters))
+    if row.get('station'):
+        price = row.get('fuel_price_per_liter')
+        conn.execute(
+            "INSERT INTO station_aggregates (station, receipts, amount, liters, price_sum, price_count) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(station) DO UPDATE SET receipts = receipts + excluded.receipts, "
+            "amount = amount + excluded.amount, liters = liters + excluded.liters, "
+            "price_sum = price_sum + excluded.price_sum, price_count = price_count + excluded.price_count",
+            (row['station'], sign, sign * amount, sign * liters,
+             sign * (price or 0.0), sign * (price is not None)))
+
+
+def update_aggregates(conn, old_row, new_row):
+    """
+    Store listener: subtract the replaced row, add the new one.
+    """
+    _apply_row(conn, old_row, -1)
+    _apply_row(conn, new_row, 1)
+
+
+def rebuild_aggregates(conn):
+    """
+    Recompute running aggregates from scratch with two GROUP BY queries.
+    """
+    with conn:
+        conn.execute("DELETE FROM monthly_aggregates")
+        conn.execute("DELETE FROM station_aggregates")
+        conn.execute(
+            "INSERT INTO monthly_aggregates (month, receipts, amount, liters) "
+            "SELECT substr(date, 1, 7), COUNT(*), TOTAL(amount), TOTAL(fuel_liters) "
+            "FROM receipts WHERE date IS NOT NULL GROUP BY substr(date, 1, 7)")
+        conn.execute(
+            "INSERT INTO station_aggregates (station, receipts, amount, liters, price_sum, price_count) "
+            "SELECT station, COUNT(*), TOTAL(amount), TOTAL(fuel_liters), TOTAL(fuel_price_per_liter), "
+            "COUNT(fuel_price_per_liter) FROM receipts WHERE station IS NOT NULL AND station != '' GROUP BY station")
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('aggregates_version', ?)",
+                     (AGGREGATES_VERSION,))
+
+
+def attach(store):
+    """
+    Create the aggregate tables, backfill them once and keep them updated
+    on every save through the store listener.
+    """
+    conn = store.connection()
+    conn.executescript(AGGREGATES_SCHEMA)
+    version = conn.execute("SELECT value FROM meta WHERE key = 'aggregates_version'").fetchone()
+    if not version or version[0] != AGGREGATES_VERSION:
+        rebuild_aggregates(conn)
+    store.add_listener(update_aggregates)
+
+
+def running_totals(store=None):
+    """
+    Dashboard read: monthly and per-station aggregates without a rescan.
+    """
+    if store is None:
+        from stored_data import get_store
+        store = get_store()
+    conn = store.connection()
+    monthly = {row['month']: {'receipts': row['receipts'], 'amount': row['amount'], 'liters': row['liters']}
+               for row in conn.execute("SELECT * FROM monthly_aggregates WHERE receipts > 0 ORDER BY month")}
+    stations = {
+        row['station']: {
+            'receipts': row['receipts'],
+            'amount': row['amount'],
+            'liters': row['liters'],
+            'mean_price': row['price_sum'] / row['price_count'] if row['price_count'] else None,
+        }
+        for row in conn.execute("SELECT * FROM station_aggregates WHERE receipts > 0 ORDER BY station")
+    }
+    return {'monthly': monthly, 'stations': stations}
@@ -0,0 +1,200 @@
+import numpy as np
+
+
+class ReceiptColumns:
+    """
+    Receipt store as columnar NumPy arrays. Missing numbers are NaN, missing
+    dates NaT, stations and fuel types are integer codes into the name lists
+    (-1 when missing).
+    """
+
+    def __init__(self, ids, dates, amount, liters, price, station_codes, stations, fuel_codes, fuel_types):
+        self.ids = ids
+        self.dates = dates
+        self.amount = amount
+        self.liters = liters
+        self.price = price
+        self.station_codes = station_codes
+        self.stations = stations
+        self.fuel_codes = fuel_codes
+        self.fuel_types = fuel_types
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def months(self):
+        """
+        Months since 1970-01 per receipt, -1 where date is missing.
+        """
+        months = self.dates.astype('datetime64[M]').astype(np.int64)
+        return np.where(np.isnat(self.dates), -1, months)
+
+
+def _encode(values):
+    """
+    Strings -> (int codes, names), None -> -1.
+    """
+    names = sorted({v for v in values if v})
+    lookup = {name: i for i, name in enumerate(names)}
+    return np.fromiter((lookup.get(v, -1) for v in values), dtype=np.int32, count=len(values)), names
+
+
+def _floats(values):
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def load_columns(store=None):
+    """
+    Load the whole store into ReceiptColumns with one query over the typed
+    columns, no per-receipt JSON decoding.
+    """
+    if store is None:
+        from stored_data import get_store
+        store = get_store()
+    rows = store.columns(('id', 'date', 'station', 'fuel_type', 'amount', 'fuel_liters',
+                          'fuel_price_per_liter')).fetchall()
+    ids, dates, stations, fuel_types, amount, liters, price = (list(col) for col in zip(*rows)) if rows else ([],) * 7
+    station_codes, station_names = _encode(stations)
+    fuel_codes, fuel_names = _encode([f.lower() if f else None for f in fuel_types])
+    return ReceiptColumns(
+        ids=np.array(ids, dtype=object),
+        dates=np.array([d if d else 'NaT' for d in dates], dtype='datetime64[D]'),
+        amount=_floats(amount),
+        liters=_floats(liters),
+        price=_floats(price),
+        station_codes=station_codes,
+        stations=station_names,
+        fuel_codes=fuel_codes,
+        fuel_types=fuel_names,
+    )
+
+
+def _month_label(month_index):
+    return str(np.datetime64(int(month_index), 'M'))
+
+
+def _group_sums(codes, values, size):
+    valid = (codes >= 0) & ~np.isnan(values)
+    sums = np.bincount(codes[valid], weights=values[valid], minlength=size)
+    counts = np.bincount(codes[valid], minlength=size)
+    return sums, counts
+
+
+def monthly_totals(cols):
+    """
+    {YYYY-MM: {'receipts', 'amount', 'liters'}} for receipts with a date.
+    """
+    months = cols.months
+    dated = months >= 0
+    if not dated.any():
+        return {}
+    first = months[dated].min()
+    codes = np.where(dated, months - first, -1)
+    size = int(codes.max()) + 1
+    receipts = np.bincount(codes[dated], minlength=size)
+    amount, _ = _group_sums(codes, cols.amount, size)
+    liters, _ = _group_sums(codes, cols.liters, size)
+    return {
+        _month_label(first + i): {'receipts': int(receipts[i]), 'amount': float(amount[i]), 'liters': float(liters[i])}
+        for i in np.flatnonzero(receipts)
+    }
+
+
+def station_prices(cols):
+    """
+    Per station: mean listed price per liter and volume-weighted price
+    (total amount / total liters over receipts that have both).
+    """
+    size = len(cols.stations)
+    price_sum, price_count = _group_sums(cols.station_codes, cols.price, size)
+    both = ~np.isnan(cols.amount) & ~np.isnan(cols.liters)
+    amount_sum, _ = _group_sums(cols.station_codes, np.where(both, cols.amount, np.nan), size)
+    liters_sum, _ = _group_sums(cols.station_codes, np.where(both, cols.liters, np.nan), size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_price = price_sum / price_count
+        weighted_price = amount_sum / liters_sum
+    return {
+        name: {
+            'mean_price': None if np.isnan(mean_price[i]) else float(mean_price[i]),
+            'weighted_price': None if not np.isfinite(weighted_price[i]) else float(weighted_price[i]),
+            'receipts': int(np.count_nonzero(cols.station_codes == i)),
+        }
+        for i, name in enumerate(cols.stations)
+    }
+
+
+def consumption_trend(cols):
+    """
+    Monthly liters and mean price per liter, with least squares slopes
+    (liters per month, price change per month) over months that have data.
+    """
+    totals = monthly_totals(cols)
+    if not totals:
+        return {'months': [], 'liters': [], 'mean_price': [], 'liters_slope': None, 'price_slope': None}
+    months = cols.months
+    dated = months >= 0
+    first = months[dated].min()
+    codes = np.where(dated, months - first, -1)
+    size = int(codes.max()) + 1
+    price_sum, price_count = _group_sums(codes, cols.price, size)
+    labels = list(totals)
+    x = np.array([(np.datetime64(label, 'M').astype(np.int64) - first) for label in labels], dtype=np.float64)
+    liters = np.array([totals[label]['liters'] for label in labels])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_price = (price_sum / price_count)[x.astype(np.int64)]
+    has_price = ~np.isnan(mean_price)
+    liters_slope = float(np.polyfit(x, liters, 1)[0]) if len(x) >= 2 else None
+    price_slope = float(np.polyfit(x[has_price], mean_price[has_price], 1)[0]) if has_price.sum() >= 2 else None
+    return {
+        'months': labels,
+        'liters': liters.tolist(),
+        'mean_price': [None if np.isnan(p) else float(p) for p in mean_price],
+        'liters_slope': liters_slope,
+        'price_slope': price_slope,
+    }
+
+
+def price_outliers(cols, threshold=3.5):
+    """
+    Receipts whose price per liter is far from the median of their fuel type.
+    Robust z-score: 0.6745 * (x - median) / MAD. Also flags receipts where
+    amount differs from liters * price by more than 5%.
+    """
+    robust_z = np.full(len(cols), np.nan)
+    for code in range(len(cols.fuel_types)):
+        group = (cols.fuel_codes == code) & ~np.isnan(cols.price)
+        if group.sum() < 3:
+            continue
+        prices = cols.price[group]
+        median = np.median(prices)
+        mad = np.median(np.abs(prices - median))
+        if mad > 0:
+            robust_z[group] = 0.6745 * (prices - median) / mad
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mismatch = np.abs(cols.liters * cols.price - cols.amount) / cols.amount
+    price_flag = np.abs(np.nan_to_num(robust_z)) > threshold
+    mismatch_flag = np.nan_to_num(mismatch) > 0.05
+    return [
+        {
+            'receipt_id': cols.ids[i],
+            'price': None if np.isnan(cols.price[i]) else float(cols.price[i]),
+            'robust_z': None if np.isnan(robust_z[i]) else float(robust_z[i]),
+            'amount_mismatch': bool(mismatch_flag[i]),
+        }
+        for i in np.flatnonzero(price_flag | mismatch_flag)
+    ]
+
+
+def report(store=None):
+    """
+    Full analytics report over the store.
+    """
+    cols = load_columns(store)
+    return {
+        'receipts': len(cols),
+        'monthly': monthly_totals(cols),
+        'stations': station_prices(cols),
+        'trend': consumption_trend(cols),
+        'outliers': price_outliers(cols),
+    }
@@ -0,0 +1,37 @@
+import os
+from instrumentation import stage
+
+# === Debug artifact controls ===
+# Visualizations and -processed copies are only written when enabled,
+# the JSON result is all that is kept by default.
+SAVE_ARTIFACTS = False
+ARTIFACT_DIR = os.path.join(os.path.dirname(__file__), '../receipts')
+
+
+def configure(enabled=True, directory=None):
+    """
+    Turn artifact writes on/off, optionally into another directory.
+    """
+    global SAVE_ARTIFACTS, ARTIFACT_DIR
+    SAVE_ARTIFACTS = enabled
+    if directory:
+        ARTIFACT_DIR = directory
+
+
+def enabled():
+    return SAVE_ARTIFACTS
+
+
+def save(name, image):
+    """
+    Write an image artifact if enabled. Relative names go to ARTIFACT_DIR.
+    Returns the written path or None.
+    """
+    if not SAVE_ARTIFACTS or image is None:
+        return None
+    path = name if os.path.isabs(name) else os.path.join(ARTIFACT_DIR, name)
+    import cv2  # Only when something is written, keeps imports light
+    with stage('save_image'):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        cv2.imwrite(path, image)
+    return path
@@ -0,0 +1,151 @@
+import os
+import json
+import argparse
+from benchmark import BENCH_DIR, run_benchmark
+from preprocessing import get_pipeline, describe_pipeline, load_pipeline
+
+# === Autotune controls ===
+REQUIRED_STAGES = ('threshold',)  # Never dropped, OCR expects a binary image
+# Cheaper stand-ins tried for a stage besides dropping it. fastNlMeans on an
+# already binary image mostly removes specks, a median filter or a smaller
+# search window may do the same for a fraction of the cost.
+REPLACEMENTS = {
+    'denoise': [
+        ('denoise', {'h': 30, 'templateWindowSize': 7, 'searchWindowSize': 11}),
+        ('median_blur', {'ksize': 3}),
+    ],
+    'clahe': [('equalize', {})],
+}
+OUTPUT_FILE = os.path.join(os.path.dirname(__file__), '../data/pipeline.json')
+
+
+def _key(pipeline):
+    return json.dumps(pipeline, sort_keys=True)
+
+
+def measure(pipeline, corpus_dir=BENCH_DIR, limit=None, **process_kwargs):
+    """
+    Benchmark one pipeline: mean field accuracy, per-receipt cost of the
+    pipeline stages plus OCR (OCR time changes with image cleanliness too)
+    and each stage's own time.
+    """
+    result = run_benchmark(corpus_dir, limit, use_cache=False, pipeline=pipeline, **process_kwargs)
+    receipts = max(1, result['receipts'] - result['errors'])
+    names = {name for name, _ in pipeline} | {'ocr'}
+    stage_cost = {name: s['total'] / receipts for name, s in result['stages'].items() if name in names}
+    accuracy = result['field_accuracy']
+    return {
+        'pipeline': pipeline,
+        'accuracy': sum(accuracy.values()) / len(accuracy) if accuracy else 0.0,
+        'field_accuracy': accuracy,
+        'cost': sum(stage_cost.values()),
+        'stage_cost': stage_cost,
+        'errors': result['errors'],
+    }
+
+
+def candidates(pipeline):
+    """
+    One-step cheaper variants: each optional stage dropped or replaced.
+    """
+    for i, (name, params) in enumerate(pipeline):
+        if name in REQUIRED_STAGES:
+            continue
+        yield pipeline[:i] + pipeline[i + 1:]
+        for replacement in REPLACEMENTS.get(name, ()):
+            if replacement != (name, params):
+                yield pipeline[:i] + [replacement] + pipeline[i + 1:]
+
+
+def autotune(corpus_dir=BENCH_DIR, target=None, limit=None, base=None, verbose=True, **process_kwargs):
+    """
+    Greedy search for the cheapest pipeline whose mean field accuracy on a
+    labeled corpus is at least target (default: the base pipeline's own
+    accuracy, i.e. no regression). Each round benchmarks every one-step
+    cheaper variant of the current best and moves to the cheapest one that
+    still meets the target.
+    Returns the best measurement plus every measurement taken and the
+    accuracy/cost contribution of each base stage. If even the base misses
+    the target, best is the most accurate pipeline measured.
+    """
+    measured = {}
+
+    def run(pipeline):
+        key = _key(pipeline)
+        if key not in measured:
+            measured[key] = measure(pipeline, corpus_dir, limit, **process_kwargs)
+            if verbose:
+                m = measured[key]
+                print(f"{m['accuracy']:6.1%}  {m['cost']:7.3f}s  {describe_pipeline(pipeline)}")
+        return measured[key]
+
+    base = [(name, dict(params)) for name, params in get_pipeline(base)]
+    baseline = run(base)
+    target = baseline['accuracy'] if target is None else target
+    best = baseline
+
+    # Contribution of each base stage: what dropping it costs in accuracy and saves in time
+    contributions = {}
+    for i, (name, _) in enumerate(base):
+        if name in REQUIRED_STAGES:
+            continue
+        without = run(base[:i] + base[i + 1:])
+        contributions[name] = {
+            'accuracy_delta': baseline['accuracy'] - without['accuracy'],
+            'seconds_saved': baseline['cost'] - without['cost'],
+            'stage_seconds': baseline['stage_cost'].get(name, 0.0),
+        }
+
+    improved = True
+    while improved:
+        improved = False
+        passing = [m for m in map(run, candidates(best['pipeline']))
+                   if m['accuracy'] >= target and not m['errors'] and m['cost'] < best['cost']]
+        if passing:
+            best = min(passing, key=lambda m: m['cost'])
+            improved = True
+    met = best['accuracy'] >= target
+    if not met:
+        best = max(measured.values(), key=lambda m: (m['accuracy'], -m['cost']))
+    return {
+        'target': target,
+        'met': met,
+        'best': best,
+        'baseline': baseline,
+        'contributions': contributions,
+        'measured': list(measured.values()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pick the cheapest preprocessing pipeline meeting a target accuracy")
+    parser.add_argument('--corpus', default=BENCH_DIR, help="Labeled corpus, see benchmark.py generate")
+    parser.add_argument('--target', type=float, help="Mean field accuracy 0-1, default: no loss against the base")
+    parser.add_argument('--limit', type=int, help="Receipts used per measurement")
+    parser.add_argument('--base', help="Starting pipeline JSON, default: the preprocessing.py settings")
+    parser.add_argument('--adaptive', action='store_true', help="Tune for adaptive multipass")
+    parser.add_argument('--roi', action='store_true', help="Tune for region-of-interest multipass")
+    parser.add_argument('--output', default=OUTPUT_FILE, help="Where to write the chosen pipeline")
+    args = parser.parse_args(argv)
+
+    base = load_pipeline(args.base) if args.base else None
+    result = autotune(args.corpus, args.target, args.limit, base,
+                      adaptive=args.adaptive or None, roi=args.roi or None)
+    baseline, best = result['baseline'], result['best']
+    print("Stage contributions (accuracy lost / s per receipt saved when dropped):")
+    for name, c in result['contributions'].items():
+        print(f"    {name}: {c['accuracy_delta']:+.1%} / {c['seconds_saved']:.3f}s")
+    print(f"Baseline: {baseline['accuracy']:.1%} at {baseline['cost']:.3f}s  {describe_pipeline(baseline['pipeline'])}")
+    print(f"Best:     {best['accuracy']:.1%} at {best['cost']:.3f}s  {describe_pipeline(best['pipeline'])}")
+    if not result['met']:
+        print(f"No pipeline reached the target {result['target']:.1%}, writing the most accurate one measured.")
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'pipeline': best['pipeline'], 'accuracy': best['accuracy'], 'field_accuracy': best['field_accuracy'],
+                   'seconds_per_receipt': best['cost'], 'target': result['target'], 'corpus': args.corpus},
+                  f, indent=2)
+    print(f"Pipeline written to {args.output}, use it with main.py --pipeline {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+import artifacts
+import instrumentation
+import ocr
+import preprocessing
+from process_receipt import process_receipt
+from scheduler import MemoryScheduler, start_measure, end_measure
+
+CHECKPOINT_FILE = os.path.join(os.path.dirname(__file__), '../data/batch_checkpoint.jsonl')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tiff', '.bmp')
+MB = 1024 * 1024
+
+
+def is_receipt_image(fname):
+    """
+    Source receipt image by name, our own debug outputs are not.
+    """
+    if '-processed' in fname or '_visualization' in fname:
+        return False
+    return fname.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def list_receipt_images(receipt_dir):
+    """
+    Source receipt images in a directory, skipping our own debug outputs.
+    """
+    return [os.path.join(receipt_dir, fname) for fname in sorted(os.listdir(receipt_dir)) if is_receipt_image(fname)]
+
+
+def load_checkpoint(checkpoint_file=CHECKPOINT_FILE):
+    """
+    Map of file name -> last recorded status. Later lines win.
+    """
+    done = {}
+    if os.path.exists(checkpoint_file):
+        with open(checkpoint_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line may be cut short by a kill, ignore it
+                    continue
+                done[entry['file']] = entry['status']
+    return done
+
+
+def append_checkpoint(f, entry):
+    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    f.flush()
+
+
+def _init_worker(instrumentation_enabled, track_memory, save_artifacts, artifact_dir, pipeline=None, tile_workers=None):
+    """
+    Process pool initializer, workers do not inherit settings under spawn.
+    """
+    instrumentation.configure(instrumentation_enabled, track_memory)
+    artifacts.configure(save_artifacts, artifact_dir)
+    preprocessing.PIPELINE = pipeline
+    if tile_workers is not None:
+        ocr.TILE_WORKERS = tile_workers
+
+
+def _process_one(image_path):
+    """
+    Pool worker: never prompts, never raises.
+    """
+    start = time.time()
+    baseline = start_measure()
+    try:
+        process_receipt(image_path, interactive=False)
+        status, error = 'ok', None
+    except Exception as e:
+        status, error = 'error', f"{type(e).__name__}: {e}"
+    # Buffers sized for this image would stay in the worker and be missing
+    # from the scheduler's accounting
+    preprocessing.release_buffers()
+    return {
+        'file': os.path.basename(image_path),
+        'status': status,
+        'error': error,
+        'seconds': round(time.time() - start, 3),
+        'peak_bytes': end_measure(baseline),
+    }, instrumentation.drain()
+
+
+def run_batch(receipt_dir, workers=None, checkpoint_file=CHECKPOINT_FILE, retry_errors=True, report_path=None,
+              memory_budget=None):
+    """
+    Process every receipt in receipt_dir on a process pool.
+    Files already recorded as done in the checkpoint are skipped, so an
+    interrupted run resumes where it stopped. Unmatched addresses are
+    queued for review (see stored_data.queue_address_review).
+    Images are started largest first and only while their estimated peak
+    memory fits memory_budget (bytes, default see scheduler.py).
+    With report_path a per-stage timing report is written at the end.
+    """
+    workers = workers or os.cpu_count() or 1
+    done = load_checkpoint(checkpoint_file)
+    skip = {'ok'} if retry_errors else {'ok', 'error'}
+    paths = [p for p in list_receipt_images(receipt_dir) if done.get(os.path.basename(p)) not in skip]
+    total = len(paths)
+    print(f"Batch: {total} receipts to process, {len(done)} in checkpoint, {workers} workers")
+    if not total:
+        return {'ok': 0, 'error': 0}
+    scheduler = MemoryScheduler(paths, workers, memory_budget)
+    if scheduler.budget:
+        print(f"Batch: memory budget {scheduler.budget / MB:.0f} MB, "
+              f"largest image estimated at {scheduler.pending[0].estimate / MB:.0f} MB")
+
+    counts = {'ok': 0, 'error': 0}
+    start = time.time()
+    os.makedirs(os.path.dirname(checkpoint_file), exist_ok=True)
+    if report_path:
+        instrumentation.configure(True, instrumentation.TRACK_MEMORY)
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(instrumentation.INSTRUMENTATION_ENABLED, instrumentation.TRACK_MEMORY,
+                  artifacts.SAVE_ARTIFACTS, artifacts.ARTIFACT_DIR, preprocessing.PIPELINE,
+                  1 if workers > 1 else None),  # Worker processes already fill the cores
+    )
+    try:
+        with open(checkpoint_file, 'a', encoding='utf-8') as checkpoint:
+            jobs = scheduler.run(executor, _process_one, peak_of=lambda result: result[0]['peak_bytes'])
+            for n, (path, outcome) in enumerate(jobs, 1):
+                if isinstance(outcome, Exception):
+                    raise outcome  # Pool failure, not the image's fault
+                entry, stage_records = outcome
+                instrumentation.extend(stage_records)
+                counts[entry['status']] += 1
+                append_checkpoint(checkpoint, entry)
+                elapsed = time.time() - start
+                rate = n / elapsed if elapsed else 0.0
+                eta = (total - n) / rate if rate else 0.0
+                metrics = scheduler.metrics()
+                print(f"[{n}/{total}] {entry['file']}: {entry['status']} "
+                      f"({entry['seconds']}s, {rate:.2f}/s, ETA {eta:.0f}s, queued {metrics['queued']}, "
+                      f"in flight {metrics['in_flight']} ~{metrics['in_flight_bytes'] / MB:.0f} MB)")
+                if entry['error']:
+                    print(f"    {entry['error']}")
+    except KeyboardInterrupt:
+        print("Batch interrupted, progress saved to checkpoint.")
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+    metrics = scheduler.metrics()
+    if report_path:
+        instrumentation.write_report(report_path, extra={'scheduler': metrics})
+    print(f"Batch scheduler: peak {metrics['peak_in_flight']} in flight, ~{metrics['peak_in_flight_bytes'] / MB:.0f} MB, "
+          f"{metrics['deferred']} starts deferred for memory, {metrics['bytes_per_pixel']} bytes/pixel")
+    print(f"Batch done: {counts['ok']} ok, {counts['error']} errors in {time.time() - start:.1f}s")
+    return counts
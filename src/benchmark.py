@@ -0,0 +1,372 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+import contextlib
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+import cache
+import instrumentation
+import stored_data
+from preprocessing import load_pipeline
+
+BENCH_DIR = os.path.join(os.path.dirname(__file__), '../data/bench')
+GROUND_TRUTH_FILE = 'ground_truth.jsonl'
+FIELDS = ('station', 'address', 'fuel_type', 'fuel_price_per_liter', 'fuel_liters', 'amount', 'date', 'time')
+NUMERIC_FIELDS = ('fuel_price_per_liter', 'fuel_liters', 'amount')
+
+# Monospace fonts with Lithuanian glyphs, first existing one is used
+FONT_CANDIDATES = [
+    '/usr/share/fonts/truetype/dejavu/DejaVuSansMono.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/System/Library/Fonts/Menlo.ttc',
+    '/Library/Fonts/Arial Unicode.ttf',
+    'C:/Windows/Fonts/consola.ttf',
+]
+
+STATIONS = ['Alauša', 'Viada LT', 'Baltic Petroleum', 'Orlen Lietuva', 'Circle K Lietuva', 'Neste Lietuva']
+STREETS = ['Kauno', 'Savanorių', 'Ukmergės', 'Vilniaus', 'Taikos', 'Pramonės', 'Žalgirio', 'Laisvės']
+CITIES = ['Vilnius', 'Kaunas', 'Klaipėda', 'Šiauliai', 'Panevėžys', 'Alytus']
+FUEL_TYPES = ['Dyzelinas', 'Benzinas', 'Dujos']
+
+
+def load_font(size):
+    for path in FONT_CANDIDATES:
+        if os.path.exists(path):
+            return ImageFont.truetype(path, size)
+    return ImageFont.load_default(size=size)
+
+
+def random_truth(rng):
+    """
+    Ground truth for one synthetic fuel receipt, values formatted the way
+    extract_entities returns them.
+    """
+    price = rng.randint(1200, 1999) / 1000
+    liters = rng.randint(5000, 60000) / 1000
+    return {
+        'station': rng.choice(STATIONS),
+        # Address as kept in addresses.json, the receipt line adds the city
+        'address': f"{rng.choice(STREETS)} g. {rng.randint(1, 199)}",
+        'city': rng.choice(CITIES),
+        'fuel_type': rng.choice(FUEL_TYPES),
+        'fuel_price_per_liter': f"{price:.3f}".replace('.', ','),
+        'fuel_liters': f"{liters:.3f}".replace('.', ','),
+        'amount': f"{round(price * liters, 2):.2f}".replace('.', ','),
+        'date': f"2024.{rng.randint(1, 12):02d}.{rng.randint(1, 28):02d}",
+        'time': f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}",
+    }
+
+
+def receipt_lines(truth, rng):
+    lines = [
+        f'UAB "{truth["station"]}"',
+        f"{truth['address']}, {truth['city']}",
+        f"PVM mok. kodas LT{rng.randint(100000000, 999999999)}",
+        '',
+        truth['fuel_type'],
+        f"{truth['fuel_price_per_liter']} X {truth['fuel_liters']}",
+        f"Kuro kolonėlė {rng.randint(1, 8)}",
+        '',
+        f"Mokėti {truth['amount']}",
+        f"Kortelės mokėjimas {truth['amount']}",
+        f"PVM 21% {float(truth['amount'].replace(',', '.')) * 0.21 / 1.21:.2f}".replace('.', ','),
+        '',
+        f"Kvito Nr. {rng.randint(1000, 99999)}",
+        f"{truth['date']} {truth['time']}",
+        'Ačiū, kad apsipirkote!',
+    ]
+    return lines
+
+
+def render_receipt(lines, font_size=28):
+    """
+    Clean receipt: black text on white paper, grayscale PIL image.
+    """
+    font = load_font(font_size)
+    line_height = int(font_size * 1.5)
+    width = int(font_size * 0.62 * max(len(line) for line in lines)) + 2 * font_size
+    height = line_height * len(lines) + 2 * font_size
+    paper = Image.new('L', (width, height), 250)
+    draw = ImageDraw.Draw(paper)
+    for i, line in enumerate(lines):
+        draw.text((font_size, font_size + i * line_height), line, font=font, fill=15)
+    return np.array(paper)
+
+
+def distort(paper, rng, skew=5.0, blur=1.0, lighting=0.3, noise=8.0):
+    """
+    Put the paper on a darker table and apply controlled skew (degrees),
+    blur (gaussian sigma), lighting gradient (0-1 falloff) and sensor noise (std).
+    """
+    h, w = paper.shape
+    margin = max(h, w) // 6
+    canvas = np.full((h + 2 * margin, w + 2 * margin), rng.randint(60, 110), np.float32)
+    canvas[margin:margin + h, margin:margin + w] = paper
+
+    angle = rng.uniform(-skew, skew)
+    ch, cw = canvas.shape
+    M = cv2.getRotationMatrix2D((cw / 2, ch / 2), angle, 1.0)
+    canvas = cv2.warpAffine(canvas, M, (cw, ch), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+    if blur > 0:
+        canvas = cv2.GaussianBlur(canvas, (0, 0), rng.uniform(0.3, 1.0) * blur)
+    if lighting > 0:
+        # Linear gradient in a random direction, darkest corner loses `lighting` of brightness
+        theta = rng.uniform(0, 2 * np.pi)
+        yy, xx = np.mgrid[0:ch, 0:cw].astype(np.float32)
+        ramp = (xx / cw) * np.cos(theta) + (yy / ch) * np.sin(theta)
+        ramp = (ramp - ramp.min()) / max(float(np.ptp(ramp)), 1e-6)
+        canvas *= 1.0 - lighting * ramp
+    if noise > 0:
+        np_rng = np.random.default_rng(rng.randint(0, 2**31))
+        canvas += np_rng.normal(0, noise, canvas.shape).astype(np.float32)
+
+    gray = np.clip(canvas, 0, 255).astype(np.uint8)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR), angle
+
+
+def generate_corpus(out_dir=BENCH_DIR, count=20, seed=0, skew=5.0, blur=1.0, lighting=0.3, noise=8.0):
+    """
+    Write count synthetic receipts to out_dir with ground truth in ground_truth.jsonl.
+    Same seed gives the same corpus.
+    """
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, GROUND_TRUTH_FILE), 'w', encoding='utf-8') as f:
+        for i in range(count):
+            truth = random_truth(rng)
+            image, angle = distort(render_receipt(receipt_lines(truth, rng)), rng, skew, blur, lighting, noise)
+            fname = f"synthetic_{seed}_{i:04d}.png"
+            cv2.imwrite(os.path.join(out_dir, fname), image)
+            f.write(json.dumps({'file': fname, 'skew': round(angle, 2), **truth}, ensure_ascii=False) + '\n')
+    print(f"Generated {count} synthetic receipts in {out_dir}")
+
+
+def load_ground_truth(corpus_dir):
+    with open(os.path.join(corpus_dir, GROUND_TRUTH_FILE), 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def normalize_value(field, value):
+    if value is None:
+        return None
+    if field in NUMERIC_FIELDS:
+        try:
+            return round(float(str(value).replace(',', '.')), 3)
+        except ValueError:
+            return None
+    if field == 'date':
+        return str(value).replace('/', '.').replace('-', '.')
+    return ' '.join(str(value).split()).lower()
+
+
+def field_matches(field, expected, actual):
+    return normalize_value(field, expected) == normalize_value(field, actual)
+
+
+@contextlib.contextmanager
+def sandboxed_store(truths):
+    """
+    Point stored_data at a temporary directory holding the ground truth
+    addresses, so benchmark runs never touch the real data/ store.
+    """
+    names = ('ADDRESS_FILE', 'RECEIPT_DATA_DIR', 'RECEIPT_DB', 'ADDRESS_REVIEW_FILE')
+    saved = {name: getattr(stored_data, name) for name in names}
+    with tempfile.TemporaryDirectory() as tmp:
+        stored_data.ADDRESS_FILE = os.path.join(tmp, 'addresses.json')
+        stored_data.RECEIPT_DATA_DIR = os.path.join(tmp, 'receipts_data')
+        stored_data.RECEIPT_DB = os.path.join(tmp, 'receipts.db')
+        stored_data.ADDRESS_REVIEW_FILE = os.path.join(tmp, 'address_review.jsonl')
+        addresses = {t['address']: t['station'] for t in truths}
+        stored_data.save_addresses([{'address': a, 'station': s} for a, s in addresses.items()])
+        try:
+            yield tmp
+        finally:
+            for name, value in saved.items():
+                setattr(stored_data, name, value)
+
+
+def run_benchmark(corpus_dir=BENCH_DIR, limit=None, use_cache=False, verbose=False, **process_kwargs):
+    """
+    Run the full process_receipt path over a generated corpus.
+    Returns receipts/sec, per-stage latency and per-field accuracy.
+    """
+    from process_receipt import process_receipt
+
+    truths = load_ground_truth(corpus_dir)[:limit]
+    cache_enabled = cache.CACHE_ENABLED
+    cache.CACHE_ENABLED = use_cache
+    instrumentation.configure(True, instrumentation.TRACK_MEMORY)
+    instrumentation.drain()
+    hits = {field: 0 for field in FIELDS}
+    errors = 0
+    start = time.perf_counter()
+    try:
+        with sandboxed_store(truths):
+            for truth in truths:
+                path = os.path.join(corpus_dir, truth['file'])
+                output = io.StringIO()
+                try:
+                    with contextlib.redirect_stdout(sys.stdout if verbose else output):
+                        result, _ = process_receipt(path, interactive=False, **process_kwargs)
+                except Exception as e:
+                    print(f"{truth['file']}: {type(e).__name__}: {e}")
+                    errors += 1
+                    continue
+                for field in FIELDS:
+                    hits[field] += field_matches(field, truth.get(field), result.get(field))
+    finally:
+        cache.CACHE_ENABLED = cache_enabled
+    elapsed = time.perf_counter() - start
+    stage_report = instrumentation.build_report(instrumentation.drain())
+    total = len(truths)
+    return {
+        'receipts': total,
+        'errors': errors,
+        'seconds': elapsed,
+        'receipts_per_sec': total / elapsed if elapsed else 0.0,
+        'field_accuracy': {field: hits[field] / total if total else 0.0 for field in FIELDS},
+        'stages': stage_report['stages'],
+        'passes': stage_report['passes'],
+    }
+
+
+def print_summary(result):
+    print(f"Receipts: {result['receipts']} ({result['errors']} errors) in {result['seconds']:.2f}s, "
+          f"{result['receipts_per_sec']:.3f} receipts/sec")
+    print("Field accuracy:")
+    for field, accuracy in result['field_accuracy'].items():
+        print(f"    {field}: {accuracy:.1%}")
+    print("Stage latency (ms): mean / p50 / p90 / p99")
+    for name, s in sorted(result['stages'].items(), key=lambda x: -x[1]['total']):
+        print(f"    {name}: {s['mean'] * 1000:.1f} / {s['p50'] * 1000:.1f} / "
+              f"{s['p90'] * 1000:.1f} / {s['p99'] * 1000:.1f} (n={s['count']})")
+
+
+def parser_texts(count=2000, seed=0):
+    """
+    Clean synthetic receipt texts, as OCR would return a perfect read.
+    """
+    rng = random.Random(seed)
+    return ['\n'.join(receipt_lines(random_truth(rng), rng)) for _ in range(count)]
+
+
+def run_parser_benchmark(count=2000, seed=0, repeat=5, use_cache_texts=True):
+    """
+    Time bulk re-parsing of cached OCR texts and synthetic receipt texts.
+    Parser correctness against the original implementation is checked by
+    tests/test_parsing.py.
+    """
+    from parsing import extract_entities
+
+    texts = list(cache.iter_texts()) if use_cache_texts else []
+    cached = len(texts)
+    texts += parser_texts(count, seed)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            extract_entities(text)
+        best = min(best, time.perf_counter() - start)
+    return {
+        'texts': len(texts),
+        'cached_texts': cached,
+        'seconds': best,
+        'texts_per_sec': len(texts) / best if best else 0.0,
+    }
+
+
+IMPORT_TARGETS = ('main', 'stored_data', 'aggregates', 'analytics', 'process_receipt', 'service')
+
+
+def time_imports(targets=IMPORT_TARGETS, repeat=5):
+    """
+    Cold import time of each module and of `main.py --help`, best of repeat
+    runs in fresh interpreters. Also reports whether cv2 got imported.
+    """
+    src = os.path.dirname(os.path.abspath(__file__))
+    probe = ("import sys, time; start = time.perf_counter(); import {0}; "
+             "print(time.perf_counter() - start, 'cv2' in sys.modules)")
+    results = {}
+    for target in targets:
+        runs = []
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, '-c', probe.format(target)], cwd=src,
+                                 capture_output=True, text=True, check=True).stdout.split()
+            runs.append(float(out[0]))
+        results[target] = {'seconds': min(runs), 'loads_cv2': out[1] == 'True'}
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(src, 'main.py'), '--help'], cwd=src,
+                       capture_output=True, check=True)
+        runs.append(time.perf_counter() - start)
+    results['main.py --help'] = {'seconds': min(runs), 'loads_cv2': None}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic fuel receipt benchmark")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    gen = sub.add_parser('generate', help="Generate a synthetic corpus with ground truth")
+    gen.add_argument('--out', default=BENCH_DIR)
+    gen.add_argument('--count', type=int, default=20)
+    gen.add_argument('--seed', type=int, default=0)
+    gen.add_argument('--skew', type=float, default=5.0, help="Max skew in degrees")
+    gen.add_argument('--blur', type=float, default=1.0, help="Max gaussian blur sigma")
+    gen.add_argument('--lighting', type=float, default=0.3, help="Lighting gradient strength 0-1")
+    gen.add_argument('--noise', type=float, default=8.0, help="Gaussian noise std")
+
+    run = sub.add_parser('run', help="Benchmark process_receipt on a corpus")
+    run.add_argument('--corpus', default=BENCH_DIR)
+    run.add_argument('--limit', type=int)
+    run.add_argument('--workers', type=int, help="Multipass worker threads")
+    run.add_argument('--adaptive', action='store_true', help="Use adaptive multipass")
+    run.add_argument('--roi', action='store_true', help="OCR only text bands (region-of-interest multipass)")
+    run.add_argument('--qr-first', action='store_true', help="QR page fields plus one OCR pass when a QR code decodes")
+    run.add_argument('--pipeline', help="Preprocessing pipeline JSON, e.g. written by autotune.py")
+    run.add_argument('--cache', action='store_true', help="Allow result cache hits")
+    run.add_argument('--output', help="Write the full result as JSON")
+    run.add_argument('--verbose', action='store_true')
+
+    parse = sub.add_parser('parser', help="Time extract_entities on cached and synthetic OCR text")
+    parse.add_argument('--count', type=int, default=2000, help="Synthetic texts")
+    parse.add_argument('--seed', type=int, default=0)
+    parse.add_argument('--repeat', type=int, default=5)
+    parse.add_argument('--no-cache', action='store_true', help="Skip cached OCR texts")
+
+    imports = sub.add_parser('imports', help="Cold import and CLI startup times")
+    imports.add_argument('--repeat', type=int, default=5)
+
+    args = parser.parse_args(argv)
+    if args.command == 'generate':
+        generate_corpus(args.out, args.count, args.seed, args.skew, args.blur, args.lighting, args.noise)
+    elif args.command == 'run':
+        result = run_benchmark(args.corpus, args.limit, args.cache, args.verbose,
+                               workers=args.workers, adaptive=args.adaptive or None,
+                               roi=args.roi or None, qr_first=args.qr_first or None,
+                               pipeline=load_pipeline(args.pipeline) if args.pipeline else None)
+        print_summary(result)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2)
+    elif args.command == 'parser':
+        result = run_parser_benchmark(args.count, args.seed, args.repeat, not args.no_cache)
+        print(f"Texts: {result['texts']} ({result['cached_texts']} from cache), "
+              f"{result['seconds']:.3f}s, {result['texts_per_sec']:.0f} texts/s")
+    elif args.command == 'imports':
+        for target, result in time_imports(repeat=args.repeat).items():
+            cv2_note = '' if result['loads_cv2'] is None else (', loads cv2' if result['loads_cv2'] else '')
+            print(f"{target:<16} {result['seconds'] * 1000:7.1f} ms{cv2_note}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import os
+import json
+import hashlib
+import threading
+import parsing
+
+# OpenCV, NumPy, preprocessing and OCR are imported where they are used, so
+# page and text lookups (scraping, service, store tools) start fast.
+
+# === Result cache controls ===
+CACHE_ENABLED = True
+CACHE_DIR = os.path.join(os.path.dirname(__file__), '../data/cache')
+CACHE_MAX_BYTES = 512 * 1024 * 1024  # LRU eviction above this size
+# Fetched QR pages, kept apart from the LRU cache: they never change and
+# fetching them again costs a rate limited request, so they are not evicted
+PAGE_CACHE_DIR = os.path.join(os.path.dirname(__file__), '../data/pages')
+# preprocessing.py globals kept out of params_hash: the stage function table,
+# PIPELINE (hashed as the resolved pipeline) and settings that do not change output
+PARAMS_HASH_EXCLUDE = ('PIPELINE_STAGES', 'PIPELINE', 'REUSE_BUFFERS')
+
+_lock = threading.Lock()
+_cache_size = None  # Bytes on disk, scanned lazily, then tracked on writes
+_parser_hash = None
+
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def image_hash(source):
+    """
+    Content hash of the source image: file path, encoded bytes or decoded
+    array. A file and its bytes hash the same.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return _digest(bytes(source))
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return _digest(f.read())
+    import numpy as np
+    return _digest('ndarray', source.shape, source.dtype.str, np.ascontiguousarray(source).tobytes())
+
+
+def params_hash(clip_limit=None, pipeline=None):
+    """
+    Hash of the preprocessing.py settings, the clip limit and the pipeline
+    that will run (stage names and params). Changing any preprocessing
+    setting invalidates dependent entries. Callables (the PIPELINE_STAGES
+    functions) are left out, their repr holds a per-process address.
+    """
+    import preprocessing
+    params = {k: v for k, v in vars(preprocessing).items()
+              if k.isupper() and k not in PARAMS_HASH_EXCLUDE and not callable(v)}
+    params['pipeline'] = [[name, dict(stage_params)] for name, stage_params in preprocessing.get_pipeline(pipeline)]
+    return _digest(json.dumps(params, sort_keys=True, default=str), clip_limit)[:16]
+
+
+def parser_hash():
+    """
+    Hash of parsing.py source, so parser changes only invalidate entities.
+    """
+    global _parser_hash
+    if _parser_hash is None:
+        with open(parsing.__file__, 'rb') as f:
+            _parser_hash = _digest(f.read())[:16]
+    return _parser_hash
+
+
+def prepared_key(img_hash):
+    return f"{img_hash[:32]}-{params_hash()}"
+
+
+def ocr_key(img_hash, clip_limit, ocr_kind='string', pipeline=None):
+    """
+    Key for one multipass variant. ocr_kind separates image_to_string and
+    image_to_data output, their text differs in whitespace. OCR engine and
+    language are part of the key as well.
+    """
+    from ocr import ocr_signature
+    ocr_params = _digest(ocr_signature(), ocr_kind)[:8]
+    return f"{img_hash[:32]}-{params_hash(clip_limit, pipeline)}-{ocr_kind}-{ocr_params}"
+
+
+def _path(key, suffix):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.{suffix}")
+
+
+def _read(key, suffix, mode='r'):
+    if not CACHE_ENABLED:
+        return None
+    path = _path(key, suffix)
+    try:
+        with open(path, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+            data = f.read()
+    except OSError:
+        return None
+    # Mark as recently used for LRU eviction
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return data
+
+
+def _write(key, suffix, data):
+    global _cache_size
+    if not CACHE_ENABLED:
+        return
+    path = _path(key, suffix)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')  # Size is tracked in bytes on disk
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    with _lock:
+        if _cache_size is None:
+            _cache_size = _scan()[1]
+        else:
+            _cache_size += len(data)
+        over = _cache_size > CACHE_MAX_BYTES
+    if over:
+        evict()
+
+
+def _scan():
+    entries = []
+    total = 0
+    for root, _, files in os.walk(CACHE_DIR):
+        for fname in files:
+            path = os.path.join(root, fname)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+    return entries, total
+
+
+def evict(max_bytes=None):
+    """
+    Remove least recently used entries until the cache fits in max_bytes
+    (default 90% of CACHE_MAX_BYTES, so eviction does not run on every write).
+    """
+    global _cache_size
+    if max_bytes is None:
+        max_bytes = int(CACHE_MAX_BYTES * 0.9)
+    with _lock:
+        entries, total = _scan()
+        entries.sort()
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        _cache_size = total
+
+
+def get_prepared(img_hash):
+    """
+    Cached prepare_image outcome: {"qr_url": ..., "ok": bool} or None.
+    """
+    data = _read(prepared_key(img_hash), 'prepared.json')
+    return json.loads(data) if data is not None else None
+
+
+def put_prepared(img_hash, qr_url, ok):
+    _write(prepared_key(img_hash), 'prepared.json', json.dumps({"qr_url": qr_url, "ok": ok}))
+
+
+def get_text(key):
+    """
+    Cached OCR output: {"text": ..., "confidence": ...} or None.
+    """
+    data = _read(key, 'ocr.json')
+    return json.loads(data) if data is not None else None
+
+
+def put_text(key, text, confidence=None):
+    _write(key, 'ocr.json', json.dumps({"text": text, "confidence": confidence}, ensure_ascii=False))
+
+
+def iter_texts():
+    """
+    All cached OCR texts, for bulk re-parsing.
+    """
+    for root, _, files in os.walk(CACHE_DIR):
+        for fname in files:
+            if fname.endswith('.ocr.json'):
+                try:
+                    with open(os.path.join(root, fname), 'r', encoding='utf-8') as f:
+                        yield json.load(f)["text"]
+                except (OSError, ValueError, KeyError):
+                    continue
+
+
+def get_entities(key):
+    data = _read(key, f"{parser_hash()}.entities.json")
+    return json.loads(data) if data is not None else None
+
+
+def put_entities(key, entities):
+    _write(key, f"{parser_hash()}.entities.json", json.dumps(entities, ensure_ascii=False))
+
+
+def page_key(url):
+    return _digest('page', url)
+
+
+def _page_path(url):
+    key = page_key(url)
+    return os.path.join(PAGE_CACHE_DIR, key[:2], f"{key}.html")
+
+
+def get_page(url):
+    """
+    Saved body of a fetched page (VMI QR receipt pages), None if not saved.
+    """
+    if not CACHE_ENABLED:
+        return None
+    try:
+        with open(_page_path(url), 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def put_page(url, html):
+    """
+    Save a page under PAGE_CACHE_DIR, outside LRU eviction and the size limit.
+    """
+    if not CACHE_ENABLED:
+        return
+    path = _page_path(url)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(html)
+    os.replace(tmp_path, path)
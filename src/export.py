@@ -0,0 +1,104 @@
+import os
+import csv
+import sys
+import json
+from normalization import to_date
+from receipt_store import COLUMNS, NUMERIC_COLUMNS
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Optional, only needed for Parquet
+    pyarrow = None
+
+# === Export controls ===
+EXPORT_BATCH_SIZE = 10000  # Rows held at once for Parquet row groups
+EXPORT_COLUMNS = ('id',) + COLUMNS
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+
+def detect_format(path, fmt=None):
+    """
+    Export format from fmt or the file extension.
+    """
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    fmt = {'json': 'jsonl', 'ndjson': 'jsonl', 'pq': 'parquet'}.get(fmt, fmt)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt or path}, use one of {', '.join(FORMATS)}")
+    return fmt
+
+
+def _write_csv(cursor, f):
+    writer = csv.writer(f)
+    writer.writerow(EXPORT_COLUMNS)
+    count = 0
+    for row in cursor:
+        writer.writerow(['' if value is None else value for value in row])
+        count += 1
+    return count
+
+
+def _write_jsonl(cursor, f):
+    count = 0
+    for row in cursor:
+        f.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False))
+        f.write('\n')
+        count += 1
+    return count
+
+
+def _parquet_schema():
+    fields = []
+    for column in EXPORT_COLUMNS:
+        if column in NUMERIC_COLUMNS:
+            kind = pyarrow.float64()
+        elif column == 'date':
+            kind = pyarrow.date32()
+        else:
+            kind = pyarrow.string()
+        fields.append(pyarrow.field(column, kind))
+    return pyarrow.schema(fields)
+
+
+def _write_parquet(cursor, path):
+    if pyarrow is None:
+        raise ImportError("Parquet export needs pyarrow: pip install pyarrow")
+    schema = _parquet_schema()
+    date_index = EXPORT_COLUMNS.index('date')
+    count = 0
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            # One row group per batch, only EXPORT_BATCH_SIZE rows in memory
+            columns = [list(values) for values in zip(*rows)]
+            columns[date_index] = [to_date(value) for value in columns[date_index]]
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema))
+            count += len(rows)
+    return count
+
+
+def export_receipts(path, fmt=None, store=None, date_from=None, date_to=None, station=None, fuel_type=None):
+    """
+    Stream receipts from the store to CSV, JSONL or Parquet at path ('-' for
+    stdout, text formats only). Rows go straight from the SQLite cursor to
+    the file, memory use does not grow with the number of receipts.
+    Returns the number of receipts written.
+    """
+    fmt = detect_format(path if path != '-' else '', fmt)
+    if store is None:
+        from stored_data import get_store
+        store = get_store()
+    cursor = store.columns(EXPORT_COLUMNS, date_from, date_to, station, fuel_type)
+    if fmt == 'parquet':
+        if path == '-':
+            raise ValueError("Parquet export needs a file path")
+        return _write_parquet(cursor, path)
+    writer = _write_csv if fmt == 'csv' else _write_jsonl
+    if path == '-':
+        return writer(cursor, sys.stdout)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        return writer(cursor, f)
@@ -0,0 +1,170 @@
+import os
+import csv
+import math
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+# === Instrumentation controls ===
+INSTRUMENTATION_ENABLED = False
+TRACK_MEMORY = False  # tracemalloc peak per stage, adds noticeable overhead
+
+_records = []
+_records_lock = threading.Lock()
+_local = threading.local()
+_open_peaks = {}  # Open memory-tracked stage -> highest traced memory seen since it started
+_peak_lock = threading.Lock()
+
+
+def configure(enabled=True, track_memory=False):
+    """
+    Turn recording on/off. Also used as a process pool initializer.
+    """
+    global INSTRUMENTATION_ENABLED, TRACK_MEMORY
+    INSTRUMENTATION_ENABLED = enabled
+    TRACK_MEMORY = track_memory
+    if enabled and track_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def current_labels():
+    return dict(getattr(_local, 'labels', {}))
+
+
+@contextmanager
+def labels(**new_labels):
+    """
+    Attach labels (receipt, clip_limit, ...) to stages recorded in this thread.
+    """
+    previous = getattr(_local, 'labels', {})
+    _local.labels = {**previous, **new_labels}
+    try:
+        yield
+    finally:
+        _local.labels = previous
+
+
+@contextmanager
+def stage(name):
+    """
+    Record wall time (and peak traced memory with TRACK_MEMORY) of a block.
+    Nested stages keep their own peaks: before a stage resets the tracemalloc
+    peak, the peak so far is carried into every stage still open, so an
+    enclosing stage's peak includes its children. The peak is process-wide,
+    with parallel stages it is an upper bound.
+    """
+    if not INSTRUMENTATION_ENABLED:
+        yield
+        return
+    track = TRACK_MEMORY and tracemalloc.is_tracing()
+    if track:
+        token = object()
+        with _peak_lock:
+            _, peak = tracemalloc.get_traced_memory()
+            for open_stage, seen in _open_peaks.items():
+                _open_peaks[open_stage] = max(seen, peak)
+            tracemalloc.reset_peak()
+            start_mem, _ = tracemalloc.get_traced_memory()
+            _open_peaks[token] = start_mem
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        record = {'stage': name, 'seconds': seconds, **current_labels()}
+        if track:
+            with _peak_lock:
+                _, peak = tracemalloc.get_traced_memory()
+                record['peak_bytes'] = max(0, max(_open_peaks.pop(token), peak) - start_mem)
+        with _records_lock:
+            _records.append(record)
+
+
+def records():
+    with _records_lock:
+        return list(_records)
+
+
+def drain():
+    """
+    Return and clear recorded stages, used to ship records from pool workers.
+    """
+    with _records_lock:
+        drained = list(_records)
+        _records.clear()
+    return drained
+
+
+def extend(new_records):
+    with _records_lock:
+        _records.extend(new_records)
+
+
+def percentile(sorted_values, pct):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def _summarize(group):
+    seconds = sorted(r['seconds'] for r in group)
+    summary = {
+        'count': len(seconds),
+        'total': sum(seconds),
+        'mean': sum(seconds) / len(seconds),
+        'p50': percentile(seconds, 50),
+        'p90': percentile(seconds, 90),
+        'p99': percentile(seconds, 99),
+        'max': seconds[-1],
+    }
+    peaks = [r['peak_bytes'] for r in group if 'peak_bytes' in r]
+    if peaks:
+        summary['peak_bytes_max'] = max(peaks)
+    return summary
+
+
+def build_report(run_records=None):
+    """
+    Per-stage and per-(stage, clip_limit) timing summaries.
+    """
+    run_records = records() if run_records is None else run_records
+    by_stage = {}
+    by_pass = {}
+    for r in run_records:
+        by_stage.setdefault(r['stage'], []).append(r)
+        if r.get('clip_limit') is not None:
+            by_pass.setdefault((r['stage'], r['clip_limit']), []).append(r)
+    return {
+        'receipts': len({r['receipt'] for r in run_records if r.get('receipt')}),
+        'stages': {name: _summarize(group) for name, group in by_stage.items()},
+        'passes': [
+            {'stage': name, 'clip_limit': clip_limit, **_summarize(group)}
+            for (name, clip_limit), group in sorted(by_pass.items(), key=lambda x: (x[0][0], x[0][1]))
+        ],
+    }
+
+
+def write_report(path, run_records=None, extra=None):
+    """
+    Write the summary as JSON to path and raw stage records as CSV next to it.
+    extra adds top-level sections, e.g. scheduler metrics.
+    """
+    run_records = records() if run_records is None else run_records
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    report = build_report(run_records)
+    report.update(extra or {})
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    csv_path = os.path.splitext(path)[0] + '.csv'
+    fields = ['receipt', 'clip_limit', 'stage', 'seconds', 'peak_bytes']
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(run_records)
+    print(f"Saved run report to {path} and {csv_path}")
@@ -0,0 +1,219 @@
+from bisect import bisect_right
+import cv2
+import numpy as np
+from parsing import (FUEL_AMOUNT_RE, STATION_RE, STATION_SUFFIX_RE, ADDRESS_KEYWORD_RE, DATE_RE, TIME_RE, AMOUNT_RE,
+                     FUEL_TYPE_RE)
+
+# === Layout controls ===
+BAND_MIN_INK = 0.005  # Fraction of inked pixels for a row to count as text
+BAND_MERGE_GAP = 0.35  # Gaps below this * median line height are joined (diacritics, underlines)
+BAND_MIN_HEIGHT = 4  # px, shorter runs are specks
+GRAPHIC_HEIGHT_RATIO = 3.0  # Bands this many median line heights tall are logos/QR codes
+GRAPHIC_DENSITY = 0.45  # Bands with more ink than this are graphics, text is mostly paper
+BAND_PAD = 0.3  # Padding around each crop, in median line heights
+PAPER_MIN_AREA = 0.2  # Bright region must cover this much of the image to count as the receipt paper
+
+# Band kinds that extract_entities reads, and the fields each one holds
+FIELD_GROUPS = {
+    'header': ('station', 'address'),
+    'fuel': ('fuel_type', 'fuel_price_per_liter', 'fuel_liters'),
+    'total': ('amount',),
+    'footer': ('date', 'time'),
+}
+
+
+class Band:
+    """
+    Horizontal strip of the receipt holding one text line (or a graphic).
+    Rows are [top, bottom), columns [left, right).
+    """
+    __slots__ = ('top', 'bottom', 'left', 'right', 'graphic')
+
+    def __init__(self, top, bottom, left, right, graphic=False):
+        self.top = top
+        self.bottom = bottom
+        self.left = left
+        self.right = right
+        self.graphic = graphic
+
+    @property
+    def height(self):
+        return self.bottom - self.top
+
+    def __repr__(self):
+        kind = 'graphic' if self.graphic else 'text'
+        return f"Band({self.top}:{self.bottom}, {self.left}:{self.right}, {kind})"
+
+
+def _runs(mask):
+    """
+    [start, end) of consecutive True runs in a 1-D mask.
+    """
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def find_paper(gray):
+    """
+    Bounding box (top, bottom, left, right) of the receipt paper: the
+    largest bright region. Whole image if there is no clear paper region
+    (receipt fills the frame).
+    """
+    h, w = gray.shape
+    paper = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    count, _, stats, _ = cv2.connectedComponentsWithStats(paper, connectivity=4)
+    if count < 2:
+        return 0, h, 0, w
+    largest = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    x, y, pw, ph, area = stats[largest]
+    if area < PAPER_MIN_AREA * h * w:
+        return 0, h, 0, w
+    # Inset a little, paper edges and shadows are not text
+    dy, dx = int(ph * 0.01), int(pw * 0.01)
+    return y + dy, y + ph - dy, x + dx, x + pw - dx
+
+
+def find_text_bands(gray):
+    """
+    Split a deskewed grayscale receipt into text-line bands from the
+    horizontal projection profile of dark ink on the paper. Blank paper is
+    dropped, tall or dense blocks (logo, QR code) are marked as graphics.
+    Band coordinates are in gray.
+    """
+    top, bottom, left, right = find_paper(gray)
+    bands = _find_bands(gray[top:bottom, left:right])
+    for band in bands:
+        band.top += top
+        band.bottom += top
+        band.left += left
+        band.right += left
+    return bands
+
+
+def _find_bands(gray):
+    h, w = gray.shape
+    ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+    profile = np.count_nonzero(ink, axis=1)
+    runs = _runs(profile > max(2, BAND_MIN_INK * w))
+    if not runs:
+        return []
+    heights = [end - start for start, end in runs if end - start >= BAND_MIN_HEIGHT]
+    line_height = float(np.median(heights)) if heights else float(BAND_MIN_HEIGHT)
+
+    # Join diacritics and split glyph parts back onto their line
+    merged = [list(runs[0])]
+    for start, end in runs[1:]:
+        if start - merged[-1][1] < max(2, BAND_MERGE_GAP * line_height):
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    merged = [(start, end) for start, end in merged if end - start >= BAND_MIN_HEIGHT]
+    if not merged:
+        return []
+    line_height = float(np.median([end - start for start, end in merged]))
+
+    pad = max(2, int(BAND_PAD * line_height))
+    bands = []
+    for start, end in merged:
+        columns = np.flatnonzero(np.count_nonzero(ink[start:end], axis=0))
+        if columns.size == 0:
+            continue
+        density = np.count_nonzero(ink[start:end, columns[0]:columns[-1] + 1]) / (
+            (end - start) * (columns[-1] + 1 - columns[0]))
+        graphic = (end - start) > GRAPHIC_HEIGHT_RATIO * line_height or density > GRAPHIC_DENSITY
+        bands.append(Band(max(0, start - pad), min(h, end + pad),
+                          max(0, int(columns[0]) - pad), min(w, int(columns[-1]) + 1 + pad), graphic))
+    return bands
+
+
+def classify_text(text):
+    """
+    FIELD_GROUPS kinds a band's OCR text belongs to, same patterns as
+    extract_entities.
+    """
+    kinds = set()
+    if STATION_RE.search(text) or STATION_SUFFIX_RE.search(text) or ADDRESS_KEYWORD_RE.search(text):
+        kinds.add('header')
+    if FUEL_AMOUNT_RE.search(text) or FUEL_TYPE_RE.search(text):
+        kinds.add('fuel')
+    if AMOUNT_RE.search(text):
+        kinds.add('total')
+    if DATE_RE.search(text) or TIME_RE.search(text):
+        kinds.add('footer')
+    return kinds
+
+
+def compose_strip(gray, bands):
+    """
+    Stack band crops into one compact image for a single OCR call.
+    Returns (strip, tops), tops[i] is the strip row where band i starts.
+    """
+    # Fill with the paper tone of the crops themselves, not the table around the receipt
+    paper = int(np.median(np.concatenate([gray[b.top:b.bottom:4, b.left:b.right:4].ravel() for b in bands])))
+    gap = max(8, int(np.median([b.height for b in bands]) // 2))
+    width = max(b.right - b.left for b in bands) + 2 * gap
+    height = sum(b.height for b in bands) + gap * (len(bands) + 1)
+    strip = np.full((height, width), paper, dtype=gray.dtype)
+    tops = []
+    y = gap
+    for b in bands:
+        strip[y:y + b.height, gap:gap + b.right - b.left] = gray[b.top:b.bottom, b.left:b.right]
+        tops.append(y)
+        y += b.height + gap
+    return strip, tops
+
+
+def assign_lines(lines, tops):
+    """
+    Map OCR lines [(top, bottom, text)] from a composed strip back to bands
+    by line centre. Returns one text per band, lines joined with newlines.
+    """
+    texts = [[] for _ in tops]
+    for top, bottom, text in lines:
+        i = bisect_right(tops, (top + bottom) / 2) - 1
+        texts[max(i, 0)].append(text)
+    return ['\n'.join(t) for t in texts]
+
+
+def bands_for_fields(kinds, fields):
+    """
+    Indices of bands holding any of the fields, with the lines around
+    address lines since extract_entities reads address context from them.
+    """
+    selected = set()
+    for i, band_kinds in enumerate(kinds):
+        for kind in band_kinds:
+            if any(field in fields for field in FIELD_GROUPS[kind]):
+                selected.add(i)
+                if kind == 'header':
+                    selected.update(j for j in (i - 1, i + 1) if 0 <= j < len(kinds))
+    return sorted(selected)
+
+
+def split_tiles(image, target_height):
+    """
+    Horizontal tiles [(top, bottom)] of about target_height for a tall
+    image. Cuts go through blank rows between text lines and each tile
+    starts one text line above the previous cut, so no line is cut in half
+    and neighbouring tiles overlap by one line.
+    """
+    h, w = image.shape[:2]
+    if h <= target_height:
+        return [(0, h)]
+    ink = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+    profile = np.count_nonzero(ink, axis=1)
+    gaps = [int(start + end) // 2 for start, end in _runs(profile <= max(1, 0.001 * w)) if 0 < start and end < h]
+    tiles = []
+    top = 0
+    while h - top > target_height * 1.25:
+        candidates = [g for g in gaps if g > top + target_height // 2]
+        if not candidates:
+            break
+        cut = min(candidates, key=lambda g: abs(g - top - target_height))
+        if cut >= h - target_height // 4:
+            break
+        tiles.append((top, cut))
+        previous = [g for g in gaps if top + target_height // 2 < g < cut]
+        top = previous[-1] if previous else cut
+    tiles.append((top, h))
+    return tiles
@@ -1,18 +1,175 @@
-import sys
 import os
-from process_receipt import process_receipt
+import sys
+import json
+import argparse
+
+# Subsystems are imported inside the command that needs them: `query` and
+# `report` never load OpenCV or Tesseract, `--help` loads nothing.
 
 RECEIPT_DIR = os.path.join(os.path.dirname(__file__), '../receipts')
+COMMANDS = ('process', 'batch', 'watch', 'serve', 'query', 'report', 'export', 'bench')
 
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print(f"Usage: python main.py <receipt_image>")
-        print(f"Or place images in {RECEIPT_DIR} and run without arguments.")
-        for fname in os.listdir(RECEIPT_DIR):
-            if '-processed' in fname or '_visualization' in fname:
-                continue
-            if fname.lower().endswith(('.png', '.jpg', '.jpeg', '.tiff', '.bmp')):
-                process_receipt(os.path.join(RECEIPT_DIR, fname))
+def _configure(args):
+    import instrumentation
+    if getattr(args, 'save_artifacts', False):
+        import artifacts
+        artifacts.configure(True)
+    if getattr(args, 'report', None):
+        instrumentation.configure(True, args.track_memory)
+    if getattr(args, 'pipeline', None):
+        import preprocessing
+        preprocessing.PIPELINE = preprocessing.load_pipeline(args.pipeline)
+
+
+def cmd_process(args):
+    _configure(args)
+    from process_receipt import process_receipt
+    for image in args.images:
+        process_receipt(image, workers=args.workers, interactive=not args.no_prompt, qr_first=args.qr_first or None)
+    if args.report:
+        import instrumentation
+        instrumentation.write_report(args.report)
+
+
+def cmd_batch(args):
+    _configure(args)
+    from batch import run_batch
+    budget = args.memory_budget * 1024 * 1024 if args.memory_budget else None
+    run_batch(args.directory, workers=args.workers, report_path=args.report, memory_budget=budget)
+
+
+def cmd_watch(args):
+    _configure(args)
+    from watch import FolderWatcher
+    FolderWatcher(args.directory, workers=args.workers).run(report_path=args.report)
+
+
+def cmd_serve(args):
+    _configure(args)
+    import service
+    service.serve(args.host or service.SERVICE_HOST, args.port or service.SERVICE_PORT, args.workers)
+
+
+def cmd_query(args):
+    from stored_data import get_store
+    store = get_store()
+    filters = dict(date_from=args.date_from, date_to=args.date_to, station=args.station, fuel_type=args.fuel_type)
+    if args.count:
+        print(store.count(**filters))
+        return
+    for record in store.query(limit=args.limit, **filters):
+        if args.json:
+            print(json.dumps(record, ensure_ascii=False))
+        else:
+            print(f"{record['receipt_id']}: {record.get('date')} {record.get('station')} "
+                  f"{record.get('fuel_type')} {record.get('fuel_liters')} l, {record.get('amount')} EUR")
+
+
+def cmd_report(args):
+    if args.running:
+        # Precomputed SQL aggregates, no NumPy
+        from aggregates import running_totals
+        result = running_totals()
     else:
-        process_receipt(sys.argv[1])
+        from analytics import report
+        result = report()
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"Report written to {args.output}")
+    else:
+        print(text)
+
+
+def cmd_export(args):
+    from export import export_receipts
+    count = export_receipts(args.output, args.format, date_from=args.date_from, date_to=args.date_to,
+                            station=args.station, fuel_type=args.fuel_type)
+    if args.output != '-':
+        print(f"Exported {count} receipts to {args.output}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Fuel receipt reader")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_options = argparse.ArgumentParser(add_help=False)
+    run_options.add_argument('--workers', type=int, help="Worker count (processes, threads or service workers)")
+    run_options.add_argument('--report', help="Write per-stage timing report JSON (and CSV) to this path")
+    run_options.add_argument('--track-memory', action='store_true', help="Record peak memory per stage in the report")
+    run_options.add_argument('--save-artifacts', action='store_true',
+                             help="Write -processed images and deskew/brightness visualizations for debugging")
+    run_options.add_argument('--pipeline', help="Preprocessing pipeline JSON, e.g. written by autotune.py")
+
+    process = sub.add_parser('process', parents=[run_options], help="Process receipt images")
+    process.add_argument('images', nargs='+')
+    process.add_argument('--no-prompt', action='store_true',
+                         help="Queue unknown addresses for review instead of asking")
+    process.add_argument('--qr-first', action='store_true',
+                         help="Take amount/address from the receipt's QR page, OCR once for the rest")
+    process.set_defaults(func=cmd_process)
+
+    batch = sub.add_parser('batch', parents=[run_options], help="Process a directory on a process pool, resumable")
+    batch.add_argument('directory', nargs='?', default=RECEIPT_DIR)
+    batch.add_argument('--memory-budget', type=int, metavar='MB',
+                       help="Memory the batch may use, default 70%% of what is available")
+    batch.set_defaults(func=cmd_batch)
+
+    watch = sub.add_parser('watch', parents=[run_options], help="Keep processing new images as they appear")
+    watch.add_argument('directory', nargs='?', default=RECEIPT_DIR)
+    watch.set_defaults(func=cmd_watch)
+
+    serve = sub.add_parser('serve', parents=[run_options], help="Run the local HTTP receipt service")
+    serve.add_argument('--host')
+    serve.add_argument('--port', type=int)
+    serve.set_defaults(func=cmd_serve)
+
+    query = sub.add_parser('query', help="List stored receipts")
+    query.add_argument('--from', dest='date_from', help="YYYY-MM-DD")
+    query.add_argument('--to', dest='date_to', help="YYYY-MM-DD")
+    query.add_argument('--station')
+    query.add_argument('--fuel-type')
+    query.add_argument('--limit', type=int)
+    query.add_argument('--count', action='store_true', help="Only print the number of matching receipts")
+    query.add_argument('--json', action='store_true', help="One JSON record per line")
+    query.set_defaults(func=cmd_query)
+
+    report = sub.add_parser('report', help="Expense analytics over stored receipts")
+    report.add_argument('--running', action='store_true', help="Only the running monthly/station totals")
+    report.add_argument('--output', help="Write JSON here instead of stdout")
+    report.set_defaults(func=cmd_report)
+
+    export = sub.add_parser('export', help="Stream stored receipts to CSV, JSONL or Parquet")
+    export.add_argument('output', help="Output file, format from the extension; - for stdout")
+    export.add_argument('--format', choices=('csv', 'jsonl', 'parquet'), help="Override the extension")
+    export.add_argument('--from', dest='date_from', help="YYYY-MM-DD")
+    export.add_argument('--to', dest='date_to', help="YYYY-MM-DD")
+    export.add_argument('--station')
+    export.add_argument('--fuel-type')
+    export.set_defaults(func=cmd_export)
+
+    bench = sub.add_parser('bench', add_help=False, help="Benchmark suite, see benchmark.py --help")
+    bench.add_argument('bench_args', nargs=argparse.REMAINDER)
+    bench.set_defaults(func=lambda args: __import__('benchmark').main(args.bench_args))
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # Old style invocations: no arguments runs the batch, an image path processes it
+    if not argv:
+        argv = ['batch']
+    elif argv[0] not in COMMANDS and not argv[0].startswith('-'):
+        argv = ['process'] + argv
+    elif argv[0] not in COMMANDS and argv[0] not in ('-h', '--help'):
+        # --watch / --serve were flags before they were commands
+        command = next((flag[2:] for flag in ('--watch', '--serve') if flag in argv), 'batch')
+        argv = [command] + [arg for arg in argv if arg != f'--{command}']
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
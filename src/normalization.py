@@ -1,12 +1,45 @@
+from datetime import date
+
+
+def to_float(value):
+    """
+    '1,560' / '1.560' / 1.56 -> 1.56, None if not a number.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, float):
+        return value
+    try:
+        return float(str(value).replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def to_date(value):
+    """
+    '2024.11.07' / '2024/11/07' / '2024-11-07' -> date(2024, 11, 7), None if invalid.
+    """
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value).replace('.', '-').replace('/', '-'))
+    except ValueError:
+        return None
+
+
+def to_iso_date(value):
+    """
+    Any to_date input -> '2024-11-07', None if invalid.
+    """
+    parsed = to_date(value)
+    return parsed.isoformat() if parsed else None
+
+
 def normalize_entities(entities):
     """
-    Normalize extracted entities (e.g., date format, amount as float).
+    Normalize extracted entities: numbers as floats, date as YYYY-MM-DD.
     """
-    normalized = dict(entities)
-    # Normalize date to YYYY-MM-DD
-    if 'date' in normalized:
-        normalized['date'] = normalized['date'].replace('.', '-').replace('/', '-')
-    # Normalize amount
-    if 'amount' in normalized:
-        normalized['amount'] = float(normalized['amount'].replace(',', '.'))
-    return normalized
+    from records import ReceiptRecord
+    return ReceiptRecord.from_entities(entities).to_dict()
@@ -1,20 +1,313 @@
+import os
+import queue
+import threading
+from difflib import SequenceMatcher
+from concurrent.futures import ThreadPoolExecutor
 import pytesseract
 from PIL import Image
-import cv2
+import layout
+
+try:
+    import tesserocr
+except ImportError:  # Optional, falls back to the tesseract CLI
+    tesserocr = None
+
+# === OCR engine controls ===
+OCR_BACKEND = 'auto'  # Options: 'auto', 'tesserocr' (warm in-process engines), 'cli' (pytesseract)
+OCR_LANGUAGES = ('lit', 'eng')  # First one installed is used
+OCR_POOL_SIZE = os.cpu_count() or 1  # Max warm tesserocr engines for parallel callers
+# psm 6 - assume a uniform block of text
+# oem 1 - LSTM engine
+TESSERACT_CONFIG = r'--oem 1 --psm 6'
+# Tall receipts are split at blank rows into overlapping tiles OCR'd in parallel
+OCR_TILING = True
+TILE_MIN_HEIGHT = 3000  # px, shorter images are OCR'd in one call
+TILE_HEIGHT = 1200  # px, approximate tile height
+TILE_WORKERS = os.cpu_count() or 1  # One pool per process shared by all callers, 1: tiles in turn
+TILE_MAX_OVERLAP_LINES = 3  # Lines compared when removing duplicates between tiles
+
+_backend = None
+_backend_lock = threading.Lock()
+_tile_executor = None
+_tile_executor_lock = threading.Lock()
+
+
+def detect_language(available):
+    """
+    Pick the first of OCR_LANGUAGES present in the installed traineddata,
+    RuntimeError naming the missing models if none is.
+    """
+    for lang in OCR_LANGUAGES:
+        if lang in available:
+            return lang
+    missing = ', '.join(f"{lang}.traineddata" for lang in OCR_LANGUAGES)
+    raise RuntimeError(f"No Tesseract language model for {', '.join(OCR_LANGUAGES)} installed "
+                       f"(missing {missing}, installed: {', '.join(sorted(available)) or 'none'}). "
+                       f"Install e.g. tesseract-ocr-lit or tesseract-ocr-eng.")
+
+
+class CliBackend:
+    """
+    pytesseract, one tesseract process per call. Language is detected once
+    instead of failing over on every call.
+    """
+    name = 'cli'
+
+    def __init__(self):
+        self.lang = detect_language(pytesseract.get_languages(config=''))
+
+    def image_to_string(self, image):
+        return pytesseract.image_to_string(Image.fromarray(image), lang=self.lang, config=TESSERACT_CONFIG)
+
+    def image_to_data(self, image):
+        data = pytesseract.image_to_data(Image.fromarray(image), lang=self.lang, config=TESSERACT_CONFIG,
+                                         output_type=pytesseract.Output.DICT)
+        return data_to_text(data)
+
+    def image_to_lines(self, image):
+        data = pytesseract.image_to_data(Image.fromarray(image), lang=self.lang, config=TESSERACT_CONFIG,
+                                         output_type=pytesseract.Output.DICT)
+        return data_to_lines(data)
+
+
+class TesserocrBackend:
+    """
+    Long-lived tesserocr engines. Each engine loads the language model once
+    and is reused, engines are created on demand up to pool_size so parallel
+    callers each get their own.
+    """
+    name = 'tesserocr'
+
+    def __init__(self, pool_size=OCR_POOL_SIZE):
+        _, available = tesserocr.get_languages()
+        self.lang = detect_language(available)
+        self.pool_size = max(1, pool_size)
+        self._idle = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                return tesserocr.PyTessBaseAPI(lang=self.lang, oem=tesserocr.OEM.LSTM_ONLY,
+                                               psm=tesserocr.PSM.SINGLE_BLOCK)
+        return self._idle.get()
+
+    def _run(self, image, with_confidence):
+        api = self._acquire()
+        try:
+            api.SetImage(Image.fromarray(image))
+            text = api.GetUTF8Text()
+            if not with_confidence:
+                return text
+            confidences = api.AllWordConfidences()
+        finally:
+            api.Clear()
+            self._idle.put(api)
+        # Same shape as data_to_text: non-empty lines, mean word confidence
+        text = '\n'.join(line.strip() for line in text.splitlines() if line.strip())
+        confidence = sum(confidences) / len(confidences) if confidences else 0.0
+        return text, confidence
+
+    def image_to_string(self, image):
+        return self._run(image, with_confidence=False)
+
+    def image_to_data(self, image):
+        return self._run(image, with_confidence=True)
+
+    def image_to_lines(self, image):
+        api = self._acquire()
+        lines = []
+        try:
+            api.SetImage(Image.fromarray(image))
+            api.Recognize()
+            level = tesserocr.RIL.TEXTLINE
+            for line in tesserocr.iterate_level(api.GetIterator(), level):
+                text = (line.GetUTF8Text(level) or '').strip()
+                box = line.BoundingBox(level)
+                if text and box:
+                    lines.append((box[1], box[3], text))
+        finally:
+            api.Clear()
+            self._idle.put(api)
+        return lines
+
+
+def get_backend():
+    """
+    Process-wide OCR backend, created on first use.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                use_tesserocr = OCR_BACKEND == 'tesserocr' or (OCR_BACKEND == 'auto' and tesserocr is not None)
+                if use_tesserocr and tesserocr is None:
+                    raise ImportError("OCR_BACKEND='tesserocr' but tesserocr is not installed")
+                _backend = TesserocrBackend() if use_tesserocr else CliBackend()
+                print(f"OCR backend: {_backend.name} ({_backend.lang})")
+    return _backend
+
+
+def ocr_signature():
+    """
+    Identifies engine, language and tiling, OCR output differs between them.
+    """
+    backend = get_backend()
+    if OCR_TILING:
+        return f"{backend.name}-{backend.lang}-tile{TILE_MIN_HEIGHT}x{TILE_HEIGHT}"
+    return f"{backend.name}-{backend.lang}"
+
 
 def ocr_image(image):
     """
     Run Tesseract OCR on a preprocessed image (numpy array).
     """
-    pil_img = Image.fromarray(image)
-    # psm 6 - assume a uniform block of text
-    # oem 1 - LSTM engine
-    custom_config = r'--oem 1 --psm 6'
-
-    # print('Available languages:', pytesseract.get_languages(config=''))
-    try:
-        text = pytesseract.image_to_string(pil_img, lang='lit', config=custom_config)
-    except pytesseract.TesseractError:
-        print("Lithuanian language data not found, falling back to English.")
-        text = pytesseract.image_to_string(pil_img, lang='eng', config=custom_config)
-    return text
\ No newline at end of file
+    tiles = _tiles(image)
+    if tiles is None:
+        return get_backend().image_to_string(image)
+    return stitch_texts(_ocr_tiles(image, tiles, get_backend().image_to_string))
+
+
+def ocr_image_data(image):
+    """
+    Run Tesseract OCR and return (text, mean word confidence 0-100).
+    Text is rebuilt from Tesseract's word data, one line per OCR line.
+    """
+    tiles = _tiles(image)
+    if tiles is None:
+        return get_backend().image_to_data(image)
+    results = _ocr_tiles(image, tiles, get_backend().image_to_data)
+    # Tile confidences weighted by their line count
+    weights = [max(1, text.count('\n') + 1) for text, _ in results]
+    confidence = sum(c * w for (_, c), w in zip(results, weights)) / sum(weights)
+    return stitch_texts([text for text, _ in results]), confidence
+
+
+def _tiles(image):
+    """
+    Tile rows for a tall image, None when it is OCR'd in one call.
+    """
+    if not OCR_TILING or image.shape[0] < TILE_MIN_HEIGHT:
+        return None
+    tiles = layout.split_tiles(image, TILE_HEIGHT)
+    return tiles if len(tiles) > 1 else None
+
+
+def _reset_tile_executor():
+    # A forked child inherits the executor but not its threads
+    global _tile_executor, _tile_executor_lock
+    _tile_executor = None
+    _tile_executor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_tile_executor)
+
+
+def get_tile_executor():
+    """
+    Thread pool for tile OCR, created on first use. Shared by every caller
+    (multipass passes, service workers), so at most TILE_WORKERS tiles are
+    OCR'd at once in this process however many receipts are in flight.
+    """
+    global _tile_executor
+    with _tile_executor_lock:
+        if _tile_executor is None:
+            _tile_executor = ThreadPoolExecutor(max_workers=TILE_WORKERS, thread_name_prefix='ocr-tile')
+        return _tile_executor
+
+
+def _ocr_tiles(image, tiles, fn):
+    """
+    OCR tiles concurrently, results in top to bottom order.
+    """
+    crops = [image[top:bottom] for top, bottom in tiles]
+    if TILE_WORKERS <= 1:
+        return [fn(crop) for crop in crops]
+    return list(get_tile_executor().map(fn, crops))
+
+
+def _same_line(a, b):
+    a, b = ' '.join(a.split()), ' '.join(b.split())
+    return a == b or SequenceMatcher(None, a, b).ratio() >= 0.8
+
+
+def _overlap(previous, following):
+    """
+    Number of leading lines of following that repeat the end of previous.
+    """
+    for k in range(min(TILE_MAX_OVERLAP_LINES, len(previous), len(following)), 0, -1):
+        if all(_same_line(p, f) for p, f in zip(previous[-k:], following[:k])):
+            return k
+    return 0
+
+
+def stitch_texts(texts):
+    """
+    Join tile texts in order, dropping the lines repeated in tile overlaps.
+    """
+    lines = []
+    for text in texts:
+        tile_lines = text.strip('\n\f ').split('\n')
+        while lines and not lines[-1].strip():
+            lines.pop()
+        lines.extend(tile_lines[_overlap(lines, tile_lines):])
+    return '\n'.join(lines)
+
+
+def ocr_image_lines(image):
+    """
+    Run Tesseract OCR and return text lines with their vertical extent:
+    [(top, bottom, text)] in reading order.
+    """
+    return get_backend().image_to_lines(image)
+
+
+def data_to_text(data):
+    """
+    Join image_to_data words back into lines, average the word confidences.
+    """
+    lines = []
+    line_key = None
+    confidences = []
+    for i, word in enumerate(data['text']):
+        word = word.strip()
+        if not word:
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        if key != line_key:
+            lines.append([])
+            line_key = key
+        lines[-1].append(word)
+        conf = float(data['conf'][i])
+        if conf >= 0:
+            confidences.append(conf)
+    text = '\n'.join(' '.join(words) for words in lines)
+    confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return text, confidence
+
+
+def data_to_lines(data):
+    """
+    Group image_to_data words into (top, bottom, text) lines.
+    """
+    lines = {}
+    for i, word in enumerate(data['text']):
+        word = word.strip()
+        if not word:
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        top, bottom = data['top'][i], data['top'][i] + data['height'][i]
+        if key in lines:
+            line = lines[key]
+            line[0] = min(line[0], top)
+            line[1] = max(line[1], bottom)
+            line[2].append(word)
+        else:
+            lines[key] = [top, bottom, [word]]
+    return [(top, bottom, ' '.join(words)) for top, bottom, words in lines.values()]
@@ -1,7 +1,12 @@
 
+import os
+import json
+import threading
 import cv2
 import numpy as np
 from PIL import Image
+import artifacts
+from instrumentation import stage
 
 # === Preprocessing mode controls ===
 PREPROCESS_MODE = 'otsu'  # Options: 'otsu', 'mean', 'gaussian', 'manual'
@@ -18,22 +23,318 @@ APPLY_MORPH_OPEN = True
 MORPH_KERNEL_SIZE = 2
 APPLY_DENOISE = True
 FAST_NL_MEANS_PARAMS = dict(h=30, templateWindowSize=7, searchWindowSize=21)
+# Multi-resolution: estimate skew and QR location on a small proxy, OCR at a target text height.
+# Off by default: resampling changes the pixels OCR sees, compare per-field accuracy with
+# `benchmark.py run` before and after turning it on for a corpus
+APPLY_MULTIRES = False
+PROXY_MAX_SIDE = 1200  # px, longest side of the proxy image
+HOUGH_THRESHOLD = 250  # votes at full resolution, scaled down for the proxy
+OCR_TARGET_TEXT_HEIGHT = 24  # px, median glyph height fed to OCR, None keeps native resolution
+OCR_MAX_UPSCALE = 2.0
+# Per-variant tail after the prepared grayscale image, as a list of
+# (stage, params) pairs, see PIPELINE_STAGES. None builds it from the flags
+# above (default_pipeline), a spec can also be passed per call or loaded
+# from a JSON file written by autotune.py.
+PIPELINE = None
+# Run stages into per-thread buffers that are reused across passes and images
+# instead of allocating new full-size arrays at every step
+REUSE_BUFFERS = True
+
+
+class PreparedImage:
+    """
+    Image state shared by all CLAHE variants: decoded, brightness-tuned,
+    QR-scanned, deskewed and converted to grayscale.
+    image_path is None for images passed as bytes or arrays.
+    """
+    __slots__ = ('image_path', 'gray', 'qr_url')
+
+    def __init__(self, image_path, gray, qr_url):
+        self.image_path = image_path
+        self.gray = gray
+        self.qr_url = qr_url
 
 
-def preprocess_image(image_path, clip_limit):
+class PreprocessEngine:
     """
-    Load and preprocess the image for OCR.
+    Reusable working memory for one thread. Buffers are flat uint8 arrays
+    that only grow, each stage gets a view of the size it needs, so passes
+    and later images of a similar size allocate nothing.
+    Arrays returned by finish() are a buffer: valid until the next finish()
+    on the same engine, copy them to keep them longer.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+        self._clahe = {}
+
+    def buffer(self, name, shape):
+        size = int(np.prod(shape))
+        buf = self._buffers.get(name)
+        if buf is None or buf.size < size:
+            buf = np.empty(size, np.uint8)
+            self._buffers[name] = buf
+        return buf[:size].reshape(shape)
+
+    def owns(self, array):
+        return any(np.shares_memory(array, buf) for buf in self._buffers.values())
+
+    def nbytes(self):
+        return sum(buf.nbytes for buf in self._buffers.values())
+
+    def release(self):
+        self._buffers.clear()
+
+    def clahe(self, clip_limit, tile_grid_size):
+        # CLAHE objects keep state while applying, one per thread and setting
+        key = (clip_limit, tile_grid_size)
+        clahe = self._clahe.get(key)
+        if clahe is None:
+            clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+            self._clahe[key] = clahe
+        return clahe
+
+    def finish(self, gray, clip_limit, pipeline):
+        """
+        Run pipeline stages alternating between two buffers.
+        """
+        buffers = (self.buffer('front', gray.shape), self.buffer('back', gray.shape))
+        return run_pipeline(gray, clip_limit, pipeline, self, buffers)
+
+    def brightness(self, image, alpha, beta):
+        """
+        convertScaleAbs into the engine's color buffer, the source image
+        (possibly the caller's array) is left alone.
+        """
+        return cv2.convertScaleAbs(image, self.buffer('color', image.shape), alpha=alpha, beta=beta)
+
+    def grayscale(self, image):
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, self.buffer('gray', image.shape[:2]))
+
+
+_local = threading.local()
+
+
+def get_engine():
+    """
+    PreprocessEngine of the calling thread, None when REUSE_BUFFERS is off.
+    """
+    if not REUSE_BUFFERS:
+        return None
+    engine = getattr(_local, 'engine', None)
+    if engine is None:
+        engine = _local.engine = PreprocessEngine()
+    return engine
+
+
+def release_buffers():
+    """
+    Drop the calling thread's buffers, e.g. after an unusually large image.
+    """
+    engine = getattr(_local, 'engine', None)
+    if engine is not None:
+        engine.release()
+
+
+def _stage_clahe(img, dst, clip_limit, engine, tile_grid_size=None):
+    tile_grid_size = tuple(tile_grid_size or CLAHE_TILE_GRID_SIZE)
+    if engine:
+        return engine.clahe(clip_limit, tile_grid_size).apply(img, dst)
+    return cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size).apply(img, dst)
+
+
+def _stage_equalize(img, dst, clip_limit, engine):
+    return cv2.equalizeHist(img, dst)
+
+
+def _stage_median_blur(img, dst, clip_limit, engine, ksize=None):
+    return cv2.medianBlur(img, ksize or MEDIAN_BLUR_KSIZE, dst)
+
+
+def _stage_threshold(img, dst, clip_limit, engine, mode=None, value=None, block_size=31, c=10):
+    mode = mode or PREPROCESS_MODE
+    value = MANUAL_THRESHOLD_VALUE if value is None else value
+    if mode == 'otsu':
+        # Otsu ignores the threshold value, always computes its own
+        return cv2.threshold(img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst)[1]
+    if mode == 'manual':
+        return cv2.threshold(img, value, 255, cv2.THRESH_BINARY, dst)[1]
+    if mode == 'mean':
+        return cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, block_size, c, dst)
+    if mode == 'gaussian':
+        return cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, block_size, c, dst)
+    raise ValueError(f"Unknown threshold mode: {mode}")
+
+
+def _stage_morph_open(img, dst, clip_limit, engine, ksize=None):
+    ksize = ksize or MORPH_KERNEL_SIZE
+    kernel = np.ones((ksize, ksize), np.uint8)
+    return cv2.morphologyEx(img, cv2.MORPH_OPEN, kernel, dst)
+
+
+def _stage_denoise(img, dst, clip_limit, engine, **params):
+    return cv2.fastNlMeansDenoising(img, dst, **dict(FAST_NL_MEANS_PARAMS, **params))
+
+
+# Stage name -> function(img, dst, clip_limit, engine, **params). dst is a
+# buffer to write into or None to allocate, params left out fall back to
+# the module constants.
+PIPELINE_STAGES = {
+    'clahe': _stage_clahe,
+    'equalize': _stage_equalize,
+    'median_blur': _stage_median_blur,
+    'threshold': _stage_threshold,
+    'morph_open': _stage_morph_open,
+    'denoise': _stage_denoise,
+}
+
+
+def default_pipeline():
+    """
+    Pipeline spec the module flags describe:
+    CLAHE -> median blur -> threshold -> morph open -> denoise.
+    """
+    pipeline = []
+    if APPLY_CLAHE:
+        pipeline.append(('clahe', {'tile_grid_size': list(CLAHE_TILE_GRID_SIZE)}))
+    elif APPLY_EQUALIZE:
+        pipeline.append(('equalize', {}))
+    if APPLY_MEDIAN_BLUR:
+        pipeline.append(('median_blur', {'ksize': MEDIAN_BLUR_KSIZE}))
+    pipeline.append(('threshold', {'mode': PREPROCESS_MODE, 'value': MANUAL_THRESHOLD_VALUE}))
+    if APPLY_MORPH_OPEN:
+        pipeline.append(('morph_open', {'ksize': MORPH_KERNEL_SIZE}))
+    if APPLY_DENOISE:
+        pipeline.append(('denoise', dict(FAST_NL_MEANS_PARAMS)))
+    return pipeline
+
+
+def get_pipeline(pipeline=None):
+    """
+    The pipeline to run: the given one, else PIPELINE, else the flags.
+    """
+    if pipeline is not None:
+        return pipeline
+    if PIPELINE is not None:
+        return PIPELINE
+    return default_pipeline()
+
+
+def validate_pipeline(pipeline):
+    """
+    Normalized [(stage, params)] spec, ValueError on unknown stages.
+    """
+    normalized = []
+    for step in pipeline:
+        name, params = (step, {}) if isinstance(step, str) else step
+        if name not in PIPELINE_STAGES:
+            raise ValueError(f"Unknown preprocessing stage: {name}")
+        normalized.append((name, dict(params or {})))
+    return normalized
+
+
+def load_pipeline(path):
+    """
+    Pipeline spec from JSON: a list of [stage, params] pairs, or an object
+    with a "pipeline" key as written by autotune.py.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return validate_pipeline(data['pipeline'] if isinstance(data, dict) else data)
+
+
+def describe_pipeline(pipeline):
+    parts = []
+    for name, params in pipeline:
+        args = ', '.join(f"{k}={v}" for k, v in params.items())
+        parts.append(f"{name}({args})" if args else name)
+    return ' > '.join(parts)
+
+
+def run_pipeline(gray, clip_limit, pipeline, engine=None, buffers=None):
     """
-    image = cv2.imread(image_path)
+    Run pipeline stages on a grayscale image. With buffers (two arrays of
+    gray's shape) stages alternate between them instead of allocating.
+    """
+    img = gray
+    for i, (name, params) in enumerate(pipeline):
+        dst = buffers[i % 2] if buffers else None
+        with stage(name):
+            img = PIPELINE_STAGES[name](img, dst, clip_limit, engine, **params)
+    return img
+
+
+def describe_source(source):
+    """
+    Printable name of an image source: path, bytes or array.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    if isinstance(source, np.ndarray):
+        return f"<array {source.shape[1]}x{source.shape[0]}>" if source.ndim >= 2 else "<array>"
+    return f"<{len(source)} bytes>"
+
+
+def load_image(source):
+    """
+    Decode an image source into a BGR array. Accepts a file path, encoded
+    bytes (JPEG, PNG, ...) or an already decoded NumPy array (BGR, BGRA or
+    grayscale). Files and bytes are decoded once with imdecode.
+    """
+    if isinstance(source, np.ndarray):
+        if source.ndim == 2:
+            return cv2.cvtColor(source, cv2.COLOR_GRAY2BGR)
+        if source.ndim == 3 and source.shape[2] == 4:
+            return cv2.cvtColor(source, cv2.COLOR_BGRA2BGR)
+        return source
+    if isinstance(source, (str, os.PathLike)):
+        try:
+            # np.fromfile + imdecode also handles non-ASCII paths on Windows
+            buf = np.fromfile(source, dtype=np.uint8)
+        except OSError:
+            buf = None
+    else:
+        buf = np.frombuffer(source, dtype=np.uint8)
+    image = cv2.imdecode(buf, cv2.IMREAD_COLOR) if buf is not None and buf.size else None
     if image is None:
-        raise ValueError(f"Image not found or unable to read: {image_path}")
+        raise ValueError(f"Image not found or unable to read: {describe_source(source)}")
+    return image
+
+
+def preprocess_image(source, clip_limit, pipeline=None):
+    """
+    Load and preprocess the image for OCR.
+    """
+    prepared = prepare_image(source)
+    if prepared.gray is None:
+        return None, prepared.qr_url
+    img = finish_image(prepared, clip_limit, pipeline)
+    save_processed_image(prepared.image_path, img)
+    return img, prepared.qr_url
+
+
+def prepare_image(source):
+    """
+    Run the clip-limit independent stages once per image.
+    source is a path, encoded bytes or a decoded array, see load_image.
+    Returns PreparedImage, gray is None if deskewing failed.
+    """
+    image_path = os.fspath(source) if isinstance(source, (str, os.PathLike)) else None
+    with stage('imread'):
+        image = load_image(source)
+
+    with stage('brightness'):
+        image = tune_brightness_contrast(image)
 
-    image = tune_brightness_contrast(image)
+    proxy, scale = None, 1.0
+    if APPLY_MULTIRES:
+        with stage('proxy'):
+            proxy, scale = make_proxy(image)
 
     # --- QR code detection (OpenCV) ---
     qr_url = None
-    qr_detector = cv2.QRCodeDetector()
-    qr_data, points, _ = qr_detector.detectAndDecode(image)
+    with stage('qr'):
+        qr_data = detect_qr(image, proxy, scale)
     if qr_data and 'kvitas.vmi.lt' in qr_data:
         qr_url = qr_data
         print(f"QR code found: {qr_url}")
@@ -41,12 +342,21 @@ def preprocess_image(image_path, clip_limit):
     #     print("No valid QR code found.")
 
     # --- Deskewing ---
-    if APPLY_DESKEW:
+    angle = 0.0
+    if APPLY_DESKEW and APPLY_MULTIRES:
+        # Angle from the proxy, rotation later on the (resampled) grayscale image
+        with stage('deskew'):
+            angle = estimate_skew_angle(proxy, max(50, int(HOUGH_THRESHOLD * scale)))
+        if angle is None:
+            print("Warning: Deskewing failed, image is None.")
+            return PreparedImage(image_path, None, qr_url)
+    elif APPLY_DESKEW:
         # print("Applying deskewing")  # Debugging line
-        image = deskew_image(image)
+        with stage('deskew'):
+            image = deskew_image(image)
         if image is None:
             print("Warning: Deskewing failed, image is None.")
-            return None, qr_url
+            return PreparedImage(image_path, None, qr_url)
 
     # # --- Perspective Correction ---
     # if APPLY_PERSPECTIVE_CORRECTION:
@@ -54,64 +364,143 @@ def preprocess_image(image_path, clip_limit):
     #     image = perspective_correction(image)
     #     if image is None:
     #         print("Warning: Perspective correction failed, image is None.")
-    #         return None, qr_url
+    #         return PreparedImage(image_path, None, qr_url)
+
+    engine = get_engine()
+    with stage('grayscale'):
+        gray = engine.grayscale(image) if engine else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    if APPLY_MULTIRES:
+        with stage('resample'):
+            gray = resample_for_ocr(gray, proxy, scale)
+        if angle:
+            with stage('rotate'):
+                gray = rotate_image(gray, angle)
+    if engine and engine.owns(gray):
+        # Prepared images outlive this call and are read by other threads
+        gray = gray.copy()
+    return PreparedImage(image_path, gray, qr_url)
+
+
+def finish_image(prepared, clip_limit, pipeline=None):
+    """
+    Run the per-variant tail on a prepared image, by default:
+    CLAHE -> median blur -> threshold -> morph open -> denoise.
+    pipeline overrides the stages, see get_pipeline.
+    With REUSE_BUFFERS the result lives in the thread's engine buffers until
+    the next finish_image call on that thread.
+    """
+    pipeline = get_pipeline(pipeline)
+    # print(f"Preprocessing pipeline: {describe_pipeline(pipeline)}")  # Debugging line
+    engine = get_engine()
+    if engine:
+        return engine.finish(prepared.gray, clip_limit, pipeline)
+    return run_pipeline(prepared.gray, clip_limit, pipeline)
 
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    img = gray
 
-    if APPLY_CLAHE:
-        # print(f"Applying CLAHE (clipLimit={clip_limit}, tileGridSize={CLAHE_TILE_GRID_SIZE})")  # Debugging line
-        clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=CLAHE_TILE_GRID_SIZE)
-        img = clahe.apply(img)
-    elif APPLY_EQUALIZE:
-        # print("Applying histogram equalization")  # Debugging line
-        img = cv2.equalizeHist(img)
+def save_processed_image(image_path, img, name=None):
+    """
+    Save preprocessed image for inspection when artifacts are enabled:
+    next to the source file, or as <name>-processed.png in the artifact
+    directory for in-memory images.
+    """
+    if not artifacts.enabled():
+        return None
+    if image_path:
+        processed_path = image_path.rsplit('.', 1)
+        if len(processed_path) == 2:
+            processed_path = processed_path[0] + '-processed.' + processed_path[1]
+        else:
+            processed_path = image_path + '-processed'
+        processed_path = os.path.abspath(processed_path)
+    else:
+        processed_path = f"{name or 'image'}-processed.png"
+    # print(f"Saving preprocessed image to: {processed_path}")  # Debugging line
+    return artifacts.save(processed_path, img)
 
-    if APPLY_MEDIAN_BLUR:
-        # print(f"Applying median blur with ksize={MEDIAN_BLUR_KSIZE}")  # Debugging line
-        img = cv2.medianBlur(img, MEDIAN_BLUR_KSIZE)
 
-    # print(f"Applying {PREPROCESS_MODE} thresholding")  # Debugging line
-    if PREPROCESS_MODE == 'otsu':
-        # Otsu ignores the threshold value, always computes its own
-        _, img = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    elif PREPROCESS_MODE == 'manual':
-        _, img = cv2.threshold(img, MANUAL_THRESHOLD_VALUE, 255, cv2.THRESH_BINARY)
-    elif PREPROCESS_MODE == 'mean':
-        img = cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 31, 10)
-    elif PREPROCESS_MODE == 'gaussian':
-        img = cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10)
+def make_proxy(image):
+    """
+    Downscaled copy with the longest side at most PROXY_MAX_SIDE.
+    Returns (proxy, scale), scale is proxy size / full size.
+    """
+    h, w = image.shape[:2]
+    scale = min(1.0, PROXY_MAX_SIDE / max(h, w))
+    if scale >= 1.0:
+        return image, 1.0
+    proxy = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    return proxy, scale
 
-    if APPLY_MORPH_OPEN:
-        # print(f"Applying morphological opening with kernel size={MORPH_KERNEL_SIZE}")  # Debugging line
-        kernel = np.ones((MORPH_KERNEL_SIZE, MORPH_KERNEL_SIZE), np.uint8)
-        img = cv2.morphologyEx(img, cv2.MORPH_OPEN, kernel)
 
-    if APPLY_DENOISE:
-        # print(f"Applying fastNlMeansDenoising with params={FAST_NL_MEANS_PARAMS}")  # Debugging line
-        img = cv2.fastNlMeansDenoising(img, None, **FAST_NL_MEANS_PARAMS)
+def detect_qr(image, proxy=None, scale=1.0):
+    """
+    Decode a QR code. With a proxy the code is located on the proxy and only
+    its neighbourhood is decoded at full resolution.
+    """
+    qr_detector = cv2.QRCodeDetector()
+    if proxy is None or scale >= 1.0:
+        qr_data, points, _ = qr_detector.detectAndDecode(image)
+        return qr_data
+    found, points = qr_detector.detect(proxy)
+    if not found or points is None:
+        return ''
+    pts = points.reshape(-1, 2) / scale
+    x0, y0 = pts.min(axis=0)
+    x1, y1 = pts.max(axis=0)
+    pad = 0.2 * max(x1 - x0, y1 - y0)
+    h, w = image.shape[:2]
+    crop = image[max(0, int(y0 - pad)):min(h, int(y1 + pad)), max(0, int(x0 - pad)):min(w, int(x1 + pad))]
+    if crop.size == 0:
+        return ''
+    qr_data, points, _ = qr_detector.detectAndDecode(crop)
+    return qr_data
+
+
+def estimate_text_height(image):
+    """
+    Median glyph height in px from connected components of dark ink,
+    None if there are too few glyph-sized components to tell.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+    _, _, stats, _ = cv2.connectedComponentsWithStats(thresh, connectivity=8)
+    h, w = gray.shape
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    # Glyph-sized only: drops specks, table background, logos and rules
+    keep = (heights >= 4) & (heights <= h // 10) & (widths >= 2) & (widths <= w // 10)
+    if np.count_nonzero(keep) < 20:
+        return None
+    return float(np.median(heights[keep]))
 
-    # Save preprocessed image for inspection
-    processed_path = image_path.rsplit('.', 1)
-    if len(processed_path) == 2:
-        processed_path = processed_path[0] + '-processed.' + processed_path[1]
-    else:
-        processed_path = image_path + '-processed'
-    # print(f"Saving preprocessed image to: {processed_path}")  # Debugging line
-    cv2.imwrite(processed_path, img)
 
-    return img, qr_url
+def resample_for_ocr(gray, proxy=None, scale=1.0):
+    """
+    Resize so the median glyph height is about OCR_TARGET_TEXT_HEIGHT.
+    Glyph height is measured on the proxy and scaled back to full resolution.
+    """
+    if not OCR_TARGET_TEXT_HEIGHT:
+        return gray
+    text_height = estimate_text_height(proxy if proxy is not None else gray)
+    if text_height is None:
+        return gray
+    factor = min(OCR_MAX_UPSCALE, OCR_TARGET_TEXT_HEIGHT / (text_height / scale))
+    if 0.85 <= factor <= 1.15:
+        return gray
+    # print(f"Resampling for OCR: glyph height {text_height / scale:.1f}px, factor {factor:.2f}")  # Debugging line
+    h, w = gray.shape[:2]
+    interpolation = cv2.INTER_AREA if factor < 1 else cv2.INTER_CUBIC
+    return cv2.resize(gray, (max(1, int(w * factor)), max(1, int(h * factor))), interpolation=interpolation)
 
 
 def tune_brightness_contrast(image):
     """
     Tune brightness and contrast of the image.
     """
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    h, w = gray.shape
-    center_crop = gray[h//4:3*h//4, w//4:3*w//4]
-    mean_val = np.mean(center_crop)
-    std_val = np.std(center_crop)
+    # Statistics of the center only, so only the center is converted
+    h, w = image.shape[:2]
+    center_crop = cv2.cvtColor(image[h//4:3*h//4, w//4:3*w//4], cv2.COLOR_BGR2GRAY)
+    mean, std = cv2.meanStdDev(center_crop)
+    mean_val, std_val = float(mean[0, 0]), float(std[0, 0])
 
     # print(f"Center mean: {mean_val:.2f}, std: {std_val:.2f}")  # Debugging line
     alpha = 1.0  # Contrast control (1.0-3.0)
@@ -120,28 +509,47 @@ def tune_brightness_contrast(image):
         beta = 40
     if std_val < 40:
         alpha = 1.25
-    image = cv2.convertScaleAbs(image, alpha=alpha, beta=beta)
+    engine = get_engine()
+    if engine:
+        image = engine.brightness(image, alpha, beta)
+    else:
+        image = cv2.convertScaleAbs(image, alpha=alpha, beta=beta)
     # print(f"Applied brightness (beta={beta}) and contrast (alpha={alpha}) adjustment.")  # Debugging line
 
     # Debug
-    cv2.imwrite("receipts/applied_brightness_contrast_visualization.jpg", image)
+    artifacts.save("applied_brightness_contrast_visualization.jpg", image)
 
     return image
 
 
 def deskew_image(image):
+    angle = estimate_skew_angle(image)
+    if angle is None:
+        return None
+    if not angle:
+        return image
+    return rotate_image(image, angle)
+
+
+def estimate_skew_angle(image, hough_threshold=250):
+    """
+    Skew angle in degrees to pass to rotate_image, 0.0 when no rotation is
+    needed, None when there is nothing to estimate from.
+    Angle does not depend on resolution, so image can be a downscaled proxy
+    (scale hough_threshold with it, it counts votes in pixels).
+    """
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
 
     # Extracting edges for Hough Line Transform
     edges = cv2.Canny(thresh, 50, 150, apertureSize=3)
-    cv2.imwrite("receipts/canny_edges_visualization.jpg", edges)
+    artifacts.save("canny_edges_visualization.jpg", edges)
     # print("Saved Canny edges visualization as canny_edges_visualization.jpg")  # Debugging line
 
     # Hough Line Transform
-    lines = cv2.HoughLines(edges, 1, np.pi / 180, 250)
+    lines = cv2.HoughLines(edges, 1, np.pi / 180, hough_threshold)
     angles = []
-    vis = image.copy()
+    vis = image.copy() if artifacts.enabled() else None
     if lines is not None:
         for line in lines:
             rho, theta = line[0]
@@ -151,6 +559,8 @@ def deskew_image(image):
             if deviation < 30:
                 deskew_angle = angle_deg if angle_deg < 90 else angle_deg - 180
                 angles.append(deskew_angle)
+                if vis is None:
+                    continue
                 # Debug: draw the line for visualization
                 a = np.cos(theta)
                 b = np.sin(theta)
@@ -162,7 +572,7 @@ def deskew_image(image):
                 y2 = int(y0 - 1000 * (a))
                 cv2.line(vis, (x1, y1), (x2, y2), (0, 0, 255), 2)
         # Debug: save visualization image
-        cv2.imwrite("receipts/hough_lines_visualization.jpg", vis)
+        artifacts.save("hough_lines_visualization.jpg", vis)
         # print("Saved Hough lines visualization as hough_lines_visualization.jpg")  # Debugging line
 
         if angles:
@@ -170,34 +580,37 @@ def deskew_image(image):
             # print(f"Hough deskew detected angle: {avg_angle:.2f}")  # Debugging line
             # Rotate by -avg_angle to deskew
             if abs(avg_angle) > 0.5:
-                (h, w) = image.shape[:2]
-                center = (w // 2, h // 2)
-                M = cv2.getRotationMatrix2D(center, float(avg_angle), 1.0)
-                rotated = cv2.warpAffine(image, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
-                return rotated
+                return float(avg_angle)
             else:
                 print("Deskew angle too small, skipping rotation.")
-                return image
+                return 0.0
         else:
             print("No suitable lines found for deskewing, fallback to minAreaRect.")
 
-    # Fallback to minAreaRect
-    coords = np.column_stack(np.where(thresh > 0))
-    if coords.size == 0:
+    # Fallback to minAreaRect. The rectangle only depends on the convex hull
+    # of the foreground, so the outer contour points give the same result as
+    # every nonzero pixel without building a coordinate list of the image.
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
         print("Warning: No nonzero pixels found for deskewing.")
         return None
-    angle = cv2.minAreaRect(coords)[-1]
+    # (row, col) order like the np.where coordinates this replaces, the angle convention depends on it
+    coords = np.concatenate(contours).reshape(-1, 2)[:, ::-1]
+    angle = cv2.minAreaRect(np.ascontiguousarray(coords))[-1]
     # print(f"Initial deskew angle: {angle}")  # Debugging line
 
     if abs(angle) > 45:
         print(f"Deskew skipped: detected angle {angle} is too large (likely vertical receipt or misdetection)")
-        return image
+        return 0.0
     if angle < -45:
         angle = -(90 + angle)
     else:
         angle = -angle
     # print(f"Corrected deskew angle: {angle}")  # Debugging line
+    return angle
+
 
+def rotate_image(image, angle):
     (h, w) = image.shape[:2]
     center = (w // 2, h // 2)
     M = cv2.getRotationMatrix2D(center, angle, 1.0)
@@ -1,61 +1,402 @@
 import os
-from preprocessing import preprocess_image
-from ocr import ocr_image
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cache
+import instrumentation
+import layout
+from instrumentation import stage
+from preprocessing import PreparedImage, prepare_image, finish_image, save_processed_image, describe_source
+from ocr import ocr_image, ocr_image_data, ocr_image_lines
 from parsing import extract_entities
-from stored_data import save_receipt_data, load_receipt_data, load_addresses, add_address, fuzzy_match_address
+from records import ReceiptRecord
+from stored_data import (save_receipt_data, load_receipt_data, get_address_index, add_address, fuzzy_match_address,
+                         queue_address_review)
 
 
-def multipass_receipt_ocr(image_path, clip_limits=[0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 4.5]):
-    print(f"Multipass OCR for: {image_path}")
-    qr_url = None
-    results = []
-    for clip_limit in clip_limits:
-        print(f"Multipass: CLAHE clipLimit={clip_limit}")  # Debugging line
-        img, qr_url = preprocess_image(image_path, clip_limit)
-        if img is None:
-            continue
-        text = ocr_image(img)
-        # print("OCR Text:", text)  # Debugging line
+# Worker threads for multipass variants. Tesseract runs in a subprocess and
+# OpenCV releases the GIL, so threads are enough to use several cores.
+MULTIPASS_WORKERS = 1
+DEFAULT_CLIP_LIMITS = [0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 4.5]
+
+# Adaptive multipass: stop once this many passes agree on the key fields
+MULTIPASS_ADAPTIVE = False
+ADAPTIVE_MIN_AGREE = 2
+KEY_FIELDS = ('amount', 'date', 'fuel_liters', 'fuel_price_per_liter')
+
+# Region-of-interest multipass: OCR only text bands, retry only the bands of
+# fields the passes do not agree on yet
+MULTIPASS_ROI = False
+ROI_FIELDS = ('station', 'address', 'fuel_type', 'fuel_price_per_liter', 'fuel_liters', 'amount', 'date', 'time')
+
+# QR-first: amount and address come from the kvitas.vmi.lt page of the QR
+# code, a single OCR pass reads the rest. Fetches the page over the network
+# (cached), so it is off by default.
+QR_FAST_PATH = False
+QR_FAST_CLIP_LIMIT = 2.5  # The one pass, middle of DEFAULT_CLIP_LIMITS
+QR_OCR_FIELDS = ('date', 'fuel_type')  # Plus two of amount / liters / price, the third is computed
+
+_pass_executors = {}  # workers -> ThreadPoolExecutor, kept so pool threads keep their preprocessing buffers
+_pass_executors_lock = threading.Lock()
+
+
+def _reset_pass_executors():
+    # A forked child inherits the executors but not their threads
+    global _pass_executors_lock
+    _pass_executors.clear()
+    _pass_executors_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_pass_executors)
+
+
+def get_pass_executor(workers):
+    """
+    Shared thread pool for parallel multipass passes, created on first use.
+    Reusing it across receipts keeps each thread's PreprocessEngine buffers
+    alive instead of reallocating them for every image.
+    """
+    with _pass_executors_lock:
+        executor = _pass_executors.get(workers)
+        if executor is None:
+            executor = _pass_executors[workers] = ThreadPoolExecutor(max_workers=workers,
+                                                                     thread_name_prefix='multipass')
+        return executor
+
+
+def parse_variant(text, key=None):
+    """
+    Parse OCR text, reusing cached entities while parsing.py is unchanged.
+    """
+    if key:
+        entities = cache.get_entities(key)
+        if entities is not None:
+            return entities
+    with stage('parse'):
         entities = extract_entities(text)
-        results.append(entities)
-    # Aggregate results (example: majority vote for each field)
+    if key:
+        cache.put_entities(key, entities)
+    return entities
+
+
+def ocr_variant(prepared, clip_limit, save=False, img_hash=None, name=None, pipeline=None):
+    """
+    Single multipass variant: preprocessing tail, OCR and parsing.
+    save writes the processed image if artifacts are enabled.
+    """
+    print(f"Multipass: CLAHE clipLimit={clip_limit}")  # Debugging line
+    with instrumentation.labels(clip_limit=clip_limit):
+        img = finish_image(prepared, clip_limit, pipeline)
+        if save:
+            save_processed_image(prepared.image_path, img, name)
+        with stage('ocr'):
+            text = ocr_image(img)
+        # print("OCR Text:", text)  # Debugging line
+        key = None
+        if img_hash:
+            key = cache.ocr_key(img_hash, clip_limit, pipeline=pipeline)
+            with stage('cache_write'):
+                cache.put_text(key, text)
+        return parse_variant(text, key)
+
+
+def load_prepared(source, img_hash, need_pixels=True, prepared=None):
+    """
+    Returns (prepared, qr_url, ok). When every pass is cached only the QR
+    result is needed, and it comes from the cache without decoding the image.
+    An image already prepared for this source (QR fast path fallback) is
+    used as is.
+    """
+    if prepared is not None:
+        return prepared, prepared.qr_url, prepared.gray is not None
+    if img_hash and not need_pixels:
+        meta = cache.get_prepared(img_hash)
+        if meta is not None:
+            return None, meta['qr_url'], meta['ok']
+    prepared = prepare_image(source)
+    ok = prepared.gray is not None
+    if img_hash:
+        cache.put_prepared(img_hash, prepared.qr_url, ok)
+    return prepared, prepared.qr_url, ok
+
+
+def aggregate_results(results):
+    """
+    Majority vote for each field. Ties go to the value seen first,
+    so the result only depends on the order of passes.
+    """
     aggregated = {}
-    keys = set().union(*(r.keys() for r in results if r))
+    keys = []
+    for r in results:
+        for key in r:
+            if key not in keys:
+                keys.append(key)
     for key in keys:
-        values = [r[key] for r in results if r and key in r]
+        values = [r[key] for r in results if key in r]
         if values:
-            # Majority vote
-            aggregated[key] = max(set(values), key=values.count)
+            aggregated[key] = max(values, key=values.count)
+    return aggregated
+
+
+def multipass_receipt_ocr(source, clip_limits=DEFAULT_CLIP_LIMITS, workers=None, name=None, pipeline=None,
+                          prepared=None):
+    print(f"Multipass OCR for: {describe_source(source)}")
+    workers = workers or MULTIPASS_WORKERS
+    img_hash = cache.image_hash(source) if cache.CACHE_ENABLED else None
+
+    # Passes with cached OCR text only need parsing
+    results = [None] * len(clip_limits)
+    misses = []
+    for i, clip_limit in enumerate(clip_limits):
+        key = cache.ocr_key(img_hash, clip_limit, pipeline=pipeline) if img_hash else None
+        cached = cache.get_text(key) if key else None
+        if cached is None:
+            misses.append(i)
+        else:
+            print(f"Multipass: CLAHE clipLimit={clip_limit} (cached)")  # Debugging line
+            with instrumentation.labels(clip_limit=clip_limit):
+                results[i] = parse_variant(cached['text'], key)
+
+    # Decode, brightness, QR and deskew do not depend on clip limit, run them once
+    prepared, qr_url, ok = load_prepared(source, img_hash, need_pixels=bool(misses), prepared=prepared)
+    if ok and misses:
+        # Each pass used to overwrite the same file, only the last one is saved
+        last = len(clip_limits) - 1
+        # Labels are per thread, carry the receipt label into pool threads
+        outer_labels = instrumentation.current_labels()
+
+        def run(i):
+            with instrumentation.labels(**outer_labels):
+                return ocr_variant(prepared, clip_limits[i], save=i == last, img_hash=img_hash, name=name,
+                                   pipeline=pipeline)
+
+        if workers > 1 and len(misses) > 1:
+            # map keeps clip limit order regardless of completion order
+            for i, entities in zip(misses, get_pass_executor(workers).map(run, misses)):
+                results[i] = entities
+        else:
+            for i in misses:
+                results[i] = run(i)
+    aggregated = aggregate_results([r for r in results if r])
     print("Aggregated entities:", aggregated)
     return aggregated, qr_url
 
 
-def proof_and_fill_fields(aggregated, tolerance=0.02):
-    amount = aggregated.get('amount')
-    liters = aggregated.get('fuel_liters')
-    price = aggregated.get('fuel_price_per_liter')
+def next_clip_limit(tried, clip_limits):
+    """
+    Pick the untried clip limit closest to the most confident pass so far.
+    Between equally close candidates go towards the side whose nearest
+    tried neighbour scored better, unexplored sides count as neutral.
+    """
+    untried = [c for c in clip_limits if c not in tried]
+    if not untried:
+        return None
+    if not tried:
+        return clip_limits[len(clip_limits) // 2]
+    best = max(tried, key=tried.get)
+    lower = [c for c in tried if c < best]
+    higher = [c for c in tried if c > best]
+    lower_conf = tried[max(lower)] if lower else tried[best]
+    higher_conf = tried[min(higher)] if higher else tried[best]
+
+    def rank(c):
+        side_conf = higher_conf if c > best else lower_conf
+        return abs(c - best), -side_conf
+
+    return min(untried, key=rank)
+
+
+def key_fields_agree(results, min_agree=ADAPTIVE_MIN_AGREE):
+    """
+    True once min_agree passes found the same non-empty set of key field values.
+    """
+    signatures = [tuple(r.get(f) for f in KEY_FIELDS) for r in results]
+    for signature in signatures:
+        if any(signature) and signatures.count(signature) >= min_agree:
+            return True
+    return False
+
+
+def adaptive_multipass_receipt_ocr(source, clip_limits=DEFAULT_CLIP_LIMITS, min_agree=ADAPTIVE_MIN_AGREE, name=None,
+                                   pipeline=None, prepared=None):
+    """
+    Multipass OCR with early exit. Starts in the middle of the clip limit grid,
+    uses Tesseract word confidence to choose the next clip limit and stops as
+    soon as min_agree passes agree on KEY_FIELDS.
+    """
+    print(f"Adaptive multipass OCR for: {describe_source(source)}")
+    img_hash = cache.image_hash(source) if cache.CACHE_ENABLED else None
+    qr_url, ok = None, True
+    if img_hash or prepared is not None:
+        # QR result may come from cache, pixels are prepared on the first miss
+        prepared, qr_url, ok = load_prepared(source, img_hash, need_pixels=False, prepared=prepared)
+    tried = {}
+    results = []
+    img = None
+    clip_limit = next_clip_limit(tried, clip_limits) if ok else None
+    while clip_limit is not None:
+        key = cache.ocr_key(img_hash, clip_limit, 'data', pipeline) if img_hash else None
+        cached = cache.get_text(key) if key else None
+        if cached is not None:
+            text, confidence = cached['text'], cached['confidence']
+        else:
+            if prepared is None:
+                prepared, qr_url, ok = load_prepared(source, img_hash)
+                if not ok:
+                    break
+            with instrumentation.labels(clip_limit=clip_limit):
+                img = finish_image(prepared, clip_limit, pipeline)
+                with stage('ocr'):
+                    text, confidence = ocr_image_data(img)
+                if key:
+                    with stage('cache_write'):
+                        cache.put_text(key, text, confidence)
+        tried[clip_limit] = confidence
+        with instrumentation.labels(clip_limit=clip_limit):
+            entities = parse_variant(text, key)
+        if entities:
+            results.append(entities)
+        print(f"Multipass: CLAHE clipLimit={clip_limit}, confidence={confidence:.1f}")  # Debugging line
+        if key_fields_agree(results, min_agree):
+            break
+        clip_limit = next_clip_limit(tried, clip_limits)
+    if img is not None:
+        save_processed_image(prepared.image_path, img, name)
+    aggregated = aggregate_results(results)
+    print(f"Aggregated entities after {len(tried)} passes:", aggregated)
+    return aggregated, qr_url
+
+
+def roi_receipt_ocr(source, clip_limits=DEFAULT_CLIP_LIMITS, min_agree=ADAPTIVE_MIN_AGREE, name=None, pipeline=None,
+                    prepared=None):
+    """
+    Multipass OCR on text bands only. Blank paper, logos and the QR code are
+    cut out and the text bands are stacked into one strip per pass. The first
+    pass (middle clip limit) OCRs every band and classifies them by content,
+    the next clip limits only OCR the bands of fields that fewer than
+    min_agree passes agree on. Fields no pass has found yet keep all bands.
+    """
+    print(f"ROI multipass OCR for: {describe_source(source)}")
+    img_hash = cache.image_hash(source) if cache.CACHE_ENABLED else None
+    prepared, qr_url, ok = load_prepared(source, img_hash, prepared=prepared)
+    if not ok:
+        return {}, qr_url
+    with stage('layout'):
+        bands = [band for band in layout.find_text_bands(prepared.gray) if not band.graphic]
+    if not bands:
+        print("No text bands found, falling back to full image multipass.")
+        return multipass_receipt_ocr(source, clip_limits, name=name, pipeline=pipeline, prepared=prepared)
+
+    middle = next_clip_limit({}, clip_limits)
+    votes = {}
+    kinds = [set() for _ in bands]
+    selected = list(range(len(bands)))
+    pending = None
+    img = None
+    for clip_limit in sorted(clip_limits, key=lambda c: abs(c - middle)):
+        with instrumentation.labels(clip_limit=clip_limit):
+            strip, tops = layout.compose_strip(prepared.gray, [bands[i] for i in selected])
+            img = finish_image(PreparedImage(None, strip, None), clip_limit, pipeline)
+            with stage('ocr'):
+                texts = layout.assign_lines(ocr_image_lines(img), tops)
+            with stage('parse'):
+                entities = extract_entities('\n'.join(text for text in texts if text))
+        print(f"Multipass: CLAHE clipLimit={clip_limit}, {len(selected)}/{len(bands)} bands")  # Debugging line
+        for i, text in zip(selected, texts):
+            kinds[i] |= layout.classify_text(text)
+        for field, value in entities.items():
+            # Partial strips only count for the fields they were OCR'd for
+            if pending is None or field in pending:
+                votes.setdefault(field, []).append(value)
+        pending = [f for f in ROI_FIELDS
+                   if f not in votes or max(votes[f].count(v) for v in votes[f]) < min_agree]
+        if not pending:
+            break
+        if any(f not in votes for f in pending):
+            selected = list(range(len(bands)))
+        else:
+            selected = layout.bands_for_fields(kinds, pending)
+        if not selected:
+            break
+    if img is not None:
+        save_processed_image(prepared.image_path, img, name)
+    aggregated = {field: max(values, key=values.count) for field, values in votes.items()}
+    print("Aggregated entities:", aggregated)
+    return aggregated, qr_url
 
-    # Convert to float if possible
-    try:
-        amount_f = float(str(amount).replace(',', '.')) if amount else None
-        liters_f = float(str(liters).replace(',', '.')) if liters else None
-        price_f = float(str(price).replace(',', '.')) if price else None
-    except Exception:
-        amount_f = liters_f = price_f = None
+
+def qr_fields_complete(entities):
+    """
+    Whether OCR plus QR page fields are enough to skip multipass.
+    """
+    if any(field not in entities for field in QR_OCR_FIELDS):
+        return False
+    return sum(field in entities for field in ('amount', 'fuel_liters', 'fuel_price_per_liter')) >= 2
+
+
+def qr_fast_receipt_ocr(source, clip_limit=QR_FAST_CLIP_LIMIT, name=None, pipeline=None):
+    """
+    QR-first path: page fields (amount, address, receipt number) from the
+    receipt's QR code, then one OCR pass for the rest.
+    Returns (entities, qr_url, page_fields, prepared). entities is None when
+    the caller still has to run the full multipass: no QR code, page not
+    available, or the single pass missed fields. page_fields then still
+    override OCR, and prepared (None if it came from the cache) is passed on
+    so the fallback does not prepare the image again.
+    """
+    img_hash = cache.image_hash(source) if cache.CACHE_ENABLED else None
+    prepared, qr_url, ok = load_prepared(source, img_hash, need_pixels=False)
+    if not qr_url or not ok:
+        return None, qr_url, {}, prepared
+    from scraping import vmi_receipt_fields  # requests is only needed here
+    with stage('qr_page'):
+        page_fields = vmi_receipt_fields(qr_url)
+    if not page_fields:
+        print("QR page not available, running full OCR.")
+        return None, qr_url, {}, prepared
+
+    # Same cache key as the multipass pass with this clip limit, so a
+    # fallback to multipass does not OCR it again
+    key = cache.ocr_key(img_hash, clip_limit, pipeline=pipeline) if img_hash else None
+    cached = cache.get_text(key) if key else None
+    with instrumentation.labels(clip_limit=clip_limit):
+        if cached is not None:
+            entities = parse_variant(cached['text'], key)
+        else:
+            if prepared is None:
+                prepared, qr_url, ok = load_prepared(source, img_hash)
+            entities = ocr_variant(prepared, clip_limit, save=True, img_hash=img_hash, name=name, pipeline=pipeline)
+    entities = dict(entities, **page_fields)
+    if not qr_fields_complete(entities):
+        missing = [f for f in QR_OCR_FIELDS if f not in entities]
+        print(f"QR fast path: single pass incomplete {missing or 'amount/liters/price'}, running full OCR.")
+        return None, qr_url, page_fields, prepared
+    print("QR fast path entities:", entities)
+    return entities, qr_url, page_fields, prepared
+
+
+def proof_and_fill_fields(record, tolerance=0.02):
+    """
+    Fill the third of amount / liters / price per liter from the other two
+    and warn when all three disagree. Works on the parsed floats of a
+    ReceiptRecord, a dict of OCR strings is converted first.
+    """
+    if not isinstance(record, ReceiptRecord):
+        record = ReceiptRecord.from_entities(record)
+    amount_f, liters_f, price_f = record.amount, record.fuel_liters, record.fuel_price_per_liter
 
     # Proof and fill missing fields
-    if amount_f is not None and liters_f is not None and price_f is None:
+    if amount_f is not None and liters_f and price_f is None:
         calc_price = amount_f / liters_f
         if calc_price > 0:
-            aggregated['fuel_price_per_liter'] = round(calc_price, 3)
-    elif amount_f is not None and price_f is not None and liters_f is None:
+            record.fuel_price_per_liter = round(calc_price, 3)
+    elif amount_f is not None and price_f and liters_f is None:
         calc_liters = amount_f / price_f
         if calc_liters > 0:
-            aggregated['fuel_liters'] = round(calc_liters, 3)
+            record.fuel_liters = round(calc_liters, 3)
     elif liters_f is not None and price_f is not None and amount_f is None:
         calc_amount = liters_f * price_f
         if calc_amount > 0:
-            aggregated['amount'] = round(calc_amount, 2)
+            record.amount = round(calc_amount, 2)
 
     # Optionally, check consistency
     if amount_f and liters_f and price_f:
@@ -63,51 +404,90 @@ def proof_and_fill_fields(aggregated, tolerance=0.02):
         if abs(calc_amount - amount_f) > tolerance:
             print(f"Warning: Amount ({amount_f}) does not match liters*price ({calc_amount:.2f})")
 
-    return aggregated
+    return record
 
 
-def process_receipt(image_path):
-    print(f"Processing: {image_path}")
-    fname = os.path.basename(image_path)
-    aggregated, qr_url = multipass_receipt_ocr(image_path)
-    aggregated = proof_and_fill_fields(aggregated)
-
-    known_addresses = load_addresses()
-    extracted_address = aggregated.get('address')
-    matched_address_obj = fuzzy_match_address(extracted_address, known_addresses)
-    if matched_address_obj:
-        aggregated['address'] = matched_address_obj['address']
-        aggregated['station'] = matched_address_obj['station']
-        print(f"Matched address: {matched_address_obj['address']} (station: {matched_address_obj['station']})")
-    else:
-        print(f"Address not found in lookup. Please correct/add: {extracted_address}")
-        corrected = input("Enter correct address: ")
-        station = input("Enter station name: ")
-        add_address(corrected, station)
-        aggregated['address'] = corrected
-        aggregated['station'] = station
-
-    receipt_id = fname.split('.')[0]
-    existing = load_receipt_data(receipt_id)
-    if existing:
-        print("Existing record found. Differences:")
-        for k in aggregated:
-            if existing.get(k) != aggregated[k]:
-                print(f"  {k}: old={existing.get(k)}, new={aggregated[k]}")
-        # update = input("Update record? (y/n): ")
-        # if update.lower() == 'y':
-        #     save_receipt_data(receipt_id, aggregated)
+def process_receipt(source, workers=None, interactive=True, adaptive=None, receipt_id=None, roi=None,
+                    qr_first=None, pipeline=None):
+    """
+    Full pipeline for one receipt image. source is a file path, encoded
+    image bytes or a decoded NumPy array; nothing is written to disk except
+    the receipt record (and debug artifacts, if enabled).
+    receipt_id defaults to the file name, or to a content hash for in-memory
+    images. With interactive=False unmatched addresses go to the review
+    queue instead of prompting on stdin. adaptive=None follows MULTIPASS_ADAPTIVE,
+    roi=None follows MULTIPASS_ROI, qr_first=None follows QR_FAST_PATH.
+    pipeline is a preprocessing spec for this call, see preprocessing.get_pipeline.
+    Returns (ReceiptRecord, qr_url).
+    """
+    print(f"Processing: {describe_source(source)}")
+    image_path = os.fspath(source) if isinstance(source, (str, os.PathLike)) else None
+    if image_path:
+        fname = os.path.basename(image_path)
+        receipt_id = receipt_id or fname.split('.')[0]
     else:
-        save_receipt_data(receipt_id, aggregated)
-
-    print(f"Processed {fname}:")
-    for key, value in aggregated.items():
-        print(f"    {key}: {value}")
-    print(f"    QR URL: {qr_url}")
-    # if qr_url:
-    #     sum_match, address_match = extract_vmi_content(qr_url)
-    #     if sum_match:
-    #         print(f"Extracted sum: {sum_match.group(1)}")
-    #     if address_match:
-    #         print(f"Extracted address: {address_match.group(1).strip()}")
-    return aggregated, qr_url
+        receipt_id = receipt_id or cache.image_hash(source)[:16]
+        fname = receipt_id
+    with instrumentation.labels(receipt=receipt_id), stage('receipt'):
+        if adaptive is None:
+            adaptive = MULTIPASS_ADAPTIVE
+        if roi is None:
+            roi = MULTIPASS_ROI
+        if qr_first is None:
+            qr_first = QR_FAST_PATH
+        aggregated, page_fields, prepared = None, {}, None
+        if qr_first:
+            aggregated, qr_url, page_fields, prepared = qr_fast_receipt_ocr(source, name=receipt_id, pipeline=pipeline)
+        if aggregated is None:
+            if roi:
+                aggregated, qr_url = roi_receipt_ocr(source, name=receipt_id, pipeline=pipeline, prepared=prepared)
+            elif adaptive:
+                aggregated, qr_url = adaptive_multipass_receipt_ocr(source, name=receipt_id, pipeline=pipeline,
+                                                                    prepared=prepared)
+            else:
+                aggregated, qr_url = multipass_receipt_ocr(source, workers=workers, name=receipt_id,
+                                                           pipeline=pipeline, prepared=prepared)
+        # The QR page is the tax authority's copy, it wins over OCR
+        aggregated.update(page_fields)
+        # Typed from here on, values are parsed once
+        record = proof_and_fill_fields(ReceiptRecord.from_entities(aggregated))
+
+        with stage('address_match'):
+            known_addresses = get_address_index()
+            extracted_address = record.address
+            matched_address_obj = fuzzy_match_address(extracted_address, known_addresses)
+        if matched_address_obj:
+            record.address = matched_address_obj['address']
+            record.station = matched_address_obj['station']
+            print(f"Matched address: {matched_address_obj['address']} (station: {matched_address_obj['station']})")
+        elif not interactive:
+            queue_address_review(receipt_id, extracted_address, image_path)
+        else:
+            print(f"Address not found in lookup. Please correct/add: {extracted_address}")
+            corrected = input("Enter correct address: ")
+            station = input("Enter station name: ")
+            add_address(corrected, station)
+            record.address = corrected
+            record.station = station
+
+        with stage('load_existing'):
+            existing = load_receipt_data(receipt_id)
+        if existing:
+            # Older records hold OCR strings, compare typed values
+            existing = ReceiptRecord.from_entities(existing)
+            print("Existing record found. Differences:")
+            for k, value in record.items():
+                if existing.get(k) != value:
+                    print(f"  {k}: old={existing.get(k)}, new={value}")
+            # update = input("Update record? (y/n): ")
+            # if update.lower() == 'y':
+            #     save_receipt_data(receipt_id, record)
+        else:
+            with stage('save'):
+                save_receipt_data(receipt_id, record)
+
+        print(f"Processed {fname}:")
+        for key, value in record.items():
+            print(f"    {key}: {value}")
+        print(f"    QR URL: {qr_url}")
+        return record, qr_url
@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from normalization import to_float, to_iso_date
+from records import ReceiptRecord
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS receipts (
+    id TEXT PRIMARY KEY,
+    date TEXT,                  -- ISO YYYY-MM-DD, NULL if missing or unreadable
+    time TEXT,
+    station TEXT,
+    address TEXT,
+    fuel_type TEXT,
+    amount REAL,
+    fuel_liters REAL,
+    fuel_price_per_liter REAL,
+    language TEXT,
+    receipt_number TEXT,
+    data TEXT NOT NULL          -- record exactly as saved, JSON
+);
+CREATE INDEX IF NOT EXISTS idx_receipts_date ON receipts(date);
+CREATE INDEX IF NOT EXISTS idx_receipts_station ON receipts(station);
+CREATE INDEX IF NOT EXISTS idx_receipts_fuel_type ON receipts(fuel_type COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS processed_images (
+    hash TEXT PRIMARY KEY,      -- sha256 of the image file content
+    receipt_id TEXT,
+    file TEXT,
+    status TEXT NOT NULL,       -- 'ok' or 'error'
+    error TEXT,
+    processed_at REAL NOT NULL  -- unix time
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+COLUMNS = ('date', 'time', 'station', 'address', 'fuel_type', 'amount', 'fuel_liters', 'fuel_price_per_liter',
+           'language', 'receipt_number')
+NUMERIC_COLUMNS = ('amount', 'fuel_liters', 'fuel_price_per_liter')
+# Text columns added after the first release: created in older databases
+# on open and filled from the saved JSON
+ADDED_COLUMNS = ('receipt_number',)
+
+
+def to_row(receipt_id, data):
+    """
+    Column values of a receipt. A ReceiptRecord is already typed, a plain
+    dict (older callers, JSON imports) is parsed and stored as given.
+    """
+    if isinstance(data, ReceiptRecord):
+        row = {'id': receipt_id}
+        for column in COLUMNS:
+            row[column] = getattr(data, column)
+        row['date'] = data.date.isoformat() if data.date else None
+        row['data'] = json.dumps(data.to_dict(), ensure_ascii=False)
+        return row
+    row = {'id': receipt_id}
+    for column in COLUMNS:
+        value = data.get(column)
+        if column in NUMERIC_COLUMNS:
+            value = to_float(value)
+        elif column == 'date':
+            value = to_iso_date(value)
+        elif value is not None:
+            value = str(value)
+        row[column] = value
+    row['data'] = json.dumps(data, ensure_ascii=False)
+    return row
+
+
+class ReceiptStore:
+    """
+    Single-file SQLite receipt store. Typed, indexed columns for querying,
+    plus the original record as JSON so load returns what was saved.
+    One connection per thread, WAL so batch workers can write concurrently.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._listeners = []
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+            existing = {row['name'] for row in conn.execute('PRAGMA table_info(receipts)')}
+            for column in ADDED_COLUMNS:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE receipts ADD COLUMN {column} TEXT")
+                    conn.execute(f"UPDATE receipts SET {column} = json_extract(data, '$.{column}')")
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def add_listener(self, listener):
+        """
+        listener(conn, old_row, new_row) runs inside the upsert transaction for
+        every written receipt, old_row is None for new receipts. Used to keep
+        derived tables (running aggregates) in sync without a rescan.
+        """
+        self._listeners.append(listener)
+
+    def upsert(self, receipt_id, data):
+        self.upsert_many([(receipt_id, data)])
+
+    def upsert_many(self, items):
+        """
+        Insert or replace (receipt_id, data) pairs in one transaction.
+        """
+        rows = [to_row(receipt_id, data) for receipt_id, data in items]
+        if not rows:
+            return 0
+        columns = ('id',) + COLUMNS + ('data',)
+        sql = (f"INSERT INTO receipts ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)}) "
+               f"ON CONFLICT(id) DO UPDATE SET {', '.join(f'{c}=excluded.{c}' for c in columns[1:])}")
+        with self.connection() as conn:
+            # Take the write lock before reading the old rows: two writers of the
+            # same id must not both see the same old row and apply its delta twice
+            conn.execute('BEGIN IMMEDIATE')
+            if self._listeners:
+                old_rows = self._fetch_rows(conn, [row['id'] for row in rows])
+            conn.executemany(sql, rows)
+            if self._listeners:
+                for row in rows:
+                    old_row = old_rows.get(row['id'])
+                    for listener in self._listeners:
+                        listener(conn, old_row, row)
+                    # Same id twice in one batch: second write replaces the first
+                    old_rows[row['id']] = row
+        return len(rows)
+
+    def _fetch_rows(self, conn, ids, chunk_size=500):
+        found = {}
+        for i in range(0, len(ids), chunk_size):
+            chunk = ids[i:i + chunk_size]
+            sql = f"SELECT * FROM receipts WHERE id IN ({', '.join('?' * len(chunk))})"
+            for row in conn.execute(sql, chunk):
+                found[row['id']] = dict(row)
+        return found
+
+    def get(self, receipt_id):
+        row = self.connection().execute('SELECT data FROM receipts WHERE id = ?', (receipt_id,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def _where(self, date_from=None, date_to=None, station=None, fuel_type=None):
+        clauses, params = [], []
+        if date_from:
+            clauses.append('date >= ?')
+            params.append(to_iso_date(date_from) or date_from)
+        if date_to:
+            clauses.append('date <= ?')
+            params.append(to_iso_date(date_to) or date_to)
+        if station:
+            clauses.append('station = ?')
+            params.append(station)
+        if fuel_type:
+            clauses.append('fuel_type = ? COLLATE NOCASE')
+            params.append(fuel_type)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def query(self, date_from=None, date_to=None, station=None, fuel_type=None, limit=None):
+        """
+        Receipts matching all given filters, ordered by date.
+        Yields saved records with 'receipt_id' added.
+        """
+        where, params = self._where(date_from, date_to, station, fuel_type)
+        sql = f'SELECT id, data FROM receipts{where} ORDER BY date, time, id'
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        for row in self.connection().execute(sql, params):
+            yield {'receipt_id': row['id'], **json.loads(row['data'])}
+
+    def columns(self, names, date_from=None, date_to=None, station=None, fuel_type=None):
+        """
+        Cursor over typed columns only, no JSON decoding. For bulk analytics
+        and exports, rows are fetched as the cursor is iterated.
+        """
+        allowed = ('id',) + COLUMNS
+        for name in names:
+            if name not in allowed:
+                raise ValueError(f"Unknown receipt column: {name}")
+        where, params = self._where(date_from, date_to, station, fuel_type)
+        return self.connection().execute(
+            f"SELECT {', '.join(names)} FROM receipts{where} ORDER BY date, time, id", params)
+
+    def count(self, date_from=None, date_to=None, station=None, fuel_type=None):
+        where, params = self._where(date_from, date_to, station, fuel_type)
+        return self.connection().execute(f'SELECT COUNT(*) FROM receipts{where}', params).fetchone()[0]
+
+    def image_status(self, image_hash):
+        """
+        Status of a source image by content hash: 'ok', 'error' or None if
+        it was never processed.
+        """
+        row = self.connection().execute('SELECT status FROM processed_images WHERE hash = ?',
+                                        (image_hash,)).fetchone()
+        return row['status'] if row else None
+
+    def mark_image(self, image_hash, receipt_id, file, status, error=None):
+        with self.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO processed_images (hash, receipt_id, file, status, error, processed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (image_hash, receipt_id, file, status, error, time.time()))
+
+    def import_json_dir(self, directory):
+        """
+        One-off import of the old one-JSON-file-per-receipt layout.
+        Runs once per store, recorded in the meta table.
+        """
+        conn = self.connection()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+            return 0
+        items = []
+        if os.path.isdir(directory):
+            for fname in sorted(os.listdir(directory)):
+                if not fname.endswith('.json'):
+                    continue
+                with open(os.path.join(directory, fname), 'r', encoding='utf-8') as f:
+                    items.append((fname[:-len('.json')], json.load(f)))
+        self.upsert_many(items)
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', ?)", (directory,))
+        if items:
+            print(f"Imported {len(items)} receipts from {directory} into {self.path}")
+        return len(items)
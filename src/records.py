@@ -0,0 +1,85 @@
+from normalization import to_float, to_date
+
+FIELDS = ('station', 'address', 'date', 'time', 'fuel_type', 'fuel_price_per_liter', 'fuel_liters', 'amount',
+          'language', 'receipt_number')
+NUMERIC_FIELDS = ('fuel_price_per_liter', 'fuel_liters', 'amount')
+TEXT_FIELDS = ('station', 'address', 'time', 'fuel_type', 'language', 'receipt_number')
+
+
+class ReceiptRecord:
+    """
+    One receipt with typed values: amounts as floats, date as datetime.date,
+    None for fields not found. Built once from the aggregated OCR strings,
+    so later stages (proofing, storage, export) never re-parse them.
+    Fields extract_entities or the QR page add beyond FIELDS go to extra.
+    An OCR string that does not parse is kept there as <field>_raw.
+    """
+    __slots__ = FIELDS + ('extra',)
+
+    def __init__(self, **values):
+        for field in FIELDS:
+            setattr(self, field, values.pop(field, None))
+        self.extra = values
+
+    @classmethod
+    def from_entities(cls, entities):
+        """
+        From extract_entities / saved JSON values: '1,560' -> 1.56,
+        '2024.01.02' -> date(2024, 1, 2). Unparseable values become None,
+        the original string goes to extra as e.g. date_raw for review.
+        """
+        values = dict(entities)
+        for field, parse in [(field, to_float) for field in NUMERIC_FIELDS] + [('date', to_date)]:
+            if field in values:
+                raw = values[field]
+                values[field] = parse(raw)
+                if values[field] is None and raw not in (None, ''):
+                    values[f"{field}_raw"] = raw
+        for field in TEXT_FIELDS:
+            if values.get(field) is not None:
+                values[field] = str(values[field])
+        return cls(**values)
+
+    def get(self, field, default=None):
+        value = getattr(self, field, None) if field in FIELDS else self.extra.get(field)
+        return default if value is None else value
+
+    def __getitem__(self, field):
+        value = self.get(field)
+        if value is None:
+            raise KeyError(field)
+        return value
+
+    def __setitem__(self, field, value):
+        if field in FIELDS:
+            setattr(self, field, value)
+        else:
+            self.extra[field] = value
+
+    def __contains__(self, field):
+        return self.get(field) is not None
+
+    def items(self):
+        """
+        (field, value) pairs of the fields that are set, FIELDS order first.
+        """
+        for field in FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                yield field, value
+        yield from self.extra.items()
+
+    def to_dict(self):
+        """
+        JSON-ready dict of the set fields, date as YYYY-MM-DD.
+        """
+        data = dict(self.items())
+        if self.date is not None:
+            data['date'] = self.date.isoformat()
+        return data
+
+    def __eq__(self, other):
+        return isinstance(other, ReceiptRecord) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"ReceiptRecord({', '.join(f'{k}={v!r}' for k, v in self.items())})"
@@ -0,0 +1,231 @@
+import os
+import time
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+from PIL import Image
+
+# === Scheduler controls ===
+# Memory the batch may use in total, bytes. None: SCHEDULER_BUDGET_FRACTION
+# of the memory available when the batch starts.
+SCHEDULER_MEMORY_BUDGET = None
+SCHEDULER_BUDGET_FRACTION = 0.7
+WORKER_BASE_MEMORY = 200 * 1024 * 1024  # Idle worker: interpreter, OpenCV, Tesseract models
+# Peak bytes per source pixel of one receipt: decoded BGR and its brightness
+# copy, grayscale, resampled and rotated copies, two pipeline buffers and
+# Tesseract's own copy. Corrected upwards from measured peaks as jobs finish.
+JOB_BYTES_PER_PIXEL = 14
+COMPRESSED_PIXELS_PER_BYTE = 8  # Unreadable header: guess pixels from file size
+SCHEDULER_MAX_BYPASS = None  # Smaller jobs started ahead of a waiting large one, None: worker count
+# Only images this large correct the estimate, on small ones one-off costs
+# (first OCR call, imports) outweigh the per-pixel part
+CALIBRATION_MIN_PIXELS = 2_000_000
+
+_hwm_reset_supported = True
+
+
+def available_memory():
+    """
+    Bytes of memory available for new work (MemAvailable on Linux), None
+    if unknown.
+    """
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def image_pixels(path):
+    """
+    Pixel count from the image header, without decoding the image.
+    """
+    try:
+        with Image.open(path) as img:
+            w, h = img.size
+        return w * h
+    except Exception:
+        return os.path.getsize(path) * COMPRESSED_PIXELS_PER_BYTE
+
+
+def _status_bytes(field):
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def start_measure():
+    """
+    Reset this process's peak RSS (Linux) and return the current RSS, None
+    where per-job peaks cannot be measured. Pass it to end_measure.
+    """
+    global _hwm_reset_supported
+    if not _hwm_reset_supported:
+        return None
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        _hwm_reset_supported = False
+        return None
+    return _status_bytes('VmRSS:')
+
+
+def end_measure(baseline):
+    """
+    Peak RSS growth in bytes since start_measure, None if not measured.
+    """
+    if baseline is None:
+        return None
+    peak = _status_bytes('VmHWM:')
+    return max(0, peak - baseline) if peak is not None else None
+
+
+class Job:
+    __slots__ = ('path', 'pixels', 'estimate')
+
+    def __init__(self, path, pixels, estimate):
+        self.path = path
+        self.pixels = pixels
+        self.estimate = estimate
+
+
+class MemoryScheduler:
+    """
+    Admission control for a process pool. Jobs are ordered largest first,
+    so big images start while every core can still be kept busy with small
+    ones at the end. A job starts only when a worker is free and its
+    estimated peak fits in what is left of the memory budget. While the
+    largest waiting job does not fit, smaller ones that do are started
+    ahead of it, at most SCHEDULER_MAX_BYPASS times, so it is not starved.
+    A job larger than the whole budget runs alone.
+    """
+
+    def __init__(self, paths, workers, budget=None):
+        self.workers = workers
+        total = budget or SCHEDULER_MEMORY_BUDGET
+        if total is None:
+            available = available_memory()
+            total = int(available * SCHEDULER_BUDGET_FRACTION) if available else None
+        self.budget = total
+        # Worker processes take their base memory whether busy or not
+        self.job_budget = max(0, total - workers * WORKER_BASE_MEMORY) if total else None
+        self.max_bypass = SCHEDULER_MAX_BYPASS if SCHEDULER_MAX_BYPASS is not None else workers
+        self.bytes_per_pixel = JOB_BYTES_PER_PIXEL
+        self.pending = sorted((self._job(path) for path in paths), key=lambda j: -j.estimate)
+        self.in_flight = {}  # future -> Job
+        self.in_flight_bytes = 0
+        self.peak_in_flight_bytes = 0
+        self.peak_in_flight = 0
+        self.bypassed = 0
+        self.deferred = 0  # Times a free worker was left idle for memory
+        self.observed = []  # (pixels, estimate, measured peak)
+        self._lock = threading.Lock()
+
+    def _job(self, path):
+        pixels = image_pixels(path)
+        return Job(path, pixels, self._estimate(pixels))
+
+    def _estimate(self, pixels):
+        return int(pixels * self.bytes_per_pixel)
+
+    def _fits(self, job):
+        if self.job_budget is None:
+            return True
+        # Always let one job run, even if it is larger than the budget
+        return not self.in_flight or self.in_flight_bytes + job.estimate <= self.job_budget
+
+    def _next(self):
+        """
+        Job to start now, None if nothing may start.
+        """
+        if not self.pending or len(self.in_flight) >= self.workers:
+            return None
+        if self._fits(self.pending[0]):
+            self.bypassed = 0
+            return self.pending.pop(0)
+        if self.bypassed < self.max_bypass:
+            for i, job in enumerate(self.pending):
+                if self._fits(job):
+                    self.bypassed += 1
+                    return self.pending.pop(i)
+        self.deferred += 1
+        return None
+
+    def fill(self, executor, fn):
+        """
+        Submit every job that may start now. fn(path) runs in the pool.
+        """
+        with self._lock:
+            while True:
+                job = self._next()
+                if job is None:
+                    return
+                future = executor.submit(fn, job.path)
+                self.in_flight[future] = job
+                self.in_flight_bytes += job.estimate
+                self.peak_in_flight_bytes = max(self.peak_in_flight_bytes, self.in_flight_bytes)
+                self.peak_in_flight = max(self.peak_in_flight, len(self.in_flight))
+
+    def finished(self, future, measured_peak=None):
+        """
+        Release a finished job's memory. measured_peak (worker peak RSS minus
+        its base) corrects the per-pixel estimate for the jobs still waiting.
+        """
+        with self._lock:
+            job = self.in_flight.pop(future)
+            self.in_flight_bytes -= job.estimate
+            if measured_peak and job.pixels >= CALIBRATION_MIN_PIXELS:
+                self.observed.append((job.pixels, job.estimate, measured_peak))
+                ratio = measured_peak / job.pixels
+                if ratio > self.bytes_per_pixel:
+                    # Only ever raise it: underestimating is what gets workers killed
+                    self.bytes_per_pixel = ratio
+                    for waiting in self.pending:
+                        waiting.estimate = self._estimate(waiting.pixels)
+                    self.pending.sort(key=lambda j: -j.estimate)
+            return job
+
+    def run(self, executor, fn, peak_of=None):
+        """
+        Yield (path, result) as jobs complete, keeping the pool filled within
+        the budget. The result is fn's return value, or its exception.
+        peak_of(result) gives the job's measured peak memory, if any.
+        """
+        self.fill(executor, fn)
+        while self.in_flight:
+            done, _ = wait(list(self.in_flight), return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result, error = future.result(), None
+                except Exception as e:
+                    result, error = None, e
+                measured = peak_of(result) if peak_of and error is None else None
+                job = self.finished(future, measured)
+                yield job.path, error if error is not None else result
+            self.fill(executor, fn)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'queued': len(self.pending),
+                'in_flight': len(self.in_flight),
+                'in_flight_bytes': self.in_flight_bytes,
+                'peak_in_flight': self.peak_in_flight,
+                'peak_in_flight_bytes': self.peak_in_flight_bytes,
+                'budget_bytes': self.budget,
+                'job_budget_bytes': self.job_budget,
+                'bytes_per_pixel': round(self.bytes_per_pixel, 2),
+                'deferred': self.deferred,
+                'timestamp': time.time(),
+            }
@@ -1,34 +1,254 @@
-import requests
 import re
+import time
+import random
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, parse_qs
+import requests
+from requests.adapters import HTTPAdapter
+import cache
+
+# === QR page fetch controls ===
+FETCH_TIMEOUT = 10  # s per request
+FETCH_CONCURRENCY = 8  # Requests in flight at once, also the connection pool size
+FETCH_RATE_PER_HOST = 2.0  # Requests per second to one host, None for no limit
+FETCH_RETRIES = 3  # Retries on connection errors, timeouts, 429 and 5xx
+FETCH_BACKOFF = 0.5  # s, doubled on every retry, plus jitter
+FETCH_CACHE = True  # Keep fetched pages on disk (cache.PAGE_CACHE_DIR), QR pages do not change
+# Send kvitas.vmi.lt requests to another server instead, e.g. a local stand-in
+# 'http://127.0.0.1:8000' for testing. None fetches the real site.
+VMI_BASE_URL = None
+VMI_HOST = 'kvitas.vmi.lt'
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Cache-Control': 'max-age=0',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+}
+RETRY_STATUSES = (429, 500, 502, 503, 504)
 
+_session = None
+_session_lock = threading.Lock()
+_limiters = {}  # rate -> HostRateLimiter, shared by fetch_html and fetch_many
+_limiters_lock = threading.Lock()
 
-def fetch_html(url, timeout=10):
+
+def get_session():
     """
-    Fetch HTML content from a URL. Returns HTML string or None.
+    Shared session, connections are kept alive and reused across fetches
+    and threads.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=FETCH_CONCURRENCY, pool_maxsize=FETCH_CONCURRENCY)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update(HEADERS)
+                _session = session
+    return _session
+
+
+def resolve_url(url):
+    """
+    URL actually requested, VMI_BASE_URL replaces the kvitas.vmi.lt origin.
+    """
+    if not VMI_BASE_URL:
+        return url
+    parts = urlsplit(url)
+    if parts.hostname != VMI_HOST:
+        return url
+    base = urlsplit(VMI_BASE_URL)
+    return urlunsplit((base.scheme, base.netloc, base.path.rstrip('/') + parts.path, parts.query, parts.fragment))
+
+
+def _retry_delay(attempt, response=None):
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return FETCH_BACKOFF * 2 ** attempt * (1 + random.random() * 0.25)
+
+
+def _get(url, timeout):
+    """
+    One GET, no retries. Returns (html or None, error, response or None),
+    retrying is left to the caller so the async path sleeps without
+    holding a thread.
     """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Cache-Control': 'max-age=0',
-        'Sec-Fetch-Dest': 'document',
-        'Sec-Fetch-Mode': 'navigate',
-        'Sec-Fetch-Site': 'none',
-        'Sec-Fetch-User': '?1',
-    }
     try:
-        resp = requests.get(url, headers=headers, timeout=timeout)
-        if resp.status_code == 200:
-            return resp.text
-        else:
-            print(f"Failed to fetch {url}, status: {resp.status_code}")
-            return None
-    except Exception as e:
-        print(f"Error fetching {url}: {e}")
-        return None
+        resp = get_session().get(resolve_url(url), timeout=timeout)
+    except requests.RequestException as e:
+        return None, e, None
+    if resp.status_code == 200:
+        return resp.text, None, resp
+    return None, f"status: {resp.status_code}", resp
+
+
+class HostRateLimiter:
+    """
+    Spaces requests to the same host at least 1 / rate seconds apart, across
+    threads and event loops: a caller reserves the next free slot and sleeps
+    until it comes, the sync path with time.sleep, the async one with
+    asyncio.sleep.
+    """
+
+    def __init__(self, rate=FETCH_RATE_PER_HOST):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, url):
+        """
+        Seconds to wait before requesting url, the slot is taken.
+        """
+        if not self.interval:
+            return 0.0
+        host = urlsplit(resolve_url(url)).netloc
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next.get(host, now))
+            self._next[host] = start + self.interval
+        return start - now
+
+    def wait_sync(self, url):
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait(self, url):
+        delay = self.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def get_limiter(rate=FETCH_RATE_PER_HOST):
+    """
+    Process-wide limiter for rate, so single fetches and batches share it.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(rate)
+        if limiter is None:
+            limiter = _limiters[rate] = HostRateLimiter(rate)
+        return limiter
+
+
+def fetch_html(url, timeout=FETCH_TIMEOUT):
+    """
+    Fetch HTML content from a URL. Returns HTML string or None.
+    Cached pages are returned without a request.
+    """
+    html = cache.get_page(url) if FETCH_CACHE else None
+    if html is not None:
+        return html
+    limiter = get_limiter(FETCH_RATE_PER_HOST)
+    for attempt in range(FETCH_RETRIES + 1):
+        limiter.wait_sync(url)
+        html, error, resp = _get(url, timeout)
+        if html is not None:
+            if FETCH_CACHE:
+                cache.put_page(url, html)
+            return html
+        if attempt == FETCH_RETRIES or (resp is not None and resp.status_code not in RETRY_STATUSES):
+            break
+        time.sleep(_retry_delay(attempt, resp))
+    print(f"Failed to fetch {url}: {error}")
+    return None
+
+
+async def fetch_html_async(url, semaphore, limiter, timeout=FETCH_TIMEOUT, executor=None):
+    """
+    fetch_html for asyncio: bounded by semaphore, rate limited per host,
+    the blocking request runs in executor (default: the loop's) on the
+    shared session.
+    """
+    html = cache.get_page(url) if FETCH_CACHE else None
+    if html is not None:
+        return html
+    for attempt in range(FETCH_RETRIES + 1):
+        await limiter.wait(url)
+        async with semaphore:
+            html, error, resp = await asyncio.get_running_loop().run_in_executor(executor, _get, url, timeout)
+        if html is not None:
+            if FETCH_CACHE:
+                cache.put_page(url, html)
+            return html
+        if attempt == FETCH_RETRIES or (resp is not None and resp.status_code not in RETRY_STATUSES):
+            break
+        await asyncio.sleep(_retry_delay(attempt, resp))
+    print(f"Failed to fetch {url}: {error}")
+    return None
+
+
+async def fetch_many_async(urls, concurrency=FETCH_CONCURRENCY, rate=FETCH_RATE_PER_HOST, timeout=FETCH_TIMEOUT):
+    unique = list(dict.fromkeys(url for url in urls if url))
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = get_limiter(rate)
+    # Own threads, the loop's default executor may be smaller than concurrency
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pages = await asyncio.gather(*(fetch_html_async(url, semaphore, limiter, timeout, executor) for url in unique))
+    return dict(zip(unique, pages))
+
+
+def fetch_many(urls, concurrency=FETCH_CONCURRENCY, rate=FETCH_RATE_PER_HOST, timeout=FETCH_TIMEOUT):
+    """
+    Fetch many URLs concurrently. Returns {url: html or None}, each distinct
+    URL is requested at most once.
+    """
+    return asyncio.run(fetch_many_async(urls, concurrency, rate, timeout))
+
+
+def parse_vmi_html(html):
+    """
+    (sum_match, address_match) from a kvitas.vmi.lt receipt page.
+    """
+    sum_match = re.search(r'Suma.*?(\d+[.,]\d+)', html)
+    address_match = re.search(r'Adresas.*?<td[^>]*>(.*?)<', html, re.DOTALL)
+    return sum_match, address_match
+
+
+def parse_qr_url(qr_url):
+    """
+    Query fields of a kvitas.vmi.lt QR link: NR (receipt number), SM
+    (security module), RS (signature), RC (receipt code). {} for other URLs.
+    """
+    parts = urlsplit(qr_url or '')
+    if parts.hostname != VMI_HOST:
+        return {}
+    return {key: values[0] for key, values in parse_qs(parts.query).items() if values}
+
+
+def vmi_receipt_fields(qr_url):
+    """
+    Receipt fields from the QR link and its (cached) page, named like
+    extract_entities fields: receipt_number, amount, address. Only fields
+    actually found are returned, {} when the page could not be fetched.
+    """
+    params = parse_qr_url(qr_url)
+    if 'NR' not in params:
+        return {}
+    html = fetch_html(qr_url)
+    if html is None:
+        return {}
+    sum_match, address_match = parse_vmi_html(html)
+    fields = {}
+    if sum_match:
+        fields['amount'] = sum_match.group(1)
+    if address_match and address_match.group(1).strip():
+        fields['address'] = address_match.group(1).strip()
+    if fields:
+        fields['receipt_number'] = params['NR']
+    return fields
 
 
 def extract_vmi_content(qr_url):
@@ -47,8 +267,19 @@ def extract_vmi_content(qr_url):
         if html is None:
             print("Failed to retrieve QR page.")
             return None, None
-        sum_match = re.search(r'Suma.*?(\d+[.,]\d+)', html)
-        address_match = re.search(r'Adresas.*?<td[^>]*>(.*?)<', html, re.DOTALL)
+        sum_match, address_match = parse_vmi_html(html)
     except Exception as e:
         print(f"Error scraping QR page: {e}")
     return sum_match, address_match
+
+
+def extract_vmi_contents(qr_urls, concurrency=FETCH_CONCURRENCY, rate=FETCH_RATE_PER_HOST):
+    """
+    Batch extract_vmi_content: {qr_url: (sum_match, address_match)},
+    pages fetched concurrently and cached.
+    """
+    pages = fetch_many(qr_urls, concurrency, rate)
+    results = {}
+    for url, html in pages.items():
+        results[url] = parse_vmi_html(html) if html is not None else (None, None)
+    return results
@@ -0,0 +1,275 @@
+import os
+import json
+import time
+import queue
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import cache
+from ocr import get_backend
+from process_receipt import process_receipt
+from stored_data import get_address_index, get_store
+
+# === Service controls ===
+SERVICE_HOST = '127.0.0.1'  # Local only, there is no authentication
+SERVICE_PORT = 8080
+SERVICE_WORKERS = os.cpu_count() or 1  # Receipts processed at once
+SERVICE_QUEUE_SIZE = 32  # Waiting requests, above this new uploads get 503
+SERVICE_BATCH_SIZE = 8  # Max requests taken off the queue per dispatch
+SERVICE_BATCH_WAIT = 0.05  # s to wait for more requests to fill a batch
+SERVICE_TIMEOUT = 300  # s a request waits for its result before 504
+SERVICE_MAX_UPLOAD = 32 * 1024 * 1024  # bytes
+
+
+class Job:
+    """
+    One upload waiting for its result.
+    """
+    __slots__ = ('image', 'receipt_id', 'img_hash', 'done', 'result', 'error', 'queued_at')
+
+    def __init__(self, image, receipt_id=None):
+        self.image = image
+        self.receipt_id = receipt_id
+        self.img_hash = cache.image_hash(image)
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.queued_at = time.time()
+
+
+class ReceiptService:
+    """
+    Warm receipt pipeline behind a bounded queue. A dispatcher thread takes
+    requests off the queue in small batches, runs identical uploads in a
+    batch once and hands the rest to a thread pool sharing the warm OCR
+    engines, address index and store connection pool.
+    """
+
+    def __init__(self, workers=SERVICE_WORKERS, queue_size=SERVICE_QUEUE_SIZE):
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self._slots = threading.Semaphore(workers)
+        self.in_flight = 0
+        self.processed = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+
+    def warm_up(self):
+        """
+        Load everything the CLI pays for on every run: OCR engine and
+        language detection, address index, receipt store.
+        """
+        start = time.perf_counter()
+        get_backend()
+        get_address_index()
+        get_store()
+        print(f"Service warm-up done in {time.perf_counter() - start:.2f}s")
+
+    def start(self):
+        self.warm_up()
+        self._dispatcher.start()
+
+    def stop(self):
+        self._stop.set()
+        self._dispatcher.join()
+        self.executor.shutdown(wait=True)
+
+    def submit(self, job):
+        """
+        Queue a job, False if the queue is full (caller answers 503).
+        """
+        try:
+            self.queue.put_nowait(job)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+
+    def _next_batch(self):
+        """
+        Requests arriving within SERVICE_BATCH_WAIT, one free worker slot
+        held per request. Requests only leave the bounded queue with a slot,
+        so the executor's own queue never grows and clients see backpressure.
+        """
+        if not self._slots.acquire(timeout=0.5):
+            return []
+        try:
+            batch = [self.queue.get(timeout=0.5)]
+        except queue.Empty:
+            self._slots.release()
+            return []
+        deadline = time.monotonic() + SERVICE_BATCH_WAIT
+        while len(batch) < SERVICE_BATCH_SIZE and self._slots.acquire(blocking=False):
+            try:
+                batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                self._slots.release()
+                break
+        return batch
+
+    def _dispatch(self):
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            # Same image uploaded twice in one batch is processed once
+            groups = {}
+            for job in batch:
+                groups.setdefault((job.img_hash, job.receipt_id), []).append(job)
+            for _ in range(len(batch) - len(groups)):
+                self._slots.release()
+            for jobs in groups.values():
+                with self._lock:
+                    self.in_flight += 1
+                self.executor.submit(self._run, jobs)
+
+    def _run(self, jobs):
+        first = jobs[0]
+        try:
+            record, qr_url = process_receipt(first.image, interactive=False, receipt_id=first.receipt_id)
+            result = {
+                'receipt_id': first.receipt_id or first.img_hash[:16],
+                'entities': record.to_dict(),
+                'qr_url': qr_url,
+            }
+            error = None
+        except Exception as e:
+            result, error = None, f"{type(e).__name__}: {e}"
+        with self._lock:
+            self.in_flight -= 1
+            self.processed += len(jobs)
+        self._slots.release()
+        for job in jobs:
+            job.result = dict(result, seconds=round(time.time() - job.queued_at, 3)) if result else None
+            job.error = error
+            job.done.set()
+
+    def health(self):
+        with self._lock:
+            return {
+                'status': 'ok',
+                'workers': self.workers,
+                'queued': self.queue.qsize(),
+                'queue_size': self.queue.maxsize,
+                'in_flight': self.in_flight,
+                'processed': self.processed,
+                'rejected': self.rejected,
+            }
+
+
+def read_upload(headers, body):
+    """
+    Image bytes from a raw body or the first file part of multipart/form-data.
+    """
+    content_type = headers.get('Content-Type', '')
+    if not content_type.startswith('multipart/form-data'):
+        return body
+    message = BytesParser(policy=HTTP).parsebytes(
+        b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body)
+    for part in message.iter_parts():
+        if part.get_filename() or part.get_content_maintype() == 'image':
+            return part.get_payload(decode=True)
+    return None
+
+
+class ReceiptRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /receipts   image as the raw body (or multipart/form-data),
+                     optional ?receipt_id=..., returns extracted entities
+    GET  /health     queue and worker state
+    """
+    service = None  # Set by make_server
+    protocol_version = 'HTTP/1.1'
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _reject(self, status, payload):
+        """
+        Error sent before the request body was read. The unread body would be
+        parsed as the next request on a keep-alive connection, so close it.
+        """
+        self.close_connection = True
+        self._send_json(status, payload, {'Connection': 'close'})
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/health':
+            self._send_json(200, self.service.health())
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/receipts':
+            self._reject(404, {'error': 'not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            self._reject(400, {'error': 'invalid Content-Length'})
+            return
+        if length <= 0:
+            self._reject(400, {'error': 'empty upload'})
+            return
+        if length > SERVICE_MAX_UPLOAD:
+            self._reject(413, {'error': f"upload larger than {SERVICE_MAX_UPLOAD} bytes"})
+            return
+        image = read_upload(self.headers, self.rfile.read(length))
+        if not image:
+            self._send_json(400, {'error': 'no image in upload'})
+            return
+        receipt_id = parse_qs(url.query).get('receipt_id', [None])[0]
+        job = Job(image, receipt_id)
+        if not self.service.submit(job):
+            self._send_json(503, {'error': 'queue full, retry later'}, {'Retry-After': '1'})
+            return
+        if not job.done.wait(SERVICE_TIMEOUT):
+            self._send_json(504, {'error': 'timed out waiting for a worker'})
+            return
+        if job.error:
+            self._send_json(422, {'error': job.error})
+        else:
+            self._send_json(200, job.result)
+
+    def log_message(self, format, *args):
+        print(f"[service] {self.address_string()} {format % args}")
+
+
+def make_server(host=SERVICE_HOST, port=SERVICE_PORT, service=None):
+    """
+    HTTP server bound to host:port around a started ReceiptService.
+    port=0 picks a free port (server.server_address has the real one).
+    """
+    service = service or ReceiptService()
+    handler = type('Handler', (ReceiptRequestHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def serve(host=SERVICE_HOST, port=SERVICE_PORT, workers=None):
+    service = ReceiptService(workers or SERVICE_WORKERS)
+    service.start()
+    server = make_server(host, port, service)
+    print(f"Serving on http://{server.server_address[0]}:{server.server_address[1]} "
+          f"({service.workers} workers, queue {service.queue.maxsize})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping service.")
+    finally:
+        server.server_close()
+        service.stop()
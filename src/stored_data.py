@@ -1,25 +1,59 @@
 import os
 import re
 import json
+from address_index import AddressIndex
+from receipt_store import ReceiptStore
+import aggregates
 
 ADDRESS_FILE = os.path.join(os.path.dirname(__file__), '../data/addresses.json')
-RECEIPT_DATA_DIR = os.path.join(os.path.dirname(__file__), '../data/receipts_data')
-os.makedirs(RECEIPT_DATA_DIR, exist_ok=True)
+RECEIPT_DATA_DIR = os.path.join(os.path.dirname(__file__), '../data/receipts_data')  # Legacy layout, imported once
+RECEIPT_DB = os.path.join(os.path.dirname(__file__), '../data/receipts.db')
+ADDRESS_REVIEW_FILE = os.path.join(os.path.dirname(__file__), '../data/address_review.jsonl')
+
+_store = None
+_address_index = None
+_address_index_key = None  # (path, mtime) the index was loaded from
+
+
+def get_store():
+    """
+    Receipt store for RECEIPT_DB, opened once per process. Receipts from the
+    old data/receipts_data/<id>.json layout are imported on first open.
+    """
+    global _store
+    if _store is None or _store.path != RECEIPT_DB:
+        _store = ReceiptStore(RECEIPT_DB)
+        aggregates.attach(_store)
+        _store.import_json_dir(RECEIPT_DATA_DIR)
+    return _store
 
 
 def save_receipt_data(receipt_id, data):
-    path = os.path.join(RECEIPT_DATA_DIR, f"{receipt_id}.json")
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    print(f"Saved receipt data to {path}")
+    get_store().upsert(receipt_id, data)
+    print(f"Saved receipt data for {receipt_id} to {RECEIPT_DB}")
+
+
+def save_receipts_data(items):
+    """
+    Bulk upsert of (receipt_id, data) pairs in one transaction.
+    """
+    count = get_store().upsert_many(items)
+    print(f"Saved {count} receipts to {RECEIPT_DB}")
 
 
 def load_receipt_data(receipt_id):
-    path = os.path.join(RECEIPT_DATA_DIR, f"{receipt_id}.json")
-    if os.path.exists(path):
-        with open(path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return None
+    return get_store().get(receipt_id)
+
+
+def image_status(image_hash):
+    """
+    'ok' / 'error' if an image with this content hash was processed, else None.
+    """
+    return get_store().image_status(image_hash)
+
+
+def mark_image_processed(image_hash, receipt_id, file, status='ok', error=None):
+    get_store().mark_image(image_hash, receipt_id, file, status, error)
 
 
 def load_addresses():
@@ -29,7 +63,24 @@ def load_addresses():
     return []
 
 
+def get_address_index():
+    """
+    Address index loaded once and kept in memory. Reloaded only when
+    addresses.json is replaced or changed by another process.
+    """
+    global _address_index, _address_index_key
+    try:
+        key = (ADDRESS_FILE, os.stat(ADDRESS_FILE).st_mtime_ns)
+    except OSError:
+        key = (ADDRESS_FILE, None)
+    if _address_index is None or key != _address_index_key:
+        _address_index = AddressIndex(load_addresses())
+        _address_index_key = key
+    return _address_index
+
+
 def save_addresses(addresses):
+    os.makedirs(os.path.dirname(ADDRESS_FILE), exist_ok=True)
     with open(ADDRESS_FILE, 'w', encoding='utf-8') as f:
         json.dump(addresses, f, ensure_ascii=False, indent=2)
 
@@ -57,25 +108,38 @@ def levenshtein(a, b):
 
 
 def fuzzy_match_address(address, known_addresses, threshold=3):
-    # Simple Levenshtein distance (can use rapidfuzz or python-Levenshtein for speed)
-    # matches = [
-    #     (entry, levenshtein(address, entry["address"]))
-    #     for entry in known_addresses if "address" in entry
-    # ]
-    # matches.sort(key=lambda x: x[1])
-    # if matches and matches[0][1] <= threshold:
-    #     return matches[0][0]
-    # return None
-    candidates = extract_address_candidates(address)
-    for candidate in candidates:
-        for entry in known_addresses:
-            dist = levenshtein(candidate, entry["address"])
-            if dist <= threshold:
-                return entry
-    return None
+    """
+    Best known address entry within threshold edits of any address-like
+    substring of the OCR text. known_addresses is an AddressIndex or a list.
+    """
+    if not address:
+        return None
+    if not isinstance(known_addresses, AddressIndex):
+        known_addresses = AddressIndex(known_addresses)
+    entry, _ = known_addresses.best_match(extract_address_candidates(address), threshold)
+    return entry
+
 
 def add_address(address, station):
+    global _address_index_key
+    index = get_address_index()
+    entry = {"address": address, "station": station}
     addresses = load_addresses()
-    addresses.append({"address": address, "station": station})
+    addresses.append(entry)
     save_addresses(addresses)
+    # Update in place instead of rebuilding the index on next lookup
+    index.add(entry)
+    _address_index_key = (ADDRESS_FILE, os.stat(ADDRESS_FILE).st_mtime_ns)
     print(f"Added address: {address} (station: {station})")
+
+
+def queue_address_review(receipt_id, address, image_path=None):
+    """
+    Append an unmatched address to the review queue instead of prompting.
+    One JSON object per line, appends from several processes do not interleave.
+    """
+    entry = {"receipt_id": receipt_id, "address": address, "image_path": image_path}
+    os.makedirs(os.path.dirname(ADDRESS_REVIEW_FILE), exist_ok=True)
+    with open(ADDRESS_REVIEW_FILE, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    print(f"Queued address for review: {address}")
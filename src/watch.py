@@ -0,0 +1,194 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import artifacts
+import cache
+import instrumentation
+import preprocessing
+from batch import is_receipt_image, _init_worker, _process_one
+from stored_data import image_status, mark_image_processed
+
+try:
+    import inotify_simple
+except ImportError:  # Optional, Linux only, falls back to polling
+    inotify_simple = None
+
+# === Watch folder controls ===
+WATCH_POLL_INTERVAL = 2.0  # s between directory scans when polling
+WATCH_SETTLE_SECONDS = 2.0  # Polling: size/mtime unchanged this long before a file counts as fully synced
+WATCH_QUEUE_SIZE = 64  # Images waiting for a worker, the watcher blocks when full
+WATCH_RETRY_ERRORS = False  # Reprocess images whose last attempt failed
+
+
+class FolderWatcher:
+    """
+    Long-running ingestion of a synced receipt folder. New images go through
+    a bounded queue to a process pool, results are saved as they complete.
+    Source images are tracked by content hash in the store, so restarts,
+    renames and re-synced copies do not reprocess anything.
+    """
+
+    def __init__(self, receipt_dir, workers=None, use_inotify=None):
+        self.receipt_dir = receipt_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.use_inotify = inotify_simple is not None if use_inotify is None else use_inotify
+        self.queue = queue.Queue(maxsize=WATCH_QUEUE_SIZE)
+        self.stop_event = threading.Event()
+        self.counts = {'ok': 0, 'error': 0, 'skipped': 0}
+        self._pending = set()  # Hashes queued or in flight
+        self._lock = threading.Lock()
+        self._seen = {}  # Polling: file name -> ((size, mtime_ns), unchanged since, offered)
+
+    def offer(self, path, arrived=None):
+        """
+        Queue an image unless the same content was already processed or is
+        queued. Blocks while the queue is full. Returns True if queued.
+        """
+        if not is_receipt_image(os.path.basename(path)):
+            return False
+        arrived = arrived or time.time()
+        try:
+            img_hash = cache.image_hash(path)
+        except OSError:
+            return False  # Removed or renamed before we got to it, the rename has its own event
+        status = image_status(img_hash)
+        with self._lock:
+            if status == 'ok' or (status == 'error' and not WATCH_RETRY_ERRORS) or img_hash in self._pending:
+                self.counts['skipped'] += 1
+                return False
+            self._pending.add(img_hash)
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put((path, img_hash, arrived), timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _dispatch(self, executor):
+        """
+        Worker thread: one image at a time into the process pool, so the
+        queue stays the only buffer and in-flight work is bounded by workers.
+        """
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            path, img_hash, arrived = item
+            try:
+                entry, stage_records = executor.submit(_process_one, path).result()
+            except Exception as e:
+                # Pool failure (worker killed, shutdown), not the image's fault:
+                # leave it unmarked so it is picked up again on restart
+                print(f"[watch] {os.path.basename(path)}: worker failed: {type(e).__name__}: {e}")
+                with self._lock:
+                    self._pending.discard(img_hash)
+                continue
+            instrumentation.extend(stage_records)
+            receipt_id = entry['file'].split('.')[0]
+            mark_image_processed(img_hash, receipt_id, entry['file'], entry['status'], entry['error'])
+            with self._lock:
+                self._pending.discard(img_hash)
+                self.counts[entry['status']] += 1
+            error = f" ({entry['error']})" if entry['error'] else ''
+            print(f"[watch] {entry['file']}: {entry['status']} in {entry['seconds']:.1f}s, "
+                  f"saved {time.time() - arrived:.1f}s after arrival{error}")
+
+    def scan(self):
+        """
+        Polling pass. Files older than WATCH_SETTLE_SECONDS are offered right
+        away (startup catch-up), new ones once their size and mtime have
+        stopped changing for that long.
+        """
+        now = time.time()
+        names = set()
+        for entry in os.scandir(self.receipt_dir):
+            if not entry.is_file() or not is_receipt_image(entry.name):
+                continue
+            names.add(entry.name)
+            st = entry.stat()
+            signature = (st.st_size, st.st_mtime_ns)
+            seen = self._seen.get(entry.name)
+            if seen is None or seen[0] != signature:
+                settled = now - st.st_mtime >= WATCH_SETTLE_SECONDS
+                self._seen[entry.name] = (signature, now, settled)
+                if settled:
+                    self.offer(entry.path, now)
+            elif not seen[2] and now - seen[1] >= WATCH_SETTLE_SECONDS:
+                self._seen[entry.name] = (signature, seen[1], True)
+                self.offer(entry.path, seen[1])
+        for name in set(self._seen) - names:
+            del self._seen[name]
+
+    def _watch_inotify(self):
+        flags = inotify_simple.flags
+        inotify = inotify_simple.INotify()
+        try:
+            # Watch first, then catch up, so nothing written in between is missed
+            inotify.add_watch(self.receipt_dir, flags.CLOSE_WRITE | flags.MOVED_TO)
+            self.scan()
+            # The catch-up scan skips files modified within WATCH_SETTLE_SECONDS,
+            # their CLOSE_WRITE may have fired before the watch existed
+            rescan_at = time.time() + WATCH_SETTLE_SECONDS
+            while not self.stop_event.is_set():
+                for event in inotify.read(timeout=1000):
+                    if event.name:
+                        self.offer(os.path.join(self.receipt_dir, event.name))
+                if rescan_at is not None and time.time() >= rescan_at:
+                    self.scan()
+                    rescan_at = None
+        finally:
+            inotify.close()
+
+    def _watch_polling(self):
+        while not self.stop_event.is_set():
+            self.scan()
+            self.stop_event.wait(WATCH_POLL_INTERVAL)
+
+    def run(self, report_path=None):
+        """
+        Watch until interrupted. Returns counts of ok / error / skipped images.
+        """
+        os.makedirs(self.receipt_dir, exist_ok=True)
+        mode = 'inotify' if self.use_inotify else f"polling every {WATCH_POLL_INTERVAL}s"
+        print(f"Watching {self.receipt_dir} ({mode}), {self.workers} workers. Ctrl+C to stop.")
+        if report_path:
+            instrumentation.configure(True, instrumentation.TRACK_MEMORY)
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(instrumentation.INSTRUMENTATION_ENABLED, instrumentation.TRACK_MEMORY,
+                      artifacts.SAVE_ARTIFACTS, artifacts.ARTIFACT_DIR, preprocessing.PIPELINE,
+                      1 if self.workers > 1 else None),  # Worker processes already fill the cores
+        )
+        threads = [threading.Thread(target=self._dispatch, args=(executor,), daemon=True)
+                   for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            if self.use_inotify:
+                self._watch_inotify()
+            else:
+                self._watch_polling()
+        except KeyboardInterrupt:
+            print("Stopping watcher, queued images are picked up on the next start.")
+        finally:
+            self.stop_event.set()
+            # Queued images are not marked yet, dropping them is safe
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            for _ in threads:
+                self.queue.put(None)
+            for thread in threads:
+                thread.join()
+            executor.shutdown(wait=True, cancel_futures=True)
+            if report_path:
+                instrumentation.write_report(report_path)
+        print(f"Watcher stopped: {self.counts['ok']} ok, {self.counts['error']} errors, "
+              f"{self.counts['skipped']} already processed")
+        return self.counts
@@ -0,0 +1,35 @@
+import os
+import sys
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '../src')
+sys.path.insert(0, SRC_DIR)
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """
+    Receipt store, address files and result cache in a temporary directory.
+    """
+    import cache
+    import stored_data
+    monkeypatch.setattr(stored_data, 'RECEIPT_DB', str(tmp_path / 'receipts.db'))
+    monkeypatch.setattr(stored_data, 'RECEIPT_DATA_DIR', str(tmp_path / 'receipts_data'))
+    monkeypatch.setattr(stored_data, 'ADDRESS_FILE', str(tmp_path / 'addresses.json'))
+    monkeypatch.setattr(stored_data, 'ADDRESS_REVIEW_FILE', str(tmp_path / 'address_review.jsonl'))
+    monkeypatch.setattr(stored_data, '_store', None)
+    monkeypatch.setattr(stored_data, '_address_index', None)
+    monkeypatch.setattr(stored_data, '_address_index_key', None)
+    monkeypatch.setattr(cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(cache, 'PAGE_CACHE_DIR', str(tmp_path / 'pages'))
+    monkeypatch.setattr(cache, '_cache_size', None)
+    return tmp_path
+
+
+@pytest.fixture
+def store(data_dir):
+    """
+    Empty receipt store with running aggregates attached.
+    """
+    import stored_data
+    return stored_data.get_store()
@@ -0,0 +1,127 @@
+"""
+Frozen copies for parser regression tests: the original multi-scan
+extract_entities and a garbled receipt text generator. Kept here so the
+tests need neither OpenCV nor the benchmark module.
+"""
+import re
+import random
+
+STATIONS = ['Alauša', 'Viada LT', 'Baltic Petroleum', 'Orlen Lietuva', 'Circle K Lietuva', 'Neste Lietuva']
+STREETS = ['Kauno', 'Savanorių', 'Ukmergės', 'Vilniaus', 'Taikos', 'Pramonės', 'Žalgirio', 'Laisvės']
+CITIES = ['Vilnius', 'Kaunas', 'Klaipėda', 'Šiauliai', 'Panevėžys', 'Alytus']
+FUEL_TYPES = ['Dyzelinas', 'Benzinas', 'Dujos']
+
+
+def random_truth(rng):
+    """
+    Ground truth for one synthetic fuel receipt, values formatted the way
+    extract_entities returns them.
+    """
+    price = rng.randint(1200, 1999) / 1000
+    liters = rng.randint(5000, 60000) / 1000
+    return {
+        'station': rng.choice(STATIONS),
+        # Address as kept in addresses.json, the receipt line adds the city
+        'address': f"{rng.choice(STREETS)} g. {rng.randint(1, 199)}",
+        'city': rng.choice(CITIES),
+        'fuel_type': rng.choice(FUEL_TYPES),
+        'fuel_price_per_liter': f"{price:.3f}".replace('.', ','),
+        'fuel_liters': f"{liters:.3f}".replace('.', ','),
+        'amount': f"{round(price * liters, 2):.2f}".replace('.', ','),
+        'date': f"2024.{rng.randint(1, 12):02d}.{rng.randint(1, 28):02d}",
+        'time': f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}",
+    }
+
+
+def receipt_lines(truth, rng):
+    lines = [
+        f'UAB "{truth["station"]}"',
+        f"{truth['address']}, {truth['city']}",
+        f"PVM mok. kodas LT{rng.randint(100000000, 999999999)}",
+        '',
+        truth['fuel_type'],
+        f"{truth['fuel_price_per_liter']} X {truth['fuel_liters']}",
+        f"Kuro kolonėlė {rng.randint(1, 8)}",
+        '',
+        f"Mokėti {truth['amount']}",
+        f"Kortelės mokėjimas {truth['amount']}",
+        f"PVM 21% {float(truth['amount'].replace(',', '.')) * 0.21 / 1.21:.2f}".replace('.', ','),
+        '',
+        f"Kvito Nr. {rng.randint(1000, 99999)}",
+        f"{truth['date']} {truth['time']}",
+        'Ačiū, kad apsipirkote!',
+    ]
+    return lines
+
+
+def extract_entities_reference(text):
+    """
+    Original multi-scan extract_entities, the regression reference.
+    """
+    entities = {}
+    fuel_amount_match = re.search(r'(\d+[.,]\d+)\s*[xX*]\s*(\d+[.,]\d+)', text)
+    if fuel_amount_match:
+        entities['fuel_price_per_liter'] = fuel_amount_match.group(1)
+        entities['fuel_liters'] = fuel_amount_match.group(2)
+    station_match = re.search(r'UAB\s*["“]?([\w\s\-]+)["”]?', text)
+    if not station_match:
+        station_match = re.search(r'([\w\s\-]+),\s*UAB', text)
+    if not station_match:
+        station_match = re.search(r'([\w\s\-]+),UAB', text)
+    if not station_match:
+        station_match = re.search(r'UAB\s+([\w\s\-]+)', text)
+    if station_match:
+        entities['station'] = station_match.group(1).strip()
+    address_lines = []
+    lines = text.split('\n')
+    for i, line in enumerate(lines):
+        if re.search(r'(g\.|sav\.|k\.)', line):
+            start = max(i-1, 0)
+            end = min(i+2, len(lines))
+            address_lines.append(' '.join(lines[start:end]).strip())
+    if address_lines:
+        entities['address'] = max(address_lines, key=len)
+    date_match = re.search(r'(\d{4}[./-]\d{2}[./-]\d{2})', text)
+    if date_match:
+        entities['date'] = date_match.group(1)
+    for match in re.findall(r'(\d{2}):(\d{2})(?::(\d{2}))?', text):
+        hh, mm, ss = int(match[0]), int(match[1]), int(match[2] or 0)
+        if 0 <= hh < 24 and 0 <= mm < 60 and 0 <= ss < 60:
+            entities['time'] = f"{hh:02d}:{mm:02d}:{ss:02d}" if match[2] else f"{hh:02d}:{mm:02d}"
+            break
+    amount_match = re.search(r'(?:Mok[eė]ti|Mok[eė]ta|Moket|Hoxeta|Moket)[^\d]*(\d+[.,]\d{2})', text, re.IGNORECASE)
+    if not amount_match:
+        amount_match = re.search(r'(\d+[.,]\d{2})', text)
+    if amount_match:
+        entities['amount'] = amount_match.group(1)
+    fuel_match = re.search(r'(Diesel|Petrol|Gasoline|Dyzelinas|Benzinas|Dujos)', text, re.IGNORECASE)
+    if fuel_match:
+        entities['fuel_type'] = fuel_match.group(1)
+    lt_keywords = ['Mokėti', 'Kortelės', 'Kvito', 'Saugos', 'Dokumento', 'PVM', 'UAB']
+    entities['language'] = 'lt' if any(word.lower() in text.lower() for word in lt_keywords) else 'unknown'
+    return entities
+
+
+# Characters OCR tends to confuse on receipts, used to garble synthetic text
+NOISE_CHARS = 'UABgsk.,:;xX*"“”-0123456789lIoOėąžš /\n'
+
+
+def synthetic_texts(count=2000, seed=0, max_edits=30):
+    """
+    Receipt texts with random OCR-like character edits.
+    """
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        chars = list('\n'.join(receipt_lines(random_truth(rng), rng)))
+        for _ in range(rng.randint(0, max_edits)):
+            i = rng.randrange(len(chars) + 1)
+            op = rng.randrange(3)
+            if op == 0 and i < len(chars):
+                del chars[i]
+            elif op == 1:
+                chars.insert(i, rng.choice(NOISE_CHARS))
+            elif i < len(chars):
+                chars[i] = rng.choice(NOISE_CHARS)
+        texts.append(''.join(chars))
+    return texts
@@ -0,0 +1,65 @@
+import random
+import pytest
+import stored_data
+from address_index import AddressIndex, bounded_levenshtein
+from stored_data import levenshtein
+
+STREETS = ['Kauno', 'Savanorių', 'Ukmergės', 'Vilniaus', 'Taikos', 'Pramonės', 'Žalgirio', 'Laisvės', 'Ąžuolų']
+CITIES = ['Vilnius', 'Kaunas', 'Klaipėda', 'Šiauliai']
+
+
+def _addresses(rng, count):
+    return [{'address': f"{rng.choice(STREETS)} g. {rng.randint(1, 60)}, {rng.choice(CITIES)}", 'station': f"S{i}"}
+            for i in range(count)]
+
+
+def _garble(rng, text, edits):
+    chars = list(text)
+    for _ in range(edits):
+        i = rng.randrange(len(chars) + 1)
+        op = rng.randrange(3)
+        if op == 0 and i < len(chars):
+            del chars[i]
+        elif op == 1:
+            chars.insert(i, rng.choice('abgė .,1'))
+        elif i < len(chars):
+            chars[i] = rng.choice('abgė .,1')
+    return ''.join(chars)
+
+
+def _brute_force(entries, text, threshold):
+    best = None
+    for entry in entries:
+        dist = levenshtein(text, entry['address'])
+        if dist <= threshold and (best is None or dist < best[1]):
+            best = (entry, dist)
+    return best or (None, None)
+
+
+def test_bounded_levenshtein_matches_full():
+    rng = random.Random(1)
+    for _ in range(500):
+        a = _garble(rng, 'Kauno g. 12, Vilnius', rng.randint(0, 6))
+        b = _garble(rng, 'Kauno g. 12, Vilnius', rng.randint(0, 6))
+        for max_dist in (0, 1, 3):
+            assert bounded_levenshtein(a, b, max_dist) == min(levenshtein(a, b), max_dist + 1)
+
+
+@pytest.mark.parametrize('threshold', [1, 3])
+def test_best_match_equals_brute_force_scan(threshold):
+    rng = random.Random(threshold)
+    entries = _addresses(rng, 150)
+    index = AddressIndex(entries)
+    for _ in range(100):
+        query = _garble(rng, rng.choice(entries)['address'], rng.randint(0, 5))
+        assert index.best_match([query], threshold) == _brute_force(entries, query, threshold), query
+
+
+def test_added_addresses_are_matched(data_dir):
+    stored_data.add_address('Kauno g. 12', 'Viada')
+    text = 'Kasa:\nKauno g. 13'
+    match = stored_data.fuzzy_match_address(text, stored_data.get_address_index())
+    assert match == {'address': 'Kauno g. 12', 'station': 'Viada'}
+    # A plain list gives the same answer as the index
+    assert stored_data.fuzzy_match_address(text, stored_data.load_addresses()) == match
+    assert stored_data.fuzzy_match_address('Taikos g. 99', stored_data.get_address_index()) is None
@@ -0,0 +1,44 @@
+import threading
+import aggregates
+import receipt_store
+
+
+def _totals(store):
+    return aggregates.running_totals(store)
+
+
+def test_running_totals_follow_replacements(store):
+    store.upsert('a', {'date': '2024.01.02', 'station': 'Viada', 'amount': '20,00', 'fuel_liters': '10,00',
+                       'fuel_price_per_liter': '2,00'})
+    store.upsert('b', {'date': '2024.02.03', 'station': 'Viada', 'amount': '15,50', 'fuel_liters': '10,00'})
+    # Replacing a receipt moves it to another month and station
+    store.upsert('a', {'date': '2024.02.10', 'station': 'Neste', 'amount': '30,00', 'fuel_liters': '20,00',
+                       'fuel_price_per_liter': '1,50'})
+    totals = _totals(store)
+    assert totals['monthly'] == {'2024-02': {'receipts': 2, 'amount': 45.5, 'liters': 30.0}}
+    assert totals['stations'] == {
+        'Neste': {'receipts': 1, 'amount': 30.0, 'liters': 20.0, 'mean_price': 1.5},
+        'Viada': {'receipts': 1, 'amount': 15.5, 'liters': 10.0, 'mean_price': None},
+    }
+
+
+def test_concurrent_saves_match_rebuild(store):
+    def writer(n):
+        # Separate store objects share nothing but the database file, like worker processes
+        own = receipt_store.ReceiptStore(store.path)
+        aggregates.attach(own)
+        for i in range(50):
+            # Amounts in quarters add up exactly in any order
+            own.upsert('same', {'date': f"2024-0{1 + i % 3}-05", 'station': f"S{n % 2}",
+                                'amount': 0.25 * (n * 100 + i), 'fuel_liters': 1.0})
+            own.upsert(f"own-{n}-{i}", {'date': '2024-04-01', 'station': 'S9', 'amount': 0.5, 'fuel_liters': 1.0})
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    live = _totals(store)
+    aggregates.rebuild_aggregates(store.connection())
+    assert live == _totals(store)
+    assert sum(month['receipts'] for month in live['monthly'].values()) == store.count() == 201
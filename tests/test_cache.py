@@ -0,0 +1,22 @@
+import subprocess
+import sys
+import cache
+from conftest import SRC_DIR
+
+HASH_SCRIPT = "import cache; print(cache.params_hash(), cache.params_hash(2.5))"
+
+
+def _hash_in_new_interpreter():
+    result = subprocess.run([sys.executable, '-c', HASH_SCRIPT], cwd=SRC_DIR,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+def test_params_hash_stable_across_interpreters():
+    first = _hash_in_new_interpreter()
+    assert first == _hash_in_new_interpreter()
+    assert first == f"{cache.params_hash()} {cache.params_hash(2.5)}"
+
+
+def test_params_hash_follows_pipeline():
+    assert cache.params_hash(pipeline=[('threshold', {})]) != cache.params_hash()
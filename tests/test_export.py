@@ -0,0 +1,46 @@
+import csv
+import json
+import pytest
+import export
+
+
+@pytest.fixture
+def receipts(store):
+    store.upsert_many([
+        ('a', {'date': '2024.01.05', 'station': 'Viada', 'fuel_type': 'Dyzelinas', 'amount': '20,00',
+               'receipt_number': '101'}),
+        ('b', {'date': '2024.02.10', 'station': 'Neste', 'fuel_type': 'Benzinas', 'amount': '15,50'}),
+        ('c', {'date': '2024.03.15', 'station': 'Viada', 'fuel_type': 'Dyzelinas', 'amount': '30,25',
+               'receipt_number': '103'}),
+    ])
+    return store
+
+
+def test_csv_export_with_filters(receipts, tmp_path):
+    path = tmp_path / 'out' / 'receipts.csv'
+    assert export.export_receipts(str(path), store=receipts, date_from='2024-01-01', station='Viada') == 2
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == list(export.EXPORT_COLUMNS)
+    assert [(row['id'], row['date'], row['amount'], row['receipt_number']) for row in rows] == [
+        ('a', '2024-01-05', '20.0', '101'), ('c', '2024-03-15', '30.25', '103')]
+    assert rows[0]['address'] == ''
+
+
+def test_jsonl_export_and_format_detection(receipts, tmp_path):
+    path = tmp_path / 'receipts.ndjson'
+    assert export.export_receipts(str(path), store=receipts, fuel_type='benzinas') == 1
+    rows = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert rows == [dict.fromkeys(export.EXPORT_COLUMNS) | {
+        'id': 'b', 'date': '2024-02-10', 'station': 'Neste', 'fuel_type': 'Benzinas', 'amount': 15.5}]
+    assert export.detect_format('x.txt', 'pq') == 'parquet'
+    with pytest.raises(ValueError):
+        export.detect_format('receipts.xlsx')
+
+
+def test_parquet_needs_pyarrow(receipts, tmp_path, monkeypatch):
+    monkeypatch.setattr(export, 'pyarrow', None)
+    with pytest.raises(ImportError, match='pyarrow'):
+        export.export_receipts(str(tmp_path / 'receipts.parquet'), store=receipts)
+    with pytest.raises(ValueError):
+        export.export_receipts('-', 'parquet', store=receipts)
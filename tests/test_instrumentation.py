@@ -0,0 +1,18 @@
+import tracemalloc
+import instrumentation
+
+
+def test_nested_stage_keeps_outer_peak():
+    instrumentation.configure(True, True)
+    try:
+        with instrumentation.stage('outer'):
+            block = bytearray(20_000_000)
+            del block
+            with instrumentation.stage('inner'):
+                pass
+        peaks = {r['stage']: r['peak_bytes'] for r in instrumentation.drain()}
+    finally:
+        instrumentation.configure(False)
+        tracemalloc.stop()
+    assert peaks['outer'] >= 20_000_000
+    assert peaks['inner'] < 1_000_000
@@ -0,0 +1,12 @@
+import pytest
+import ocr
+
+
+def test_detect_language_prefers_configured_order():
+    assert ocr.detect_language(['eng', 'lit', 'osd']) == 'lit'
+    assert ocr.detect_language(['eng', 'osd']) == 'eng'
+
+
+def test_detect_language_names_missing_models():
+    with pytest.raises(RuntimeError, match='lit.traineddata'):
+        ocr.detect_language(['osd'])
@@ -0,0 +1,78 @@
+import hashlib
+import numpy as np
+import layout
+import ocr
+
+LINE_COUNT = 60
+LINE_HEIGHT = 20
+LINE_PITCH = 40
+
+
+def _label(index):
+    # Unrelated strings, so overlap removal cannot confuse neighbouring lines
+    return hashlib.md5(str(index).encode()).hexdigest()[:10]
+
+
+def _tall_receipt():
+    """
+    White image with one black bar per text line, the bar width encodes
+    the line index.
+    """
+    image = np.full((LINE_COUNT * LINE_PITCH + LINE_PITCH, 400), 255, np.uint8)
+    for i in range(LINE_COUNT):
+        top = LINE_PITCH // 2 + i * LINE_PITCH
+        image[top:top + LINE_HEIGHT, 10:10 + 20 + 4 * i] = 0
+    return image
+
+
+class FakeBackend:
+    """
+    'Reads' every complete bar in a crop back to its line label.
+    """
+    name = 'fake'
+    lang = 'eng'
+
+    def image_to_string(self, image):
+        ink = image < 128
+        rows = np.flatnonzero(ink.any(axis=1))
+        lines = []
+        for start in rows[np.r_[True, np.diff(rows) > 1]]:
+            width = int(ink[start].sum())
+            lines.append(_label((width - 20) // 4))
+        return '\n'.join(lines) + '\n\f'
+
+    def image_to_data(self, image):
+        return self.image_to_string(image), 90.0
+
+
+def _expected():
+    return '\n'.join(_label(i) for i in range(LINE_COUNT))
+
+
+def test_tiles_round_trip(monkeypatch):
+    monkeypatch.setattr(ocr, 'get_backend', FakeBackend)
+    monkeypatch.setattr(ocr, 'OCR_TILING', True)
+    monkeypatch.setattr(ocr, 'TILE_MIN_HEIGHT', 1000)
+    monkeypatch.setattr(ocr, 'TILE_HEIGHT', 400)
+    monkeypatch.setattr(ocr, 'TILE_WORKERS', 3)
+    image = _tall_receipt()
+    tiles = layout.split_tiles(image, ocr.TILE_HEIGHT)
+    assert len(tiles) > 2
+    # Tiles cover the image and overlap instead of leaving gaps
+    assert tiles[0][0] == 0 and tiles[-1][1] == image.shape[0]
+    assert all(next_top < bottom for (_, bottom), (next_top, _) in zip(tiles, tiles[1:]))
+    assert ocr.ocr_image(image) == _expected()
+    text, confidence = ocr.ocr_image_data(image)
+    assert text == _expected() and confidence == 90.0
+
+
+def test_tiles_in_turn_without_pool(monkeypatch):
+    monkeypatch.setattr(ocr, 'get_backend', FakeBackend)
+    monkeypatch.setattr(ocr, 'TILE_MIN_HEIGHT', 1000)
+    monkeypatch.setattr(ocr, 'TILE_HEIGHT', 400)
+    monkeypatch.setattr(ocr, 'TILE_WORKERS', 1)
+    assert ocr.ocr_image(_tall_receipt()) == _expected()
+
+
+def test_stitch_drops_repeated_overlap_lines():
+    assert ocr.stitch_texts(['a1\nb2\nc3\n', 'c3\nd4', 'd4\ne5\n\f']) == 'a1\nb2\nc3\nd4\ne5'
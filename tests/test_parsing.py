@@ -0,0 +1,9 @@
+import pytest
+from parser_reference import extract_entities_reference, synthetic_texts
+from parsing import extract_entities
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_extract_entities_matches_reference(seed):
+    for text in synthetic_texts(count=1000, seed=seed):
+        assert extract_entities(text) == extract_entities_reference(text), text
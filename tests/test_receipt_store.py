@@ -0,0 +1,64 @@
+import json
+import stored_data
+
+
+def _receipt(date, station, fuel_type='Dyzelinas', amount='20,00', liters='12,820'):
+    return {'date': date, 'time': '10:11', 'station': station, 'fuel_type': fuel_type,
+            'amount': amount, 'fuel_liters': liters, 'fuel_price_per_liter': '1,560', 'language': 'lt'}
+
+
+def test_upsert_types_columns_and_keeps_record(store):
+    record = _receipt('2024.01.02', 'Viada')
+    store.upsert('r1', record)
+    row = store.connection().execute('SELECT * FROM receipts WHERE id = ?', ('r1',)).fetchone()
+    assert row['date'] == '2024-01-02'
+    assert row['amount'] == 20.0 and row['fuel_liters'] == 12.82 and row['fuel_price_per_liter'] == 1.56
+    # The record comes back exactly as saved
+    assert store.get('r1') == record
+    assert store.get('missing') is None
+
+
+def test_upsert_replaces_and_query_filters(store):
+    store.upsert_many([
+        ('a', _receipt('2024.01.05', 'Viada')),
+        ('b', _receipt('2024/02/10', 'Circle K', fuel_type='Benzinas')),
+        ('c', _receipt('2024-03-15', 'Viada', fuel_type='dyzelinas')),
+        ('d', _receipt('not a date', 'Viada')),
+    ])
+    store.upsert('a', _receipt('2024.01.06', 'Viada', amount='30,00'))
+    assert store.count() == 4
+    assert [r['receipt_id'] for r in store.query(date_from='2024-01-01', date_to='2024.02.28')] == ['a', 'b']
+    assert [r['receipt_id'] for r in store.query(station='Viada', fuel_type='DYZELINAS')] == ['d', 'a', 'c']
+    assert store.count(station='Circle K') == 1
+    assert list(store.query(limit=1))[0]['receipt_id'] == 'd'  # NULL dates sort first
+    assert [tuple(row) for row in store.columns(('id', 'amount'), date_to='2024-01-31')] == [('a', 30.0)]
+
+
+def test_image_status_and_json_import(data_dir):
+    legacy = data_dir / 'receipts_data'
+    legacy.mkdir()
+    (legacy / 'old.json').write_text(json.dumps(_receipt('2023.12.31', 'Neste')), encoding='utf-8')
+    store = stored_data.get_store()
+    assert store.get('old')['station'] == 'Neste'
+    # Imported once, later files in the old layout are ignored
+    (legacy / 'newer.json').write_text(json.dumps(_receipt('2024.01.01', 'Neste')), encoding='utf-8')
+    assert store.import_json_dir(str(legacy)) == 0
+    assert stored_data.image_status('h1') is None
+    stored_data.mark_image_processed('h1', 'old', 'old.png', 'error', 'boom')
+    stored_data.mark_image_processed('h1', 'old', 'old.png', 'ok')
+    assert stored_data.image_status('h1') == 'ok'
+
+
+def test_older_database_gets_receipt_number(data_dir):
+    import sqlite3
+    import receipt_store
+    path = str(data_dir / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(receipt_store.SCHEMA.replace('    receipt_number TEXT,\n', ''))
+    conn.execute("INSERT INTO receipts (id, data) VALUES ('r1', ?)", (json.dumps({'receipt_number': '77'}),))
+    conn.commit()
+    conn.close()
+    store = receipt_store.ReceiptStore(path)
+    assert [tuple(row) for row in store.columns(('id', 'receipt_number'))] == [('r1', '77')]
+    store.upsert('r2', {'receipt_number': 78})
+    assert store.connection().execute("SELECT receipt_number FROM receipts WHERE id = 'r2'").fetchone()[0] == '78'
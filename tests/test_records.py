@@ -0,0 +1,26 @@
+from datetime import date
+from records import ReceiptRecord
+from normalization import normalize_entities
+
+
+def test_from_entities_types_values():
+    record = ReceiptRecord.from_entities({
+        'date': '2024.01.02', 'amount': '20,00', 'fuel_liters': '12.820', 'fuel_price_per_liter': '1,560',
+        'station': 'Viada', 'receipt_number': 1234, 'vat': '3,47'})
+    assert record.date == date(2024, 1, 2)
+    assert (record.amount, record.fuel_liters, record.fuel_price_per_liter) == (20.0, 12.82, 1.56)
+    assert record.receipt_number == '1234'
+    assert record['vat'] == '3,47' and 'address' not in record
+    assert record.to_dict() == {
+        'station': 'Viada', 'date': '2024-01-02', 'fuel_price_per_liter': 1.56, 'fuel_liters': 12.82,
+        'amount': 20.0, 'receipt_number': '1234', 'vat': '3,47'}
+
+
+def test_unparseable_values_keep_raw_string():
+    record = ReceiptRecord.from_entities({'date': '2O24.0I.02', 'amount': '2O,00', 'fuel_liters': ''})
+    assert record.date is None and record.amount is None and record.fuel_liters is None
+    data = record.to_dict()
+    assert data == {'date_raw': '2O24.0I.02', 'amount_raw': '2O,00'}
+    # A saved record read back keeps the raw strings
+    assert ReceiptRecord.from_entities(data) == record
+    assert normalize_entities({'date': '2024/11/07'}) == {'date': '2024-11-07'}
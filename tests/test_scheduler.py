@@ -0,0 +1,108 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import pytest
+from PIL import Image
+import scheduler
+from scheduler import MemoryScheduler
+
+
+class FakeExecutor:
+    """
+    Records submissions, futures finish only when the test says so.
+    """
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, path):
+        future = Future()
+        self.submitted.append((path, future))
+        return future
+
+    def future_of(self, path):
+        return next(future for submitted, future in self.submitted if submitted == path)
+
+
+@pytest.fixture
+def images(tmp_path, monkeypatch):
+    """
+    Write PNGs of the given sizes, one byte per pixel and no worker base
+    memory, so estimates are plain pixel counts.
+    """
+    monkeypatch.setattr(scheduler, 'JOB_BYTES_PER_PIXEL', 1)
+    monkeypatch.setattr(scheduler, 'WORKER_BASE_MEMORY', 0)
+
+    def write(**sizes):
+        paths = {}
+        for name, (w, h) in sizes.items():
+            path = str(tmp_path / f"{name}.png")
+            Image.new('L', (w, h), 255).save(path)
+            paths[name] = path
+        return paths
+    return write
+
+
+def test_largest_first_and_pixels_from_header(images, tmp_path):
+    paths = images(small=(10, 10), large=(100, 50), medium=(40, 40))
+    jobs = MemoryScheduler(list(paths.values()), workers=1, budget=10 ** 9).pending
+    assert [job.path for job in jobs] == [paths['large'], paths['medium'], paths['small']]
+    assert [job.estimate for job in jobs] == [5000, 1600, 100]
+    broken = tmp_path / 'broken.jpg'
+    broken.write_bytes(b'x' * 10)
+    assert scheduler.image_pixels(str(broken)) == 10 * scheduler.COMPRESSED_PIXELS_PER_BYTE
+
+
+def test_budget_bypass_limit_and_oversized_job(images, monkeypatch):
+    monkeypatch.setattr(scheduler, 'SCHEDULER_MAX_BYPASS', 2)
+    paths = images(a=(200, 100), b=(200, 100), s1=(40, 25), s2=(40, 25), s3=(40, 25), huge=(300, 100))
+    sched = MemoryScheduler(list(paths.values()), workers=4, budget=25000)
+    executor = FakeExecutor()
+
+    # Larger than the whole budget: starts alone
+    sched.fill(executor, None)
+    assert [path for path, _ in executor.submitted] == [paths['huge']]
+    sched.finished(executor.future_of(paths['huge']))
+
+    # a runs, b does not fit next to it, two small jobs go ahead, then b waits
+    sched.fill(executor, None)
+    assert [path for path, _ in executor.submitted[1:]] == [paths['a'], paths['s1'], paths['s2']]
+    assert sched.deferred == 2 and sched.in_flight_bytes == 22000
+    sched.finished(executor.future_of(paths['a']))
+    sched.fill(executor, None)
+    assert [path for path, _ in executor.submitted[4:]] == [paths['b'], paths['s3']]
+    assert sched.in_flight_bytes == 23000 and len(sched.in_flight) == sched.workers
+    assert sched.peak_in_flight_bytes == 30000  # Only the oversized job went over
+
+
+def test_calibration_only_from_large_jobs(images, monkeypatch):
+    monkeypatch.setattr(scheduler, 'CALIBRATION_MIN_PIXELS', 10000)
+    paths = images(large=(200, 100), small=(50, 50), waiting=(90, 100))
+    sched = MemoryScheduler([paths['large'], paths['small']], workers=2, budget=10 ** 9)
+    sched.pending.append(sched._job(paths['waiting']))
+    executor = FakeExecutor()
+    sched.fill(executor, None)
+    sched.finished(executor.future_of(paths['small']), measured_peak=2500 * 50)
+    assert sched.bytes_per_pixel == 1
+    sched.finished(executor.future_of(paths['large']), measured_peak=20000 * 3)
+    assert sched.bytes_per_pixel == 3
+    assert sched.pending[0].estimate == 9000 * 3
+    # Lower measurements never bring the estimate down
+    sched.fill(executor, None)
+    sched.finished(executor.future_of(paths['waiting']), measured_peak=9000)
+    assert sched.bytes_per_pixel == 3
+
+
+def test_run_yields_every_result_within_budget(images):
+    paths = images(**{f"img{i}": (100, 100) for i in range(6)})
+    sched = MemoryScheduler(list(paths.values()), workers=4, budget=25000)
+
+    def work(path):
+        if path == paths['img3']:
+            raise ValueError('unreadable')
+        return path.upper()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = dict(sched.run(executor, work))
+    assert set(results) == set(paths.values())
+    assert isinstance(results[paths['img3']], ValueError)
+    assert results[paths['img0']] == paths['img0'].upper()
+    assert sched.peak_in_flight == 2 and sched.peak_in_flight_bytes <= 25000
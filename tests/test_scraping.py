@@ -0,0 +1,91 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import cache
+import scraping
+
+PAGE = ("<table><tr><td>Suma</td><td>20,00</td></tr>"
+        "<tr><td>Adresas</td><td> Vilniaus g. 1, Vilnius </td></tr></table>")
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """
+    Local kvitas.vmi.lt: paths starting with /flaky answer 503 on the first
+    request, /missing always 404, everything else the receipt page.
+    """
+    protocol_version = 'HTTP/1.1'
+    hits = []
+
+    def do_GET(self):
+        self.hits.append((self.path, time.monotonic()))
+        first = sum(1 for path, _ in self.hits if path == self.path) == 1
+        if self.path.startswith('/missing'):
+            status = 404
+        elif self.path.startswith('/flaky') and first:
+            status = 503
+        else:
+            status = 200
+        body = PAGE.encode() if status == 200 else b'no'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in(data_dir, monkeypatch):
+    StandIn.hits = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(scraping, 'VMI_BASE_URL', f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setattr(scraping, 'FETCH_BACKOFF', 0.01)
+    monkeypatch.setattr(scraping, '_limiters', {})
+    yield StandIn.hits
+    server.shutdown()
+    server.server_close()
+
+
+def _url(path, nr=1):
+    return f"https://{scraping.VMI_HOST}/{path}?NR={nr}"
+
+
+def test_fetch_many_retries_and_gives_up(stand_in):
+    urls = [_url('flaky'), _url('missing'), _url('ok')]
+    pages = scraping.fetch_many(urls + [_url('ok')], rate=None)
+    assert pages == {urls[0]: PAGE, urls[1]: None, urls[2]: PAGE}
+    paths = [path for path, _ in stand_in]
+    # 503 is retried, 404 is not, the duplicate URL is requested once
+    assert sorted(paths) == ['/flaky?NR=1', '/flaky?NR=1', '/missing?NR=1', '/ok?NR=1']
+
+
+def test_fetch_many_rate_limit_per_host(stand_in):
+    rate = 20.0
+    scraping.fetch_many([_url('ok', nr) for nr in range(5)], rate=rate)
+    times = sorted(t for _, t in stand_in)
+    assert len(times) == 5
+    assert all(b - a >= 0.8 / rate for a, b in zip(times, times[1:]))
+
+
+def test_single_fetch_shares_the_limiter(stand_in, monkeypatch):
+    rate = 10.0
+    monkeypatch.setattr(scraping, 'FETCH_RATE_PER_HOST', rate)
+    assert scraping.fetch_html(_url('ok', 1)) == PAGE
+    scraping.fetch_many([_url('ok', 2)], rate=rate)
+    first, second = sorted(t for _, t in stand_in)
+    assert second - first >= 0.8 / rate
+
+
+def test_cached_pages_are_not_requested_again_or_evicted(stand_in):
+    urls = [_url('ok', nr) for nr in range(3)]
+    scraping.fetch_many(urls, rate=None)
+    cache.put_text('some-ocr-key', 'x' * 1000)
+    cache.evict(0)
+    assert scraping.fetch_many(urls, rate=None) == dict.fromkeys(urls, PAGE)
+    assert scraping.vmi_receipt_fields(urls[0]) == {
+        'amount': '20,00', 'address': 'Vilniaus g. 1, Vilnius', 'receipt_number': '0'}
+    assert len(stand_in) == 3
+    assert cache.get_text('some-ocr-key') is None
@@ -0,0 +1,102 @@
+import json
+import threading
+from contextlib import contextmanager
+from http.client import HTTPConnection
+import pytest
+import service
+from records import ReceiptRecord
+
+PNG = b'\x89PNG\r\n\x1a\nfake image bytes'
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    """
+    Stub pipeline, records the images it was given.
+    """
+    images = []
+
+    def fake_process_receipt(image, interactive=True, receipt_id=None):
+        images.append(image)
+        return ReceiptRecord.from_entities({'amount': '20,00', 'date': '2024.01.02'}), None
+
+    monkeypatch.setattr(service, 'process_receipt', fake_process_receipt)
+    monkeypatch.setattr(service.ReceiptService, 'warm_up', lambda self: None)
+    return images
+
+
+@contextmanager
+def serving(receipt_service, start=True):
+    server = service.make_server('127.0.0.1', 0, receipt_service)
+    if start:
+        receipt_service.start()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield HTTPConnection(*server.server_address, timeout=10)
+    finally:
+        server.shutdown()
+        server.server_close()
+        if start:
+            receipt_service.stop()
+
+
+def _post(conn, body, path='/receipts?receipt_id=r1', headers=None):
+    conn.request('POST', path, body=body, headers=headers or {})
+    response = conn.getresponse()
+    return response, response.read()
+
+
+def test_upload_returns_entities(data_dir, processed):
+    with serving(service.ReceiptService(workers=2)) as conn:
+        response, body = _post(conn, PNG)
+    assert response.status == 200
+    result = json.loads(body)
+    assert result['receipt_id'] == 'r1'
+    assert result['entities'] == {'amount': 20.0, 'date': '2024-01-02'}
+    assert processed == [PNG]
+
+
+def test_multipart_upload(data_dir, processed):
+    boundary = 'XyZ'
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="note"\r\n\r\nhello\r\n'
+            f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="r.png"\r\n'
+            f'Content-Type: image/png\r\n\r\n').encode() + PNG + f'\r\n--{boundary}--\r\n'.encode()
+    with serving(service.ReceiptService(workers=1)) as conn:
+        response, _ = _post(conn, body, headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    assert response.status == 200
+    assert processed == [PNG]
+
+
+def test_keep_alive_reuses_connection(data_dir, processed):
+    with serving(service.ReceiptService(workers=1)) as conn:
+        first, _ = _post(conn, PNG)
+        sock = conn.sock
+        second, _ = _post(conn, PNG + b'2', '/receipts?receipt_id=r2')
+        health = (conn.request('GET', '/health'), conn.getresponse())[1]
+        stats = json.loads(health.read())
+    assert first.status == second.status == health.status == 200
+    assert sock is not None and conn.sock is sock
+    assert stats['processed'] == 2
+
+
+def test_full_queue_answers_503(data_dir, processed):
+    receipt_service = service.ReceiptService(workers=1, queue_size=1)
+    # Dispatcher not started, the queued job keeps the queue full
+    assert receipt_service.submit(service.Job(PNG))
+    with serving(receipt_service, start=False) as conn:
+        response, body = _post(conn, PNG)
+    assert response.status == 503
+    assert response.getheader('Retry-After') == '1'
+    assert receipt_service.health()['rejected'] == 1
+
+
+@pytest.mark.parametrize('body, status', [(b'', 400), (b'x' * 64, 413)])
+def test_rejected_upload_closes_connection(data_dir, processed, monkeypatch, body, status):
+    monkeypatch.setattr(service, 'SERVICE_MAX_UPLOAD', 32)
+    with serving(service.ReceiptService(workers=1)) as conn:
+        response, _ = _post(conn, body)
+        assert response.status == status
+        assert response.getheader('Connection') == 'close'
+        assert response.will_close
+    assert processed == []